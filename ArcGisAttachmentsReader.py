@@ -37,6 +37,7 @@ if QT_VERSION >= 6:
     
     # Mouse and Key
     MOUSE_LEFT_BUTTON = Qt.MouseButton.LeftButton
+    SHIFT_MODIFIER = Qt.KeyboardModifier.ShiftModifier
     KEY_ESCAPE = Qt.Key.Key_Escape
     
     # Cursors
@@ -86,6 +87,7 @@ else:
     
     # Mouse and Key
     MOUSE_LEFT_BUTTON = Qt.LeftButton
+    SHIFT_MODIFIER = Qt.ShiftModifier
     KEY_ESCAPE = Qt.Key_Escape
     
     # Cursors
@@ -113,15 +115,13 @@ else:
 
 import qgis.PyQt
 from qgis.PyQt.QtWidgets import (
-    QAction, QWidget, QLabel, QVBoxLayout, QGroupBox,
-    QHBoxLayout, QPushButton, QSizePolicy, QScrollArea,
-    QTableWidget, QTableWidgetItem, QMessageBox, QFileDialog,
-    QDockWidget
+    QAction, QWidget, QLabel, QVBoxLayout, QSizePolicy,
+    QTableWidget, QMessageBox, QFileDialog, QDockWidget
 )
 from qgis.PyQt.QtGui import (
-    QPixmap, QIcon, QCursor, QColor, QPalette
+    QIcon, QCursor, QColor, QPalette
 )
-from qgis.PyQt.QtCore import Qt, QPoint, QUrl, QByteArray
+from qgis.PyQt.QtCore import Qt, QUrl, QTimer
 
 # Handle Qt5/Qt6 compatibility
 QT_VERSION = int(qgis.PyQt.QtCore.QT_VERSION_STR.split('.')[0])
@@ -141,6 +141,9 @@ if QT_VERSION >= 6:
     KEEP_ASPECT_RATIO = Qt.AspectRatioMode.KeepAspectRatio
     SMOOTH_TRANSFORMATION = Qt.TransformationMode.SmoothTransformation
     NO_EDIT_TRIGGERS = QTableWidget.EditTrigger.NoEditTriggers
+    MSG_YES = QMessageBox.StandardButton.Yes
+    MSG_NO = QMessageBox.StandardButton.No
+    MSG_CANCEL = QMessageBox.StandardButton.Cancel
     SINGLE_SELECTION = QTableWidget.SelectionMode.SingleSelection
     ITEM_IS_ENABLED = Qt.ItemFlag.ItemIsEnabled
     ITEM_IS_SELECTABLE = Qt.ItemFlag.ItemIsSelectable
@@ -160,47 +163,261 @@ else:
     KEEP_ASPECT_RATIO = Qt.KeepAspectRatio
     SMOOTH_TRANSFORMATION = Qt.SmoothTransformation
     NO_EDIT_TRIGGERS = QTableWidget.NoEditTriggers
+    MSG_YES = QMessageBox.Yes
+    MSG_NO = QMessageBox.No
+    MSG_CANCEL = QMessageBox.Cancel
     SINGLE_SELECTION = QTableWidget.SingleSelection
     ITEM_IS_ENABLED = Qt.ItemIsEnabled
     ITEM_IS_SELECTABLE = Qt.ItemIsSelectable
 from qgis.core import (
     QgsProject, QgsWkbTypes, QgsGeometry, QgsRectangle,
-    QgsFeatureRequest
+    QgsApplication, QgsVectorLayer, QgsVectorLayerFeatureSource,
+    Qgis, QgsMessageLog, QgsCoordinateTransform
 )
 from qgis.gui import QgsMapTool, QgsRubberBand, QgsVertexMarker
 from qgis.utils import iface
 import tempfile
 import os
-import sys
+import shutil
+
+from .attachment_index import AttachmentIndexManager
+from .attachment_counts import AttachmentCountManager, register_functions, unregister_functions, uses_count_fields
+from .spatial_locator import SpatialLocatorManager
+from .identify_task import AttachmentListTask, IdentifyTask, LayerIdentifyTask
+from .export_task import ExportAttachmentsTask
+from .thumbnails import ThumbnailTask, PREVIEW_WIDTH, THUMBNAIL_WIDTH, image_cache_key, image_nbytes
+from .attachment_cache import ByteLRUCache
+from .thumbnail_disk_cache import ThumbnailDiskCache, source_fingerprint
+from .attachment_resolver import AttachmentLayerResolver, AttachmentSchemaCache
+from .attachment_stats import format_size
+from .attachment_query import feature_keys, metadata_nbytes, query_attachments_cached, read_attachment_buffer
+from .attachment_io import PayloadStore, TempFileCache, process_temp_root
+from .latency import ClickTrace, LatencyRecorder, ProfileCapture, format_trace
+from .diagnostics_dialog import LatencyDiagnosticsDialog
+from .processing_provider import AttachmentsProcessingProvider
+from .results_tree import IdentifyResultsTree
+from .feature_panel import DockPanel
+from .image_viewer import ImageViewer
+from .prefetch import Prefetcher
+from .settings import get_setting, set_setting
 
 class ArcGisAttachmentsReader:
     def __init__(self, iface):
         self.iface = iface
         self.tool = None
         self.plugin_dir = os.path.dirname(__file__)
-        icon_path = self.plugin_dir + '/icons/Identify.svg'   # đường dẫn tới icon tùy chỉnh
-        self.action = QAction(QIcon(icon_path), "ArcGIS Attachments Reader", self.iface.mainWindow())
-        self.action.setCheckable(True)
-        self.action.triggered.connect(self.activate_tool)
+        # QAction, timer, tín hiệu project: tạo trong initGui(); qgis_process gọi
+        # classFactory(None) + initProcessing() nên __init__ không được dùng iface
+        self.action = None
+        self.export_action = None
+        self.count_fields_action = None
+        self.all_layers_action = None
+        self.prefetch_action = None
+        self.diagnostics_action = None
+        self._export_task = None
+        self.prefetcher = None
+
+        # chẩn đoán độ trễ identify (p50/p95/p99 từng bước, profile N click)
+        self.latency = LatencyRecorder(get_setting("latency_window"))
+        self.profile_capture = ProfileCapture()
+        self._diagnostics_dialog = None
 
         # highlight objects
         self.highlight_rb = None
         self.vertex_marker = None
 
-        # dock
+        # dock (nội dung DockPanel dựng một lần khi tạo dock)
         self.dock = None
+        self.dock_panel = None
+        # attachment đầu tiên đang xem trước trong dock (thumbnail / nút PDF)
+        self._dock_attachment = None
+
+
+        # chỉ mục REL key -> fid cho từng layer ATTACH (xây nền, lười)
+        self.attachment_index = AttachmentIndexManager()
+
+        # số attachment / tổng byte theo feature cha (hàm biểu thức + trường ảo)
+        self.attachment_counts = AttachmentCountManager()
+
+        # chỉ mục không gian cho hit-test identify (xây nền, lười)
+        self.spatial_locator = SpatialLocatorManager()
+
+        # cache main layer -> layer ATTACH (theo dõi tín hiệu project, tạo trong initGui)
+        self.layer_resolver = None
+
+        # cache index các trường theo cặp layer chính/ATTACH
+        self.schema_cache = AttachmentSchemaCache()
+
+        # identify nền: task đang chạy, click đang chờ, timer gom click
+        self._identify_task = None
+        self._layer_tasks = None
+        self._pending_identify = None
+        self._loading_bar = None
+        self._identify_timer = None
+
+        # cache LRU (theo byte) cho thumbnail/preview đã giải mã
+        self.image_cache = ByteLRUCache(get_setting("image_cache_mb") * 1024 * 1024, sizeof=image_nbytes)
+
+        # cache metadata attachment theo khóa rel (hợp lệ theo version của chỉ mục)
+        self.metadata_cache = ByteLRUCache(get_setting("metadata_cache_mb") * 1024 * 1024, sizeof=metadata_nbytes)
+
+        # cache thumbnail trên đĩa, dùng lại giữa các phiên QGIS
+        self.disk_cache = None
+        if get_setting("disk_cache_enabled"):
+            self.disk_cache = ThumbnailDiskCache(
+                os.path.join(QgsApplication.qgisSettingsDirPath(), "ArcGisAttachmentsReader", "thumbnails.sqlite"),
+                get_setting("disk_cache_mb") * 1024 * 1024
+            )
+
+        # tệp tạm để mở attachment bằng ứng dụng ngoài (dùng lại, có giới hạn, xóa khi unload;
+        # thư mục còn lại từ phiên QGIS đã crash được xóa ở đây)
+        self.temp_files = TempFileCache(
+            process_temp_root(tempfile.gettempdir(), "ArcGisAttachmentsReader"),
+            get_setting("temp_cache_mb") * 1024 * 1024
+        )
+
+        # ngân sách RAM cho BLOB đang giữ; phần lớn/vượt ngân sách ghi ra tệp tạm (mmap)
+        self.payloads = PayloadStore(
+            self.temp_files,
+            get_setting("payload_budget_mb") * 1024 * 1024,
+            get_setting("payload_spill_mb") * 1024 * 1024
+        )
+
+        # thumbnail giải mã nền (giữ tham chiếu task; token bỏ kết quả cũ)
+        self._thumbnail_tasks = set()
+        self._thumbnail_token = 0
 
-        # attachment map for link handling in dock (key -> {name,data})
-        self._attachment_map = {}
+        # danh sách attachment truy vấn nền (nút cây kết quả, chi tiết feature);
+        # token bỏ kết quả khi dock đã chuyển sang nội dung khác
+        self._list_tasks = set()
+        self._dock_token = 0
+
+        # Processing provider (xuất/đếm/thống kê không cần GUI)
+        self.provider = None
+
+    def initProcessing(self):
+        self.provider = AttachmentsProcessingProvider(self.plugin_dir + '/icons/Identify.svg')
+        QgsApplication.processingRegistry().addProvider(self.provider)
 
     def initGui(self):
+        self.initProcessing()
+
+        icon_path = self.plugin_dir + '/icons/Identify.svg'   # đường dẫn tới icon tùy chỉnh
+        self.action = QAction(QIcon(icon_path), "ArcGIS Attachments Reader", self.iface.mainWindow())
+        self.action.setCheckable(True)
+        self.action.triggered.connect(self.activate_tool)
+
+        # xuất hàng loạt attachment của lớp / đối tượng đang chọn
+        self.export_action = QAction("Export attachments...", self.iface.mainWindow())
+        self.export_action.triggered.connect(self.export_attachments)
+
+        # trường ảo ATT_COUNT / ATT_BYTES trên lớp đang chọn (tô màu / lọc theo số attachment)
+        self.count_fields_action = QAction("Add attachment count fields", self.iface.mainWindow())
+        self.count_fields_action.triggered.connect(self.add_count_fields)
+
+        # identify mọi lớp đang hiển thị có attachment (bật/tắt, lưu trong settings)
+        self.all_layers_action = QAction("Identify all visible layers", self.iface.mainWindow())
+        self.all_layers_action.setCheckable(True)
+        self.all_layers_action.setChecked(get_setting("identify_all_layers"))
+        self.all_layers_action.toggled.connect(lambda checked: set_setting("identify_all_layers", bool(checked)))
+
+        # nạp trước attachment quanh vùng đang xem (bật/tắt, lưu trong settings)
+        self.prefetch_action = QAction("Prefetch attachments around view", self.iface.mainWindow())
+        self.prefetch_action.setCheckable(True)
+        self.prefetch_action.setChecked(get_setting("prefetch_enabled"))
+        self.prefetch_action.toggled.connect(self._toggle_prefetch)
+
+        # chẩn đoán độ trễ identify (p50/p95/p99 từng bước, profile N click)
+        self.diagnostics_action = QAction("Latency diagnostics...", self.iface.mainWindow())
+        self.diagnostics_action.triggered.connect(self.show_diagnostics)
+
+        # cache main layer -> layer ATTACH (hủy khi project thêm/xóa/đổi tên layer)
+        self.layer_resolver = AttachmentLayerResolver()
+
+        # timer gom click identify
+
+        self._identify_timer = QTimer()
+        self._identify_timer.setSingleShot(True)
+        self._identify_timer.timeout.connect(self._launch_identify)
+
         self.iface.addToolBarIcon(self.action)
         self.iface.addPluginToMenu("ArcGIS Attachments Reader", self.action)
-        self.action.setToolTip("ArcGIS Attachments Identify")  # tooltip khi hover
+        # tooltip khi hover
+        self.action.setToolTip("ArcGIS Attachments Identify\n"
+                               "Click: một đối tượng - Kéo: chọn theo hình chữ nhật - "
+                               "Shift + kéo: chọn theo vùng vẽ tự do")
+        self.iface.addPluginToMenu("ArcGIS Attachments Reader", self.all_layers_action)
+        self.iface.addPluginToMenu("ArcGIS Attachments Reader", self.prefetch_action)
+        self.iface.addPluginToMenu("ArcGIS Attachments Reader", self.export_action)
+        self.iface.addPluginToMenu("ArcGIS Attachments Reader", self.count_fields_action)
+        self.iface.addPluginToMenu("ArcGIS Attachments Reader", self.diagnostics_action)
+
+        if get_setting("warm_resolver_on_load"):
+            self.layer_resolver.warm_all()
+
+        # attachment_count()/attachment_bytes(); lớp đã có trường ảo (từ project) được đếm lại
+        register_functions()
+        QgsProject.instance().layersAdded.connect(self._enable_count_fields)
+        QgsProject.instance().layersWillBeRemoved.connect(self._disable_count_fields)
+        self._enable_count_fields(QgsProject.instance().mapLayers().values())
+
+        self.prefetcher = Prefetcher(self, self.iface.mapCanvas())
 
     def unload(self):
         # remove dock and highlight
         self.clear_highlight()
+        self.cancel_identify()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+        if self._export_task is not None:
+            try:
+                self._export_task.cancel()
+            except Exception:
+                pass
+            self._export_task = None
+        for task in list(self._thumbnail_tasks) + list(self._list_tasks):
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        self._thumbnail_tasks = set()
+        self._list_tasks = set()
+        self.image_cache.clear()
+        self.metadata_cache.clear()
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+        self.payloads.release_all()
+        self.temp_files.cleanup()
+        self.attachment_index.clear()
+        self.spatial_locator.clear()
+        for signal, slot in ((QgsProject.instance().layersAdded, self._enable_count_fields),
+                             (QgsProject.instance().layersWillBeRemoved, self._disable_count_fields)):
+            try:
+                signal.disconnect(slot)
+            except Exception:
+                pass
+        self.attachment_counts.clear()
+        unregister_functions()
+        if self.layer_resolver is not None:
+            self.layer_resolver.clear()
+        self.schema_cache.clear()
+        if self._diagnostics_dialog is not None:
+            try:
+                self._diagnostics_dialog.close()
+                self._diagnostics_dialog.deleteLater()
+            except Exception:
+                pass
+            self._diagnostics_dialog = None
+        if self.provider is not None:
+            try:
+                QgsApplication.processingRegistry().removeProvider(self.provider)
+            except Exception:
+                pass
+            self.provider = None
+        if self.dock_panel is not None:
+            # hủy các task thumbnail của gallery trước khi xóa widget
+            self.dock_panel.feature_page.clear()
         if self.dock:
             try:
                 self.iface.removeDockWidget(self.dock)
@@ -211,10 +428,20 @@ class ArcGisAttachmentsReader:
             except Exception:
                 pass
             self.dock = None
+            self.dock_panel = None
+
+        if self.action is None:
+            # chỉ nạp Processing (qgis_process), chưa có GUI
+            return
 
         try:
             self.iface.removeToolBarIcon(self.action)
             self.iface.removePluginToMenu("ArcGIS Attachments Reader", self.action)
+            self.iface.removePluginToMenu("ArcGIS Attachments Reader", self.all_layers_action)
+            self.iface.removePluginToMenu("ArcGIS Attachments Reader", self.prefetch_action)
+            self.iface.removePluginToMenu("ArcGIS Attachments Reader", self.export_action)
+            self.iface.removePluginToMenu("ArcGIS Attachments Reader", self.count_fields_action)
+            self.iface.removePluginToMenu("ArcGIS Attachments Reader", self.diagnostics_action)
         except Exception:
             pass
 
@@ -231,6 +458,7 @@ class ArcGisAttachmentsReader:
             self.iface.mapCanvas().setMapTool(self.tool)
         else:
             # disable tool: clear highlight and unset
+            self.cancel_identify()
             self.clear_highlight()
             if self.tool:
                 try:
@@ -239,166 +467,512 @@ class ArcGisAttachmentsReader:
                     pass
                 self.tool = None
 
-    # ---------------- Helper: tìm layer attachment linh hoạt ----------------
-    def get_attachment_layer(self, main_layer):
+    # ---------------- Trường số attachment (ATT_COUNT / ATT_BYTES) ----------------
+    def add_count_fields(self):
         """
-        Tìm layer ATTACH tương ứng: tìm theo tên <name>__ATTACH, <name>_ATTACH,
-        hoặc tên chứa main_layer.name() và 'attach', hoặc fallback tìm table có các trường đặc trưng.
+        Thêm trường ảo ATT_COUNT / ATT_BYTES vào lớp đang chọn để tô màu, lọc
+        ("có ảnh", "số attachment"). Đếm một lượt GROUP BY ở nền, cập nhật khi bảng ATTACH đổi.
         """
-        if not main_layer:
-            return None
-
-        target1 = f"{main_layer.name()}__ATTACH".lower()
-        target2 = f"{main_layer.name()}_ATTACH".lower()
-        candidates = []
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer):
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Chưa chọn lớp vector.")
+            return
+        attach_layer = self.get_attachment_layer(layer)
+        if attach_layer is None:
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Không tìm thấy bảng ATTACH của lớp.")
+            return
+        schema = self.get_attachment_schema(layer, attach_layer)
+        if schema.key_idx < 0 or schema.rel_idx < 0:
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Bảng ATTACH thiếu trường REL.")
+            return
+        added = self.attachment_counts.add_fields(layer, attach_layer, schema)
+        if added:
+            self.iface.messageBar().pushInfo(
+                "ArcGIS Attachments", f"Đã thêm trường ATT_COUNT / ATT_BYTES vào lớp {layer.name()}."
+            )
+        else:
+            self.iface.messageBar().pushInfo("ArcGIS Attachments", "Lớp đã có trường ATT_COUNT / ATT_BYTES.")
 
-        for lyr in QgsProject.instance().mapLayers().values():
-            try:
-                lname = lyr.name().lower()
-            except Exception:
+    def _enable_count_fields(self, layers):
+        """Lớp có trường ảo attachment_count()/attachment_bytes() -> bắt đầu đếm nền."""
+        for layer in layers:
+            if not isinstance(layer, QgsVectorLayer) or not uses_count_fields(layer):
                 continue
-            if lname == target1:
-                return lyr
-            if lname == target2:
-                candidates.append(lyr)
-            if main_layer.name().lower() in lname and "attach" in lname:
-                candidates.append(lyr)
-
-        if candidates:
-            return candidates[0]
-
-        # fallback: tìm table có trường REL_* và DATA/ATT_NAME
-        for lyr in QgsProject.instance().mapLayers().values():
             try:
-                fnames = [n.lower() for n in lyr.fields().names()]
+                attach_layer = self.get_attachment_layer(layer)
+                if attach_layer is None:
+                    continue
+                schema = self.get_attachment_schema(layer, attach_layer)
+                if schema.key_idx >= 0 and schema.rel_idx >= 0:
+                    self.attachment_counts.enable(layer, attach_layer, schema)
             except Exception:
-                fnames = []
-            if (("rel_globalid" in fnames or "rel_objectid" in fnames or "rel_fid" in fnames) and
-                ("att_name" in fnames or "name" in fnames) and
-                ("data" in fnames or "attachment" in fnames or "att_data" in fnames)):
-                return lyr
+                pass
 
-        return None
+    def _disable_count_fields(self, layer_ids):
+        for layer_id in layer_ids:
+            self.attachment_counts.disable(layer_id)
 
-    # ---------------- Helper: chuyển blob -> bytes ----------------
-    def _to_bytes(self, blob):
-        if blob is None:
-            return None
-        if isinstance(blob, (bytes, bytearray)):
-            return bytes(blob)
-        try:
-            if isinstance(blob, QByteArray):
-                return bytes(blob)
-        except Exception:
-            pass
-        try:
-            d = blob.data()
-            return bytes(d)
-        except Exception:
-            pass
-        try:
-            return bytes(blob)
-        except Exception:
-            return None
+    # ---------------- Xuất hàng loạt attachment ----------------
+    def export_attachments(self):
+        """
+        Xuất toàn bộ attachment của lớp đang chọn (hoặc chỉ các đối tượng đang chọn)
+        ra thư mục: mỗi feature một thư mục + manifest.csv/json. Chạy nền, hủy được,
+        chạy lại cùng thư mục sẽ tiếp tục phần còn thiếu.
+        """
+        if self._export_task is not None:
+            self.iface.messageBar().pushInfo("ArcGIS Attachments", "Đang xuất attachment, vui lòng chờ.")
+            return
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer):
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Chưa chọn lớp vector.")
+            return
+        attach_layer = self.get_attachment_layer(layer)
+        if attach_layer is None:
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Không tìm thấy bảng ATTACH của lớp.")
+            return
+        schema = self.get_attachment_schema(layer, attach_layer)
+        if schema.key_idx < 0 or schema.rel_idx < 0 or schema.data_idx < 0:
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Bảng ATTACH thiếu trường REL/DATA.")
+            return
+
+        feature_ids = None
+        if layer.selectedFeatureCount() > 0:
+            answer = QMessageBox.question(
+                None, "Export attachments",
+                f"Chỉ xuất attachment của {layer.selectedFeatureCount()} đối tượng đang chọn?\n"
+                "(No = xuất toàn bộ lớp)",
+                MSG_YES | MSG_NO | MSG_CANCEL
+            )
+            if answer == MSG_CANCEL:
+                return
+            if answer == MSG_YES:
+                feature_ids = layer.selectedFeatureIds()
+
+        out_dir = QFileDialog.getExistingDirectory(None, "Thư mục xuất attachment")
+        if not out_dir:
+            return
+
+        index = None
+        if feature_ids is not None:
+            index = self.attachment_index.index_for(attach_layer, schema.rel_name)
+
+        def on_done(task, result):
+            self._export_task = None
+            writer = task.writer
+            if result and writer is not None:
+                msg = f"Đã xuất {writer.written} tệp ({format_size(writer.bytes_written)}) vào {task.out_dir}"
+                if writer.skipped:
+                    msg += f", bỏ qua {writer.skipped}"
+                if writer.failed:
+                    msg += f", lỗi {writer.failed}"
+                    self.iface.messageBar().pushWarning("ArcGIS Attachments", msg)
+                else:
+                    self.iface.messageBar().pushSuccess("ArcGIS Attachments", msg)
+            elif task.error is not None:
+                self.iface.messageBar().pushCritical("ArcGIS Attachments", f"Lỗi khi xuất attachment: {task.error}")
+            else:
+                self.iface.messageBar().pushInfo(
+                    "ArcGIS Attachments", "Đã hủy xuất attachment; chạy lại cùng thư mục để tiếp tục."
+                )
+
+        task = ExportAttachmentsTask(
+            layer, attach_layer, schema, out_dir, feature_ids=feature_ids, index=index,
+            workers=get_setting("export_workers"), resume=True, callback=on_done
+        )
+        self._export_task = task
+        QgsApplication.taskManager().addTask(task)
+
+    # ---------------- Helper: tìm layer attachment linh hoạt ----------------
+    def get_attachment_layer(self, main_layer):
+        """
+        Tìm layer ATTACH tương ứng (xem AttachmentLayerResolver).
+        Kết quả được cache theo layer id, hủy khi project thêm/xóa/đổi tên layer.
+        """
+        return self.layer_resolver.resolve(main_layer)
 
     # ---------------- Lấy attachments list ----------------
+    def get_attachment_schema(self, main_layer, attach_layer):
+        """Schema (index các trường khóa/rel/name/data...) cache theo cặp layer."""
+        return self.schema_cache.get(main_layer, attach_layer)
+
     def get_attachments_for_feature(self, main_layer, feature):
         """
-        Trả về list dict: {"ATT_NAME": name, "data": bytes}
+        Trả về list dict metadata:
+        {"ATT_NAME", "fid", "size", "content_type", "layer_id"}
+        (không đọc BLOB, xem get_attachment_buffer).
         Match rel_field với feature globalid/objectid.
         """
-        # tìm field globalid/objectid trong feature
-        globalid_field = None
-        for f in feature.fields():
-            if f.name().lower() == "globalid":
-                globalid_field = f.name()
-                break
-        if not globalid_field:
-            for f in feature.fields():
-                if f.name().lower() in ("objectid", "fid", "id"):
-                    globalid_field = f.name()
-                    break
-        if not globalid_field:
-            return []
-
-        globalid_value = feature[globalid_field]
-        if globalid_value is None:
-            return []
+        result = self.get_attachments_for_features(main_layer, [feature])
+        return next(iter(result.values()), [])
 
+    def get_attachments_for_features(self, main_layer, features):
+        """
+        Bản batch của get_attachments_for_feature: một truy vấn IN (...) cho
+        nhiều feature. Trả về dict {khóa đã chuẩn hóa: [attachment, ...]}
+        chỉ gồm các feature có attachment.
+        """
         attach_layer = self.get_attachment_layer(main_layer)
         if not attach_layer:
-            return []
-
-        attach_fields = [n for n in attach_layer.fields().names()]
-        lower_fields = [n.lower() for n in attach_fields]
-
-        name_candidates = ["att_name", "name", "filename", "file_name"]
-        data_candidates = ["data", "attachment", "att_data", "blob"]
-        rel_candidates = ["rel_globalid", "rel_objectid", "rel_fid", "parent_globalid", "relid"]
-
-        name_field = None
-        for c in name_candidates:
-            if c in lower_fields:
-                name_field = attach_fields[lower_fields.index(c)]
-                break
-
-        data_field = None
-        for c in data_candidates:
-            if c in lower_fields:
-                data_field = attach_fields[lower_fields.index(c)]
-                break
-
-        rel_field = None
-        for c in rel_candidates:
-            if c in lower_fields:
-                rel_field = attach_fields[lower_fields.index(c)]
-                break
-
-        attachments = []
-        # iterate attachment table
-        for att_feat in attach_layer.getFeatures():
-            try:
-                if rel_field:
-                    rel_val = att_feat[rel_field]
-                else:
-                    continue
-            except Exception:
-                continue
+            return {}
 
-            if rel_val is None:
-                continue
+        schema = self.get_attachment_schema(main_layer, attach_layer)
+        if schema.key_idx < 0 or schema.rel_idx < 0:
+            return {}
 
-            if str(rel_val).upper() != str(globalid_value).upper():
-                continue
+        keys = feature_keys(features, schema)
+        if not keys:
+            return {}
+
+        # chỉ mục dùng được nếu đã sẵn sàng; nếu chưa thì lọc phía provider
+        index = self.attachment_index.index_for(attach_layer, schema.rel_name)
+        return query_attachments_cached(attach_layer, schema, keys, index, attach_layer.id(), self.metadata_cache)
+
+    def request_attachments(self, main_layer, feature, callback):
+        """
+        Bản chạy nền của get_attachments_for_feature (AttachmentListTask):
+        callback(attachments, error) được gọi trên main thread khi xong.
+        Không có bảng ATTACH / trường khóa -> callback([], None) ngay.
+        """
+        attach_layer = self.get_attachment_layer(main_layer)
+        schema = self.get_attachment_schema(main_layer, attach_layer) if attach_layer else None
+        if schema is None or schema.key_idx < 0 or schema.rel_idx < 0:
+            callback([], None)
+            return None
+        index = self.attachment_index.index_for(attach_layer, schema.rel_name)
+
+        def on_done(task, result):
+            self._list_tasks.discard(task)
+            if not result and task.error is None:
+                # bị hủy (unload)
+                return
+            callback(task.attachments if result else [], task.error)
+
+        task = AttachmentListTask(main_layer, feature, attach_layer, schema, index,
+                                  metadata_cache=self.metadata_cache, callback=on_done)
+        self._list_tasks.add(task)
+        QgsApplication.taskManager().addTask(task)
+        return task
+
+    def get_attachment_buffer(self, attachment):
+        """
+        Pha 2: đọc BLOB của một attachment theo feature id (chỉ khi cần).
+        Trả về AttachmentBuffer (bọc dữ liệu của provider, không sao chép) hoặc None.
+        """
+        attach_layer = QgsProject.instance().mapLayer(attachment.get("layer_id"))
+        if attach_layer is None:
+            return None
+        data_idx = self.schema_cache.attach_roles(attach_layer)["data"]
+        return read_attachment_buffer(attach_layer, data_idx, attachment["fid"])
+
+    # ---------------- Identify chạy nền ----------------
+    # gom các click liên tiếp trong khoảng này (ms), chỉ chạy click cuối
+    IDENTIFY_COALESCE_MS = 50
+
+    def start_identify(self, layer, rect):
+        """
+        Identify không chặn GUI: hủy task đang chạy, gom click liên tiếp,
+        chạy IdentifyTask cho click mới nhất và hiển thị trạng thái đang tải.
+        layer=None: identify mọi lớp đang hiển thị có bảng ATTACH
+        (rect theo tọa độ bản đồ).
+        """
+        self._queue_identify((layer, rect, ClickTrace(), None))
+
+    def start_area_identify(self, layer, geometry):
+        """
+        Chọn theo hình chữ nhật / polygon (geometry theo tọa độ bản đồ): mọi feature
+        trong vùng, đếm attachment một lượt cho tất cả khóa, hiển thị danh sách theo trang.
+        layer=None: mọi lớp đang hiển thị có bảng ATTACH.
+        """
+        self._queue_identify((layer, geometry.boundingBox(), ClickTrace(), geometry))
+
+    def _queue_identify(self, pending):
+        self._pending_identify = pending
+        self._cancel_identify_task()
+        # click thật luôn được ưu tiên hơn prefetch
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+        self.show_loading()
+        self._identify_timer.start(self.IDENTIFY_COALESCE_MS)
+
+    def cancel_identify(self):
+        """Hủy identify đang chờ/đang chạy (ESC, tắt tool)."""
+        if self._identify_timer is not None:
+            self._identify_timer.stop()
+        self._pending_identify = None
+        self._cancel_identify_task()
+
+    def _launch_identify(self):
+        pending = self._pending_identify
+        self._pending_identify = None
+        if pending is None:
+            return
+        layer, rect, trace, area = pending
+        trace.since_stamp("wait")
+        if self.profile_capture.claim():
+            trace.profiler = self.profile_capture
+        if area is not None:
+            layers = None
+            if layer is not None:
+                attach_layer = self.get_attachment_layer(layer)
+                layers = [(layer, attach_layer)] if attach_layer is not None else []
+            self._launch_identify_all(rect, trace, area, layers)
+            return
+        if layer is None:
+            self._launch_identify_all(rect, trace)
+            return
 
-            # name
-            fname = None
-            if name_field:
+        with trace.profile(), trace.span("resolve"):
+            attach_layer = self.get_attachment_layer(layer)
+            schema = None
+            index = None
+            if attach_layer is not None:
+                schema = self.get_attachment_schema(layer, attach_layer)
+                if schema.key_idx < 0 or schema.rel_idx < 0:
+                    schema = None
+                else:
+                    index = self.attachment_index.index_for(attach_layer, schema.rel_name)
+            locator = self.spatial_locator.locator_for(layer) if get_setting("spatial_index_enabled") else None
+
+        task = IdentifyTask(layer, rect, attach_layer, schema, index, callback=self._on_identify_finished,
+                            image_cache=self.image_cache, disk_cache=self.disk_cache, trace=trace,
+                            metadata_cache=self.metadata_cache, locator=locator)
+        task.progressChanged.connect(self._on_identify_progress)
+        self._identify_task = task
+        QgsApplication.taskManager().addTask(task)
+
+    def identify_busy(self):
+        """Còn click đang chờ hoặc identify đang chạy."""
+        return (self._pending_identify is not None or self._identify_task is not None
+                or self._layer_tasks is not None)
+
+    def _cancel_identify_task(self):
+        task = self._identify_task
+        self._identify_task = None
+        if task is not None:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        batch = self._layer_tasks
+        self._layer_tasks = None
+        if batch is not None:
+            for task in batch["tasks"]:
                 try:
-                    fname = att_feat[name_field]
+                    task.cancel()
                 except Exception:
-                    fname = None
-            if not fname:
-                fname = f"attachment_{att_feat.id()}"
+                    pass
+
+    def _on_identify_progress(self, progress):
+        if self._loading_bar is not None:
+            try:
+                self._loading_bar.setValue(int(progress))
+            except Exception:
+                self._loading_bar = None
 
-            # data
-            blob = None
-            if data_field:
+    def _on_identify_finished(self, task, result):
+        # chỉ hiển thị kết quả của task mới nhất
+        if task is not self._identify_task:
+            return
+        self._identify_task = None
+        if not result:
+            if task.error is not None:
+                QMessageBox.warning(None, "Lỗi", f"Lỗi khi hiển thị kết quả: {task.error}")
+            self.clear_results_panel()
+            return
+        trace = task.trace
+        if task.feature is None:
+            self.clear_highlight()
+            self.clear_results_panel()
+            self._record_latency(trace)
+            return
+        with trace.profile():
+            with trace.span("highlight"):
                 try:
-                    blob = att_feat[data_field]
+                    self.highlight_feature(task.layer, task.feature)
                 except Exception:
-                    blob = None
-
-            raw = self._to_bytes(blob)
-            if raw is None:
+                    pass
+            try:
+                with trace.span("dock"):
+                    self.show_feature_in_dock(task.layer, task.feature, task.attachments)
+            except Exception as e:
+                QMessageBox.warning(None, "Lỗi", f"Lỗi khi hiển thị kết quả: {e}")
+                return
+        self._record_latency(trace)
+        if self.prefetcher is not None:
+            self.prefetcher.note_identify(task.layer, task.feature)
+
+    def _toggle_prefetch(self, checked):
+        set_setting("prefetch_enabled", bool(checked))
+        if self.prefetcher is not None:
+            if checked:
+                self.prefetcher.schedule()
+            else:
+                self.prefetcher.cancel()
+
+    # ---------------- Identify nhiều lớp ----------------
+    def identify_layers(self):
+        """[(layer, layer ATTACH)] của các lớp vector đang hiển thị trên canvas có attachment."""
+        result = []
+        for layer in self.iface.mapCanvas().layers():
+            if not isinstance(layer, QgsVectorLayer) or not layer.isSpatial():
                 continue
+            attach_layer = self.get_attachment_layer(layer)
+            if attach_layer is None or attach_layer.id() == layer.id():
+                continue
+            result.append((layer, attach_layer))
+        return result
+
+    def _launch_identify_all(self, rect, trace, area=None, layers=None):
+        """
+        Một LayerIdentifyTask cho mỗi lớp, chạy song song trong task manager.
+        area (QgsGeometry, tọa độ bản đồ): chọn theo vùng; layers: [(layer, layer ATTACH)]
+        (mặc định mọi lớp đang hiển thị có attachment).
+        """
+        max_features = get_setting("area_max_features" if area is not None else "identify_max_features")
+        map_settings = self.iface.mapCanvas().mapSettings()
+        if layers is None:
+            layers = self.identify_layers()
+        tasks = []
+        with trace.profile(), trace.span("resolve"):
+            for layer, attach_layer in layers:
+                schema = self.get_attachment_schema(layer, attach_layer)
+                if schema.key_idx < 0 or schema.rel_idx < 0:
+                    continue
+                index = self.attachment_index.index_for(attach_layer, schema.rel_name)
+                layer_area = None
+                if area is not None:
+                    layer_area = QgsGeometry(area)
+                    try:
+                        layer_area.transform(QgsCoordinateTransform(
+                            map_settings.destinationCrs(), layer.crs(), QgsProject.instance()
+                        ))
+                    except Exception:
+                        continue
+                    layer_rect = layer_area.boundingBox()
+                else:
+                    layer_rect = map_settings.mapToLayerCoordinates(layer, rect)
+                tasks.append(LayerIdentifyTask(
+                    layer, layer_rect, attach_layer, schema,
+                    index, max_features, callback=self._on_layer_identify_finished, geometry=layer_area
+                ))
+        if not tasks:
+            self.clear_results_panel()
+            self.iface.messageBar().pushInfo(
+                "ArcGIS Attachments", "Không có lớp nào đang hiển thị có bảng attachment."
+            )
+            return
+
+        trace.stamp()
+        self._layer_tasks = {"tasks": tasks, "done": set(), "progress": {}, "trace": trace}
+        for task in tasks:
+            task.progressChanged.connect(lambda progress, task=task: self._on_layer_identify_progress(task, progress))
+            QgsApplication.taskManager().addTask(task)
+
+    def _on_layer_identify_progress(self, task, progress):
+        batch = self._layer_tasks
+        if batch is None or task not in batch["tasks"]:
+            return
+        batch["progress"][task] = progress
+        self._on_identify_progress(sum(batch["progress"].values()) / len(batch["tasks"]))
+
+    def _on_layer_identify_finished(self, task, result):
+        batch = self._layer_tasks
+        if batch is None or task not in batch["tasks"]:
+            return
+        batch["done"].add(task)
+        batch["progress"][task] = 100
+        self._on_identify_progress(sum(batch["progress"].values()) / len(batch["tasks"]))
+        if len(batch["done"]) < len(batch["tasks"]):
+            return
+        self._layer_tasks = None
+
+        trace = batch["trace"]
+        trace.since_stamp("query")
+        hits = [t for t in batch["tasks"] if t.features and t.error is None]
+        errors = [t for t in batch["tasks"] if t.error is not None]
+        for t in errors:
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", f"{t.layer.name()}: {t.error}")
+        if not hits:
+            self.clear_highlight()
+            self.clear_results_panel()
+            self._record_latency(trace)
+            return
 
-            attachments.append({
-                "ATT_NAME": str(fname),
-                "data": raw
-            })
+        with trace.profile():
+            if len(hits) == 1 and len(hits[0].features) == 1:
+                # một feature duy nhất: hiển thị chi tiết như identify một lớp
+                layer, feature = hits[0].layer, hits[0].features[0]
+                with trace.span("highlight"):
+                    try:
+                        self.highlight_feature(layer, feature)
+                    except Exception:
+                        pass
+                with trace.span("dock"):
+                    self.show_feature_in_dock(layer, feature)
+            else:
+                self.clear_highlight()
+                with trace.span("dock"):
+                    self.show_layer_results(hits)
+        self._record_latency(trace)
+
+    def show_layer_results(self, layer_tasks):
+        """Dock: cây kết quả theo lớp; attachment của feature được tải khi mở nút."""
+        self._ensure_dock()
+        self._loading_bar = None
+
+        self._dock_token += 1
+        tree = IdentifyResultsTree(self.request_attachments)
+        for task in layer_tasks:
+            tree.add_layer(task.layer, task.features, task.counts, task.schema, task.truncated)
+        tree.featureSelected.connect(self._on_result_feature_selected)
+        tree.featureActivated.connect(self.show_feature_in_dock)
+        tree.attachmentActivated.connect(self._activate_attachment)
+
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        summary = QLabel(f"{tree.feature_count()} features in {len(layer_tasks)} layers. "
+                         "Double-click a feature for details.")
+        summary.setWordWrap(True)
+        layout.addWidget(summary)
+        layout.addWidget(tree)
+        self._set_dock_widget(container)
+        self.dock.show()
+
+    def _on_result_feature_selected(self, layer, feature):
+        try:
+            self.highlight_feature(layer, feature)
+        except Exception:
+            pass
 
-        return attachments
+    def _activate_attachment(self, attachment):
+        """Mở attachment: ảnh -> viewer, còn lại -> ứng dụng mặc định (tệp tạm)."""
+        ext = os.path.splitext(attachment.get("ATT_NAME", ""))[1].lower()
+        try:
+            if ext in (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff"):
+                self.show_attachment_image(attachment)
+            else:
+                self.open_attachment_file(attachment)
+        except Exception as e:
+            QMessageBox.warning(None, "Lỗi", f"Không thể mở tệp: {e}")
+
+    # ---------------- Chẩn đoán độ trễ ----------------
+    def _record_latency(self, trace):
+        self.latency.record(trace)
+        if get_setting("latency_logging"):
+            QgsMessageLog.logMessage(format_trace(trace), "ArcGIS Attachments", Qgis.Info)
+
+    def show_diagnostics(self):
+        if self._diagnostics_dialog is None:
+            caches = [("Thumbnails / previews (RAM)", self.image_cache),
+                      ("Attachment metadata (RAM)", self.metadata_cache)]
+            if self.disk_cache is not None:
+                caches.append(("Thumbnails (disk)", self.disk_cache))
+            self._diagnostics_dialog = LatencyDiagnosticsDialog(
+                self.latency, self.profile_capture, self.iface.mainWindow(), caches=caches
+            )
+        self._diagnostics_dialog.show()
+        self._diagnostics_dialog.raise_()
+        self._diagnostics_dialog.activateWindow()
 
     # ---------------- Highlight management ----------------
     def clear_highlight(self):
@@ -482,11 +1056,7 @@ class ArcGisAttachmentsReader:
             rb.show()
 
     # ---------------- Dock UI (replace dialog) ----------------
-    def show_feature_in_dock(self, layer, feature):
-        """
-        Tạo/Update Dock widget hiển thị kết quả identify.
-        Nếu dock đã tồn tại, cập nhật nội dung (không tạo dock mới).
-        """
+    def _ensure_dock(self):
         # Nếu dock chưa tồn tại, tạo mới và add vào main window
         if not self.dock:
             self.dock = QDockWidget("Identify - ArcGIS Attachments", self.iface.mainWindow())
@@ -497,360 +1067,259 @@ class ArcGisAttachmentsReader:
             
             # ensure highlight cleared when dock closed
             self.dock.visibilityChanged.connect(lambda visible: (self.clear_highlight() if not visible else None))
+
+            # nội dung dựng một lần; mỗi click chỉ đổi trang / thay dữ liệu model
+            self.dock_panel = DockPanel(self.image_cache, self.disk_cache)
+            page = self.dock_panel.feature_page
+            page.thumbnailClicked.connect(self._on_dock_thumbnail_clicked)
+            page.pdfClicked.connect(self._on_dock_pdf_clicked)
+            page.attachmentActivated.connect(self._on_gallery_attachment)
+            self.dock.setWidget(self.dock_panel)
             self.iface.addDockWidget(DOCK_RIGHT, self.dock)
 
-        # container widget
-        container = QWidget()
-        layout = QVBoxLayout(container)
+    def _set_dock_widget(self, widget):
+        """Hiển thị widget (kết quả nhiều lớp) trong dock, xóa widget kết quả cũ."""
+        self.dock_panel.show_results_page(widget)
+
+    def show_loading(self):
+        """Hiển thị trạng thái đang tải (có tiến độ) trong dock khi identify chạy nền."""
+        self._ensure_dock()
+        self._dock_attachment = None
+        self._dock_token += 1
+        # kết quả cũ sắp bị thay: trả các BLOB đang giữ
+        self.payloads.release_all()
+        self._loading_bar = self.dock_panel.show_message("Đang tải...", progress=True)
+        self.dock.show()
 
-        # reset attachment map
-        self._attachment_map = {}
+    def show_feature_in_dock(self, layer, feature, attachments=None):
+        """
+        Cập nhật dock hiển thị kết quả identify (dock và widget chỉ tạo một lần).
+        attachments: metadata đã truy vấn sẵn (từ IdentifyTask); None -> truy vấn ở
+        thread nền, dock hiện "Đang tải..." rồi hiển thị khi xong.
+        """
+        self._ensure_dock()
+        self._loading_bar = None
 
-        # get attachments
-        attachments = self.get_attachments_for_feature(layer, feature)
-        self.current_pixmap = None
+        self._dock_attachment = None
+        # bỏ kết quả thumbnail nền của click trước
+        self._thumbnail_token += 1
+        self._dock_token += 1
 
-        # --- Thumbnail area (if first attachment is image) ---
-        thumb_label = QLabel()
-        thumb_label.setAlignment(ALIGN_CENTER)
-        thumb_label.setSizePolicy(SIZE_EXPANDING, SIZE_FIXED)
+        if attachments is None:
+            self._request_dock_attachments(layer, feature)
+            return
 
-        if attachments and len(attachments) > 0:
+        page = self.dock_panel.show_feature_page()
+        page.clear_preview()
+
+        # --- Thumbnail area (if first attachment is image) ---
+        if attachments:
             first = attachments[0]
             fname0 = first.get("ATT_NAME", "")
-            data0 = first.get("data", b"")
             ext0 = os.path.splitext(fname0)[1].lower()
             if ext0 in (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff"):
-                pm = QPixmap()
-                if pm.loadFromData(data0):
-                    scaled = pm.scaledToWidth(420, SMOOTH_TRANSFORMATION)
-                    thumb_label.setPixmap(scaled)
-                    self.current_pixmap = pm
-                    thumb_label.setCursor(POINTING_HAND_CURSOR)
-                    thumb_label.mousePressEvent = lambda e: self.show_full_image(self.current_pixmap)
-                    thumb_label.setMinimumHeight(200)
-                    layout.addWidget(thumb_label)
+                # thumbnail đã giải mã thu nhỏ ở thread nền (IdentifyTask);
+                # ảnh gốc chỉ giải mã khi mở viewer
+                if first.get("thumbnail") is not None:
+                    self._dock_attachment = first
+                    page.show_thumbnail(first["thumbnail"])
+                elif "thumbnail" not in first:
+                    self._dock_attachment = first
+                    page.show_thumbnail(text="Đang tải ảnh...")
+                    self._request_thumbnail(first, page)
             elif ext0 == ".pdf":
-                btn_pdf = QPushButton(f"Mở PDF: {fname0}")
-                def open_pdf0():
-                    tmpf = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(fname0)[1])
-                    try:
-                        tmpf.write(data0)
-                        tmpf.close()
-                        QDesktopServices.openUrl(QUrl.fromLocalFile(tmpf.name))
-                    except Exception as e:
-                        QMessageBox.warning(None, "Lỗi", f"Không thể mở PDF: {e}")
-                btn_pdf.clicked.connect(open_pdf0)
-                layout.addWidget(btn_pdf)
-            else:
-                # no thumbnail for non-image
-                pass
-
-        # --- Files list (links) ---
-        if attachments and len(attachments) > 0:
-            files_label = QLabel()
-            files_label.setTextInteractionFlags(TEXT_BROWSER_INTERACTION)
-            files_label.setOpenExternalLinks(False)
-            files_label.setWordWrap(True)
-            html_parts = ['<b>Files attachment:</b> ']
-            for i, att in enumerate(attachments):
-                fname = att.get("ATT_NAME", f"attachment_{i+1}")
-                key = f"attach://{i}"
-                html_parts.append(f'<a href="{key}">{fname}</a>')
-                if i < len(attachments)-1:
-                    html_parts.append(", ")
-                # store
-                self._attachment_map[key] = {"name": fname, "data": att.get("data")}
-            files_label.setText("".join(html_parts))
-
-            def handle_link(url):
-                info = self._attachment_map.get(url)
-                if not info:
-                    return
-                fname = info["name"]
-                data = info["data"]
-                raw = data if isinstance(data, (bytes, bytearray)) else bytes(data)
-                ext = os.path.splitext(fname)[1].lower()
-                if ext in (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff"):
-                    pix = QPixmap()
-                    if pix.loadFromData(raw):
-                        self.show_full_image(pix)
-                    else:
-                        QMessageBox.warning(None, "Lỗi", "Không thể hiển thị ảnh.")
-                    return
-                if ext == ".pdf":
-                    try:
-                        tmpf = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-                        tmpf.write(raw)
-                        tmpf.close()
-                        QDesktopServices.openUrl(QUrl.fromLocalFile(tmpf.name))
-                    except Exception as e:
-                        QMessageBox.warning(None, "Lỗi", f"Không thể mở PDF: {e}")
-                    return
-                # other files -> save as
-                path, _ = QFileDialog.getSaveFileName(None, "Lưu tệp", fname)
-                if path:
-                    try:
-                        with open(path, "wb") as f:
-                            f.write(raw)
-                        QMessageBox.information(None, "Tải về", f"Đã lưu tệp:\n{path}")
-                    except Exception as e:
-                        QMessageBox.warning(None, "Lỗi", f"Không thể lưu tệp: {e}")
-
-            files_label.linkActivated.connect(handle_link)
-            layout.addWidget(files_label)
-
-        # If no attachments => don't reserve large thumbnail space (so attributes fill)
-        # --- Attribute table ---
-        info_group = QGroupBox("Infomation")
-        info_group.setStyleSheet("""
-            QGroupBox {
-                font-weight: bold;
-                border: 2px solid #4a90e2;
-                border-radius: 8px;
-                margin-top: 10px;
-                background-color: #f9f9f9;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                subcontrol-position: top left;
-                padding: 0 5px;
-                color: #4a90e2;
-            }
-        """)
-
-        table = QTableWidget()
-        table.setColumnCount(2)
-        # header left alignment
-        table.setHorizontalHeaderLabels(["Field", "Value"])
-        header = table.horizontalHeader()
-        header.setDefaultAlignment(HEADER_ALIGN_LEFT | ALIGN_VCENTER)
-
-        # Unified styling for all platforms and Qt versions
-        table.setAlternatingRowColors(True)
-        
-        # Set base colors using both palette and stylesheet for maximum compatibility
-        pal = table.palette()
-        pal.setColor(PALETTE_BASE, QColor("#ffffff"))
-        pal.setColor(PALETTE_ALTERNATE_BASE, QColor("#f7faff"))
-        table.setPalette(pal)
-
-        # Universal stylesheet that works on all platforms
-        table.setStyleSheet("""
-            QTableWidget {
-                background-color: #ffffff;
-                alternate-background-color: #f7faff;
-                gridline-color: #e0e0e0;
-                font-size: 13px;
-                border: 1px solid #d0d0d0;
-                selection-background-color: #e0e9ff;
-                selection-color: black;
-            }
-            QTableWidget::item {
-                border-bottom: 1px solid #e0e0e0;
-                padding: 2px;
-                color: black;
-            }
-            QTableWidget::item:alternate {
-                background-color: #f7faff;
-            }
-            QHeaderView::section {
-                background-color: #f0f0f0;
-                color: black;
-                font-weight: bold;
-                padding: 4px;
-                border: 1px solid #ccc;
-            }
-            QHeaderView {
-                background-color: #f0f0f0;
-            }
-            QTableWidget::item:selected {
-                background-color: #e0e9ff;
-                color: black;
-            }
-        """)
-
-        table.verticalHeader().setVisible(False)
-        table.setEditTriggers(NO_EDIT_TRIGGERS)
-        table.setSelectionMode(SINGLE_SELECTION)
-        table.setWordWrap(True)
-        table.horizontalHeader().setStretchLastSection(True)
-        table.horizontalHeader().setDefaultSectionSize(180)
-
-        fields = layer.fields()
-        table.setRowCount(len(fields))
-
-        for row, field in enumerate(fields):
-            field_name = field.alias() if field.alias() else field.name()
-            try:
-                value = feature[field.name()]
-            except Exception:
-                value = None
-            if value in [None, ""]:
-                value = "<Null>"
+                self._dock_attachment = first
+                page.show_pdf_button(fname0)
+
+        # --- Files (gallery: thumbnail chỉ giải mã cho ô đang hiển thị) ---
+        attach_layer = None
+        data_idx = -1
+        if attachments:
+            attach_layer = QgsProject.instance().mapLayer(attachments[0].get("layer_id"))
+            if attach_layer is not None:
+                data_idx = self.schema_cache.attach_roles(attach_layer)["data"]
+        page.set_attachments(attachments, attach_layer, data_idx)
+
+        # --- Attribute table --- (model chỉ định dạng các ô đang hiển thị)
+        page.set_feature(layer, feature)
+        self.dock.show()
 
-            key_item = QTableWidgetItem(str(field_name))
-            val_item = QTableWidgetItem(str(value))
+    def _request_dock_attachments(self, layer, feature):
+        self.dock_panel.show_message("Đang tải...")
+        self.dock.show()
+        token = self._dock_token
 
-            key_item.setTextAlignment(ALIGN_LEFT | ALIGN_VCENTER)
-            val_item.setTextAlignment(ALIGN_LEFT | ALIGN_VCENTER)
+        def on_done(attachments, error):
+            if token != self._dock_token:
+                return
+            if error is not None:
+                self.dock_panel.show_message(f"Lỗi khi tải attachment: {error}")
+                return
+            try:
+                self.show_feature_in_dock(layer, feature, attachments)
+            except RuntimeError:
+                # dock đã bị xóa (unload)
+                pass
 
-            key_item.setFlags(ITEM_IS_ENABLED)
-            val_item.setFlags(ITEM_IS_ENABLED | ITEM_IS_SELECTABLE)
+        self.request_attachments(layer, feature, on_done)
 
-            table.setItem(row, 0, key_item)
-            table.setItem(row, 1, val_item)
+    def _on_dock_thumbnail_clicked(self):
+        if self._dock_attachment is not None:
+            self.show_attachment_image(self._dock_attachment)
 
-        table.resizeRowsToContents()
+    def _on_dock_pdf_clicked(self):
+        if self._dock_attachment is None:
+            return
+        try:
+            self.open_attachment_file(self._dock_attachment)
+        except Exception as e:
+            QMessageBox.warning(None, "Lỗi", f"Không thể mở PDF: {e}")
+
+    def _on_gallery_attachment(self, attachment):
+        """Mở một ô gallery: PDF -> ứng dụng mặc định, ảnh -> viewer, còn lại -> lưu tệp."""
+        fname = attachment.get("ATT_NAME", "attachment")
+        ext = os.path.splitext(fname)[1].lower()
+        if ext == ".pdf":
+            # tệp tạm đã có thì mở ngay, không đọc lại BLOB
+            try:
+                self.open_attachment_file(attachment)
+            except Exception as e:
+                QMessageBox.warning(None, "Lỗi", f"Không thể mở PDF: {e}")
+            return
+        if ext in (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff"):
+            # không đọc BLOB ở đây: ảnh lớn đi đường tệp tạm (mmap) của show_attachment_image
+            self.show_attachment_image(attachment)
+            return
+        # other files -> save as
+        path, _ = QFileDialog.getSaveFileName(None, "Lưu tệp", fname)
+        if path:
+            try:
+                if not self.save_attachment(attachment, path):
+                    QMessageBox.warning(None, "Lỗi", "Không đọc được dữ liệu tệp.")
+                    return
+                QMessageBox.information(None, "Tải về", f"Đã lưu tệp:\n{path}")
+            except Exception as e:
+                QMessageBox.warning(None, "Lỗi", f"Không thể lưu tệp: {e}")
 
-        layout_info = QVBoxLayout()
-        layout_info.addWidget(table)
-        info_group.setLayout(layout_info)
+    def save_attachment(self, attachment, path):
+        """
+        Ghi attachment ra path. Tệp lớn (>= payload_spill_mb) đi qua tệp tạm được
+        quản lý (dùng lại nếu đã có) rồi sao chép, không giữ BLOB trong RAM.
+        Trả về False nếu không đọc được dữ liệu.
+        """
+        if (attachment.get("size") or 0) >= self.payloads.spill_bytes:
+            temp_path = self.temp_files.materialize(
+                self._attachment_identity(attachment), attachment.get("ATT_NAME"),
+                lambda: self.get_attachment_buffer(attachment)
+            )
+            if temp_path is None:
+                return False
+            shutil.copyfile(temp_path, path)
+            return True
+        raw = self.get_attachment_buffer(attachment)
+        if raw is None:
+            return False
+        raw.write_to(path)
+        return True
+
+    # ---------------- Thumbnail / ảnh gốc ----------------
+    def _request_thumbnail(self, attachment, page):
+        """Giải mã thumbnail ở thread nền rồi hiển thị trên trang feature (nếu vẫn là click đó)."""
+        attach_layer = QgsProject.instance().mapLayer(attachment.get("layer_id"))
+        if attach_layer is None:
+            page.clear_preview()
+            return
+        data_idx = self.schema_cache.attach_roles(attach_layer)["data"]
+        key = image_cache_key(attach_layer.source(), attachment["fid"], THUMBNAIL_WIDTH)
+        image = self.image_cache.get(key)
+        if image is not None:
+            page.show_thumbnail(image)
+            return
+        self._thumbnail_token += 1
+        token = self._thumbnail_token
 
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setWidget(info_group)
-        scroll.setMinimumHeight(200)
-        layout.addWidget(scroll)
+        def on_done(task, result):
+            self._thumbnail_tasks.discard(task)
+            if token != self._thumbnail_token:
+                return
+            try:
+                if result and task.image is not None:
+                    page.show_thumbnail(task.image)
+                else:
+                    page.show_thumbnail(text="Không thể hiển thị ảnh.")
+            except RuntimeError:
+                # dock đã bị xóa (unload)
+                pass
 
-        # bottom buttons (Close dock)
-        btn_layout = QHBoxLayout()        
-        def close_dock():
-            if self.dock:
-                try:
-                    self.iface.removeDockWidget(self.dock)
-                except Exception:
-                    pass
-                try:
-                    self.dock.deleteLater()
-                except Exception:
-                    pass
-                self.dock = None
-            self.clear_highlight()
-        
-        btn_layout.addStretch()        
-        layout.addLayout(btn_layout)
-        container.setLayout(layout)
-        self.dock.setWidget(container)
-        self.dock.show()
-        # ensure highlight shows and is cleared when dock closed (we connected visibility earlier)
+        task = ThumbnailTask(QgsVectorLayerFeatureSource(attach_layer), data_idx, attachment["fid"],
+                             callback=on_done, cache=self.image_cache, cache_key=key,
+                             disk_cache=self.disk_cache)
+        self._thumbnail_tasks.add(task)
+        QgsApplication.taskManager().addTask(task)
 
-    # ---------------- Image viewer (modal) ----------------
-    def show_full_image(self, pixmap):
-        """Modal image viewer - Fit / 1:1 / pan / scroll"""
-        if pixmap is None:
-            return
-
-        from qgis.PyQt.QtWidgets import QDialog, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QScrollArea, QSizePolicy
-
-        class ImageViewer(QDialog):
-            def __init__(self, pixmap, parent=None):
-                super().__init__(parent)
-                self.setWindowTitle("Zoom")
-                self.resize(900, 700)
-                self._pixmap_original = pixmap
-                self._is_fit_mode = True
-                self._panning = False
-                self._pan_start_point = QPoint()
-                self._scale_factor = 1.0
-
-                self.layout = QVBoxLayout(self)
-
-                self.img_label = QLabel()
-                self.img_label.setAlignment(ALIGN_CENTER)
-                self.img_label.setSizePolicy(SIZE_IGNORED, SIZE_IGNORED)
-                self.img_label.setScaledContents(False)
-
-                self.scroll = QScrollArea()
-                self.scroll.setWidget(self.img_label)
-                self.scroll.setWidgetResizable(False)  
-                self.scroll.setAlignment(ALIGN_CENTER)
-                self.layout.addWidget(self.scroll)
-
-                self.toggle_btn = QPushButton("Fit")
-                self.toggle_btn.clicked.connect(self.toggle_mode)
-                self.close_btn = QPushButton("Close")
-                self.close_btn.clicked.connect(self.close)
-
-                btn_layout = QHBoxLayout()
-                btn_layout.addWidget(self.toggle_btn)
-                btn_layout.addStretch()
-                btn_layout.addWidget(self.close_btn)
-                self.layout.addLayout(btn_layout)
-
-                self.update_scaled_image()
-
-            def toggle_mode(self):
-                self._is_fit_mode = not self._is_fit_mode
-                self.toggle_btn.setText("Original" if self._is_fit_mode else "Fit")
-                if self._is_fit_mode:
-                    self._scale_factor = 1.0
-                self.update_scaled_image()
-
-            def update_scaled_image(self):
-                if self._is_fit_mode:
-                    area_size = self.scroll.viewport().size()
-                    scaled = self._pixmap_original.scaled(
-                        area_size, KEEP_ASPECT_RATIO, SMOOTH_TRANSFORMATION
-                    )
-                else:
-                    size = self._pixmap_original.size() * self._scale_factor
-                    scaled = self._pixmap_original.scaled(
-                        size, KEEP_ASPECT_RATIO, SMOOTH_TRANSFORMATION
-                    )
-
-                self.img_label.setPixmap(scaled)
-                self.img_label.resize(scaled.size())  
-
-            def wheelEvent(self, event):
-                if self._is_fit_mode:
-                    self._is_fit_mode = False
-                    self.toggle_btn.setText("Fit")
-
-                # Qt6 compatible wheel delta
-                if QT_VERSION >= 6:
-                    delta = event.angleDelta().y()
-                else:
-                    delta = event.angleDelta().y()
+    def open_attachment_file(self, attachment):
+        """
+        Ghi attachment vào thư mục tạm được quản lý (dùng lại nếu đã có) và mở
+        bằng ứng dụng mặc định của hệ điều hành.
+        """
+        path = self.temp_files.materialize(
+            self._attachment_identity(attachment), attachment.get("ATT_NAME"),
+            lambda: self.get_attachment_buffer(attachment)
+        )
+        if path is None:
+            QMessageBox.warning(None, "Lỗi", "Không đọc được dữ liệu tệp.")
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(path))
 
-                # Zoom in/out 15%
-                if delta > 0:
-                    self._scale_factor *= 1.15
-                else:
-                    self._scale_factor /= 1.15
+    def _attachment_identity(self, attachment):
+        """Định danh attachment cho tệp tạm: nguồn + fid + dấu vân tay nguồn + kích thước."""
+        attach_layer = QgsProject.instance().mapLayer(attachment.get("layer_id"))
+        source = attach_layer.source() if attach_layer is not None else attachment.get("layer_id")
+        # dấu vân tay nguồn: dữ liệu đổi thì không dùng lại tệp cũ
+        return f"{source}|{attachment['fid']}|{source_fingerprint(source)}|{attachment.get('size')}"
 
-                # Giới hạn zoom
-                self._scale_factor = max(0.1, min(self._scale_factor, 20.0))
+    def show_attachment_image(self, attachment, raw=None):
+        """
+        Mở viewer; ảnh gốc được giải mã theo mức/tile khi cần (xem image_viewer).
+        BLOB được giữ trong ngân sách payload khi viewer mở và trả lại khi đóng;
+        ảnh lớn (>= payload_spill_mb) đọc thẳng từ tệp tạm.
+        """
+        identity = self._attachment_identity(attachment)
+        name = attachment.get("ATT_NAME")
+        # preview (mức PREVIEW_WIDTH) dùng chung cache ảnh với thumbnail, khóa riêng
+        attach_layer = QgsProject.instance().mapLayer(attachment.get("layer_id"))
+        preview_key = None
+        if attach_layer is not None:
+            preview_key = image_cache_key(attach_layer.source(), attachment["fid"], PREVIEW_WIDTH)
+        if raw is None and (attachment.get("size") or 0) >= self.payloads.spill_bytes:
+            path = self.temp_files.materialize(identity, name, lambda: self.get_attachment_buffer(attachment))
+            if path is None:
+                QMessageBox.warning(None, "Lỗi", "Không thể hiển thị ảnh.")
+                return
+            self.show_full_image(path, preview_key)
+            return
 
-                self.update_scaled_image()
-                event.accept()
+        if raw is None:
+            raw = self.get_attachment_buffer(attachment)
+        payload = self.payloads.hold(identity, name, raw)
+        if not payload:
+            QMessageBox.warning(None, "Lỗi", "Không thể hiển thị ảnh.")
+            return
+        try:
+            self.show_full_image(payload.path or payload, preview_key)
+        finally:
+            self.payloads.release(payload)
 
-            def mousePressEvent(self, event):
-                if not self._is_fit_mode and event.button() == MOUSE_LEFT_BUTTON:
-                    self._panning = True
-                    self._pan_start_point = event.pos()
-                    self.setCursor(CLOSED_HAND_CURSOR)
-                    event.accept()
-
-            def mouseMoveEvent(self, event):
-                if self._panning:
-                    delta = event.pos() - self._pan_start_point
-                    self._pan_start_point = event.pos()
-                    self.scroll.horizontalScrollBar().setValue(
-                        self.scroll.horizontalScrollBar().value() - delta.x()
-                    )
-                    self.scroll.verticalScrollBar().setValue(
-                        self.scroll.verticalScrollBar().value() - delta.y()
-                    )
-                    event.accept()
-
-            def mouseReleaseEvent(self, event):
-                if self._panning and event.button() == MOUSE_LEFT_BUTTON:
-                    self._panning = False
-                    self.setCursor(ARROW_CURSOR)
-                    event.accept()
-
-        viewer = ImageViewer(pixmap)
+    # ---------------- Image viewer (modal) ----------------
+    def show_full_image(self, data, preview_key=None):
+        """
+        Modal image viewer - Fit / 1:1 / pan / scroll (data: dữ liệu ảnh đã mã hóa hoặc đường dẫn tệp).
+        preview_key: khóa cache preview trong image_cache (mở lại không giải mã lại preview).
+        """
+        viewer = ImageViewer(data, cache=self.image_cache, cache_key=preview_key)
+        if not viewer.valid:
+            QMessageBox.warning(None, "Lỗi", "Không thể hiển thị ảnh.")
+            return
         # Qt6 compatible dialog execution
         if QT_VERSION >= 6:
             viewer.exec()
@@ -859,48 +1328,34 @@ class ArcGisAttachmentsReader:
 
     def clear_results_panel(self):
         """
-        Xóa nội dung hiện tại trong dock (nếu có) và đặt placeholder "Không có đối tượng được chọn".
-        Tool vẫn giữ active; chỉ ẩn/đặt rỗng phần hiển thị kết quả.
+        Đặt dock về thông báo "Không có đối tượng được chọn".
+        Tool vẫn giữ active; chỉ đặt rỗng phần hiển thị kết quả.
         """
-        # clear attachment map
-        try:
-            self._attachment_map = {}
-        except Exception:
-            self._attachment_map = {}
+        self._dock_attachment = None
+        self._thumbnail_token += 1
+        self._dock_token += 1
+        self._loading_bar = None
+        # trả RAM / mmap của các BLOB thuộc kết quả vừa xóa
+        self.payloads.release_all()
 
         if not self.dock:
             return
 
         try:
-            old_widget = self.dock.widget()
-            # tạo placeholder đơn giản
-            placeholder = QWidget()
-            ph_layout = QVBoxLayout(placeholder)
-            lbl = QLabel("Không có đối tượng được chọn.")
-            lbl.setAlignment(ALIGN_CENTER)
-            lbl.setStyleSheet("color: gray; font-style: italic;")
-            ph_layout.addStretch()
-            ph_layout.addWidget(lbl)
-            ph_layout.addStretch()
-
-            # thay widget cũ bằng placeholder
-            self.dock.setWidget(placeholder)
-
-            # xóa widget cũ an toàn
-            if old_widget is not None:
-                try:
-                    old_widget.deleteLater()
-                except Exception:
-                    pass
+            self.dock_panel.show_message("Không có đối tượng được chọn.")
         except Exception:
             # nếu có lỗi, ẩn dock tạm
             try:
                 self.dock.hide()
             except Exception:
                 pass
-        
+
 
 # =================== Map tool ===================
+# kéo quá bao nhiêu px (manhattan) thì coi là chọn theo vùng thay vì click
+DRAG_THRESHOLD_PX = 3
+
+
 class IdentifyAttachmentsTool(QgsMapTool):
     def keyPressEvent(self, event):
         """
@@ -911,8 +1366,12 @@ class IdentifyAttachmentsTool(QgsMapTool):
         """
         try:
             if event.key() == KEY_ESCAPE:
-                # xóa highlight trên bản đồ
+                # bỏ vùng đang kéo dở
+                self._reset_drag()
+
+                # hủy identify đang chạy, xóa highlight trên bản đồ
                 try:
+                    self.plugin.cancel_identify()
                     self.plugin.clear_highlight()
                 except Exception:
                     pass
@@ -940,34 +1399,120 @@ class IdentifyAttachmentsTool(QgsMapTool):
         self.iface = iface
         self.plugin = plugin
         self.setCursor(QCursor(POINTING_HAND_CURSOR))
+        # kéo chuột: chọn theo vùng (hình chữ nhật, Shift = vẽ tự do)
+        self._press_pos = None
+        self._freehand = False
+        self._dragging = False
+        self._points = []
+        self._rubber_band = None
+
+    # ---------------- Chọn theo vùng ----------------
+    def canvasPressEvent(self, event):
+        if event.button() != MOUSE_LEFT_BUTTON:
+            return
+        self._reset_drag()
+        self._press_pos = event.pos()
+        self._freehand = bool(event.modifiers() & SHIFT_MODIFIER)
+        self._points = [self.toMapCoordinates(event.pos())]
+
+    def canvasMoveEvent(self, event):
+        if self._press_pos is None:
+            return
+        if not self._dragging:
+            delta = event.pos() - self._press_pos
+            if abs(delta.x()) + abs(delta.y()) <= DRAG_THRESHOLD_PX:
+                return
+            self._dragging = True
+            rb = QgsRubberBand(self.canvas(), QgsWkbTypes.PolygonGeometry)
+            rb.setColor(QColor(255, 128, 0))
+            rb.setWidth(1)
+            rb.setFillColor(QColor(255, 128, 0, 40))
+            self._rubber_band = rb
+        point = self.toMapCoordinates(event.pos())
+        if self._freehand:
+            self._points.append(point)
+        else:
+            self._points = self._points[:1] + [point]
+        geometry = self._drag_geometry()
+        if geometry is not None:
+            self._rubber_band.setToGeometry(geometry, None)
+
+    def _drag_geometry(self):
+        """Vùng đang kéo (tọa độ bản đồ); None nếu chưa đủ điểm."""
+        if self._freehand:
+            if len(self._points) < 3:
+                return None
+            return QgsGeometry.fromPolygonXY([self._points + [self._points[0]]])
+        if len(self._points) < 2:
+            return None
+        return QgsGeometry.fromRect(QgsRectangle(self._points[0], self._points[1]))
+
+    def _reset_drag(self):
+        self._press_pos = None
+        self._dragging = False
+        self._points = []
+        if self._rubber_band is not None:
+            try:
+                self.canvas().scene().removeItem(self._rubber_band)
+            except Exception:
+                pass
+            self._rubber_band = None
+
+    def deactivate(self):
+        self._reset_drag()
+        super().deactivate()
+
+    def _area_release(self):
+        geometry = self._drag_geometry()
+        self._reset_drag()
+        if geometry is None or geometry.isEmpty():
+            return
+        if not geometry.isGeosValid():
+            # polygon vẽ tự do tự cắt -> sửa lại
+            geometry = geometry.makeValid()
+        if self.plugin.all_layers_action.isChecked():
+            self.plugin.start_area_identify(None, geometry)
+            return
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer):
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Lớp đang chọn không phải lớp vector.")
+            return
+        self.plugin.start_area_identify(layer, geometry)
 
     def canvasReleaseEvent(self, event):
+        if self._dragging:
+            self._area_release()
+            return
+        self._reset_drag()
+
         # map coordinate
         point = self.toMapCoordinates(event.pos())
+        search_radius = self.iface.mapCanvas().mapUnitsPerPixel() * 5
+        if self.plugin.all_layers_action.isChecked():
+            # identify mọi lớp đang hiển thị có attachment
+            self.plugin.start_identify(None, QgsRectangle(
+                point.x() - search_radius,
+                point.y() - search_radius,
+                point.x() + search_radius,
+                point.y() + search_radius
+            ))
+            return
+
         layer = self.iface.activeLayer()
         if not layer:
             self.iface.messageBar().pushWarning("ArcGIS Attachments", "Chưa chọn lớp.")
             return
+        if not isinstance(layer, QgsVectorLayer):
+            self.iface.messageBar().pushWarning("ArcGIS Attachments", "Lớp đang chọn không phải lớp vector.")
+            return
 
-        # search a small rectangle around click (5 px)
-        search_radius = self.iface.mapCanvas().mapUnitsPerPixel() * 5
-        rect = QgsRectangle(
+        # search a small rectangle around click (5 px), theo tọa độ của layer
+        rect = self.toLayerCoordinates(layer, QgsRectangle(
             point.x() - search_radius,
             point.y() - search_radius,
             point.x() + search_radius,
             point.y() + search_radius
-        )
+        ))
 
-        request = QgsFeatureRequest().setFilterRect(rect)
-        for feat in layer.getFeatures(request):
-            # highlight feature
-            try:
-                self.plugin.highlight_feature(layer, feat)
-            except Exception:
-                pass
-            # show in dock (update or create)
-            try:
-                self.plugin.show_feature_in_dock(layer, feat)
-            except Exception as e:
-                QMessageBox.warning(None, "Lỗi", f"Lỗi khi hiển thị kết quả: {e}")
-            break
+        # truy vấn chạy nền; dock hiển thị trạng thái đang tải
+        self.plugin.start_identify(layer, rect)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_cache.py - cache LRU giới hạn theo tổng số byte
+- Không phụ thuộc Qt/QGIS; an toàn khi dùng từ nhiều thread (có khóa)
+- Đếm hit/miss/eviction để theo dõi hiệu quả cache
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """
+    Cache LRU: khi tổng kích thước vượt max_bytes, loại mục ít dùng gần đây nhất.
+    sizeof(value) trả về kích thước (byte) của một giá trị.
+    """
+
+    def __init__(self, max_bytes, sizeof=len):
+        self._max_bytes = max(0, int(max_bytes))
+        self._sizeof = sizeof
+        self._items = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = int(self._sizeof(value))
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            # mục lớn hơn cả ngân sách thì không cache
+            if size > self._max_bytes:
+                return
+            self._items[key] = (value, size)
+            self._total += size
+            self._evict()
+
+    def discard(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._total = 0
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self._max_bytes = max(0, int(max_bytes))
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._total,
+                "max_bytes": self._max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def _evict(self):
+        while self._total > self._max_bytes and self._items:
+            _, (_, size) = self._items.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_core.py - lõi đọc attachment trực tiếp qua GDAL/OGR, không phụ thuộc Qt/QGIS
+- Tìm bảng ATTACH, nhận diện trường, chỉ mục REL key -> fid
+- Đọc metadata không kèm BLOB; đọc BLOB theo fid (AttachmentBuffer)
+- Xuất hàng loạt qua ExportWriter, thống kê qua attachment_stats
+- Dùng cho CLI (cli.py), benchmark và xử lý phía server
+Đối tượng OGR không an toàn đa luồng: chỉ đọc trên thread gọi; ghi tệp song song
+do ExportWriter đảm nhận.
+"""
+
+from contextlib import contextmanager
+
+from osgeo import ogr
+
+from .attachment_io import AttachmentBuffer
+from .attachment_keys import FILTER_BATCH_SIZE, build_in_filter, chunked, normalize_key
+from .attachment_schema import (
+    AttachmentSchema, detect_roles, find_attachment_table, looks_like_attachment_table, select_key_index
+)
+from .attachment_stats import accumulate_rows, attachment_record, summarize
+from .export_writer import ExportWriter
+
+# key_idx đặc biệt: khóa của lớp chính là FID (OBJECTID của FileGDB không phải trường thường)
+FID_KEY = -2
+
+_NUMERIC_TYPES = (ogr.OFTInteger, ogr.OFTInteger64, ogr.OFTReal)
+
+
+class AttachmentError(Exception):
+    pass
+
+
+def field_names(layer):
+    defn = layer.GetLayerDefn()
+    return [defn.GetFieldDefn(i).GetName() for i in range(defn.GetFieldCount())]
+
+
+@contextmanager
+def _scan(layer, keep=(), where=None):
+    """Đọc tuần tự chỉ các trường `keep` (bỏ geometry/style), có bộ lọc thuộc tính."""
+    layer.SetIgnoredFields([n for n in field_names(layer) if n not in keep] + ["OGR_GEOMETRY", "OGR_STYLE"])
+    if layer.SetAttributeFilter(where) != 0:
+        layer.SetIgnoredFields([])
+        raise AttachmentError(f"Invalid filter: {where}")
+    layer.ResetReading()
+    try:
+        yield layer
+    finally:
+        layer.SetIgnoredFields([])
+        layer.SetAttributeFilter(None)
+        layer.ResetReading()
+
+
+class AttachmentStore:
+    """
+    Attachment của một nguồn OGR (FileGDB .gdb, GeoPackage...).
+        with AttachmentStore("data.gdb") as store:
+            for main, attach in store.attachment_layers(): ...
+            store.list_attachments("Poles", keys)
+            store.extract("Poles", "/tmp/out")
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._ds = ogr.Open(path, 0)
+        if self._ds is None:
+            raise AttachmentError(f"Cannot open {path}")
+        self._tables = {}
+        self._schemas = {}
+        self._indexes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._ds = None
+        self._indexes = {}
+
+    # ---------------- resolution ----------------
+    def layer_names(self):
+        return [self._ds.GetLayerByIndex(i).GetName() for i in range(self._ds.GetLayerCount())]
+
+    def layer(self, name):
+        layer = self._ds.GetLayerByName(name)
+        if layer is None:
+            raise AttachmentError(f"Layer not found: {name}")
+        return layer
+
+    def attachment_table(self, main_name, fallback=True):
+        """Tên bảng ATTACH của lớp main_name (None nếu không có)."""
+        cache_key = (main_name, fallback)
+        if cache_key not in self._tables:
+            names = [n for n in self.layer_names() if n != main_name]
+            idx = find_attachment_table(
+                main_name, names, lambda i: field_names(self.layer(names[i])), fallback=fallback
+            )
+            self._tables[cache_key] = names[idx] if idx >= 0 else None
+        return self._tables[cache_key]
+
+    def attachment_layers(self):
+        """[(lớp chính, bảng ATTACH)] theo quy ước tên <name>__ATTACH."""
+        result = []
+        for name in self.layer_names():
+            if looks_like_attachment_table(field_names(self.layer(name))):
+                continue
+            attach = self.attachment_table(name, fallback=False)
+            if attach is not None:
+                result.append((name, attach))
+        return result
+
+    def schema(self, main_name):
+        schema = self._schemas.get(main_name)
+        if schema is not None:
+            return schema
+        attach_name = self.attachment_table(main_name)
+        if attach_name is None:
+            raise AttachmentError(f"No attachment table for {main_name}")
+        main = self.layer(main_name)
+        attach = self.layer(attach_name)
+
+        roles = detect_roles(field_names(attach))
+        rel_idx = roles["rel"]
+        if rel_idx < 0:
+            raise AttachmentError(f"{attach_name} has no REL_* field")
+        rel_defn = attach.GetLayerDefn().GetFieldDefn(rel_idx)
+        rel_numeric = rel_defn.GetType() in _NUMERIC_TYPES
+
+        key_idx = select_key_index(field_names(main), rel_numeric)
+        if key_idx < 0 and rel_numeric and main.GetFIDColumn():
+            # REL_OBJECTID mà OBJECTID là FID của lớp chính (không phải trường thường)
+            key_idx = FID_KEY
+        if key_idx == -1:
+            raise AttachmentError(f"{main_name} has no GlobalID/OBJECTID key")
+
+        schema = AttachmentSchema(
+            key_idx=key_idx,
+            rel_idx=rel_idx,
+            rel_name=rel_defn.GetName(),
+            rel_numeric=rel_numeric,
+            name_idx=roles["name"],
+            data_idx=roles["data"],
+            size_idx=roles["size"],
+            type_idx=roles["content_type"],
+        )
+        self._schemas[main_name] = schema
+        return schema
+
+    # ---------------- index ----------------
+    def build_index(self, main_name):
+        """Chỉ mục {khóa REL chuẩn hóa: [fid]} của bảng ATTACH (một lượt đọc trường REL)."""
+        index = self._indexes.get(main_name)
+        if index is not None:
+            return index
+        schema = self.schema(main_name)
+        attach = self.layer(self.attachment_table(main_name))
+        index = {}
+        with _scan(attach, [schema.rel_name]) as layer:
+            for feat in layer:
+                key = normalize_key(feat.GetField(schema.rel_idx))
+                if key is not None:
+                    index.setdefault(key, []).append(feat.GetFID())
+        self._indexes[main_name] = index
+        return index
+
+    def _lookups(self, main_name, schema, keys, found=()):
+        """
+        (bộ lọc, fids): chỉ mục nếu đã xây, nếu không thì lọc IN (...) theo lô.
+        Khóa GUID không có trong found sau các lô (lưu chữ hoa/thường lẫn lộn,
+        so khớp chính xác bỏ sót) được tra lại qua chỉ mục đã chuẩn hóa.
+        """
+        if keys is None:
+            yield None, None
+            return
+        index = self._indexes.get(main_name)
+        if index is not None:
+            fids = []
+            for key in keys:
+                fids.extend(index.get(normalize_key(key), ()))
+            yield None, sorted(fids)
+            return
+        for batch in chunked(keys.values(), FILTER_BATCH_SIZE):
+            where = build_in_filter(schema.rel_name, batch, numeric=schema.rel_numeric)
+            if where:
+                yield where, None
+        if schema.rel_numeric:
+            return
+        # chạy sau khi caller đã đọc hết các lô trên
+        missing = [key for key in keys if key not in found]
+        if missing:
+            index = self.build_index(main_name)
+            fids = []
+            for key in missing:
+                fids.extend(index.get(key, ()))
+            if fids:
+                yield None, sorted(fids)
+
+    # ---------------- reading ----------------
+    def feature_key(self, feature, schema):
+        if schema.key_idx == FID_KEY:
+            return feature.GetFID()
+        return feature.GetField(schema.key_idx)
+
+    def feature_keys(self, main_name, where=None, fids=None):
+        """dict {khóa chuẩn hóa: giá trị gốc} của lớp chính (where: bộ lọc OGR SQL)."""
+        schema = self.schema(main_name)
+        main = self.layer(main_name)
+        keep = [] if schema.key_idx == FID_KEY else [field_names(main)[schema.key_idx]]
+        keys = {}
+        with _scan(main, keep, None if fids is not None else where) as layer:
+            features = (layer.GetFeature(fid) for fid in fids) if fids is not None else layer
+            for feat in features:
+                if feat is None:
+                    continue
+                value = self.feature_key(feat, schema)
+                key = normalize_key(value)
+                if key is not None:
+                    keys[key] = value
+        return keys
+
+    def iter_attachments(self, main_name, keys=None, with_data=False, fids=None):
+        """
+        Sinh (khóa, metadata, AttachmentBuffer hoặc None) cho các attachment của `keys`
+        (dict từ feature_keys; None = toàn bảng) hoặc của danh sách fid ATTACH.
+        Cột DATA chỉ được đọc khi with_data=True.
+        """
+        schema = self.schema(main_name)
+        attach_name = self.attachment_table(main_name)
+        attach = self.layer(attach_name)
+        names = field_names(attach)
+        wanted = [schema.rel_idx, schema.name_idx, schema.size_idx, schema.type_idx]
+        if with_data:
+            wanted.append(schema.data_idx)
+        keep = [names[i] for i in wanted if i >= 0]
+
+        found = set()
+        lookups = [(None, fids)] if fids is not None else self._lookups(main_name, schema, keys, found)
+        for where, lookup_fids in lookups:
+            with _scan(attach, keep, where) as layer:
+                if lookup_fids is not None:
+                    features = (layer.GetFeature(fid) for fid in lookup_fids)
+                else:
+                    features = layer
+                for feat in features:
+                    if feat is None:
+                        continue
+                    key = normalize_key(feat.GetField(schema.rel_idx))
+                    # OGR đã lọc; kiểm tra lại vì so khớp có thể lỏng hơn
+                    if key is None or (keys is not None and key not in keys):
+                        continue
+                    record = attachment_record(
+                        feat.GetFID(),
+                        feat.GetField(schema.name_idx) if schema.name_idx >= 0 else None,
+                        feat.GetField(schema.size_idx) if schema.size_idx >= 0 else None,
+                        feat.GetField(schema.type_idx) if schema.type_idx >= 0 else None,
+                        attach_name,
+                    )
+                    found.add(key)
+                    buffer = None
+                    if with_data:
+                        buffer = self._feature_buffer(feat, schema.data_idx)
+                    yield key, record, buffer
+
+    def list_attachments(self, main_name, keys=None):
+        """dict {khóa: [metadata]} (không đọc BLOB)."""
+        results = {}
+        for key, record, _ in self.iter_attachments(main_name, keys):
+            results.setdefault(key, []).append(record)
+        return results
+
+    def read_buffer(self, main_name, fid):
+        """BLOB của một attachment theo fid bảng ATTACH (AttachmentBuffer hoặc None)."""
+        schema = self.schema(main_name)
+        if schema.data_idx < 0:
+            return None
+        attach = self.layer(self.attachment_table(main_name))
+        with _scan(attach, [field_names(attach)[schema.data_idx]]) as layer:
+            feat = layer.GetFeature(fid)
+            if feat is None:
+                return None
+            return self._feature_buffer(feat, schema.data_idx)
+
+    @staticmethod
+    def _feature_buffer(feature, data_idx):
+        if data_idx < 0 or not feature.IsFieldSetAndNotNull(data_idx):
+            return None
+        return AttachmentBuffer.from_blob(feature.GetFieldAsBinary(data_idx))
+
+    # ---------------- batch ----------------
+    def extract(self, main_name, out_dir, where=None, workers=4, resume=True, progress=None):
+        """
+        Xuất attachment của lớp main_name (where: lọc feature cha) vào out_dir.
+        progress(số đã xử lý, tổng) nếu có. Trả về ExportWriter (đã đóng).
+        """
+        schema = self.schema(main_name)
+        if schema.data_idx < 0:
+            raise AttachmentError(f"{self.attachment_table(main_name)} has no DATA field")
+        keys = self.feature_keys(main_name, where)
+        writer = ExportWriter(out_dir, workers=workers, resume=resume)
+        try:
+            lookup_keys = keys if where is not None else None
+            fids = None
+            if writer.done_count():
+                # chạy tiếp: lượt metadata để chỉ đọc BLOB còn thiếu
+                fids = []
+                for key, record, _ in self.iter_attachments(main_name, lookup_keys):
+                    if key not in keys:
+                        continue
+                    if writer.is_done(key, record["fid"]):
+                        writer.skipped += 1
+                    else:
+                        fids.append(record["fid"])
+                total = len(fids)
+            else:
+                total = self.layer(self.attachment_table(main_name)).GetFeatureCount()
+
+            count = 0
+            for key, record, buffer in self.iter_attachments(main_name, lookup_keys, True, fids):
+                count += 1
+                if progress is not None and count % 200 == 0:
+                    progress(count, total)
+                if key not in keys:
+                    # attachment mồ côi (không còn feature cha)
+                    continue
+                writer.submit(
+                    key, record["fid"], record["ATT_NAME"], buffer, record["size"], record["content_type"]
+                )
+            if progress is not None:
+                progress(count, count)
+        except BaseException:
+            writer.cancel()
+            raise
+        writer.close()
+        return writer
+
+    def stats(self, main_name, where=None):
+        """Thống kê attachment của lớp main_name (một lượt đọc, không BLOB)."""
+        keys = self.feature_keys(main_name, where)
+        type_counts = {}
+        # where=None: toàn bảng ATTACH, để đếm cả attachment mồ côi
+        rows = (
+            (key, record["size"], record["content_type"])
+            for key, record, _ in self.iter_attachments(main_name, keys if where is not None else None)
+        )
+        totals = accumulate_rows(rows, None, type_counts)
+        result = summarize(totals, keys, type_counts)
+        result["layer"] = main_name
+        result["attachment_table"] = self.attachment_table(main_name)
+        return result
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_counts.py - số attachment / tổng byte theo feature cha, dùng để tô màu và lọc
+- Một lượt GROUP BY khóa rel trên bảng ATTACH (không BLOB), chạy nền bằng QgsTask
+- Đọc qua hàm biểu thức attachment_count() / attachment_bytes(); plugin thêm
+  trường ảo (expression field) ATT_COUNT / ATT_BYTES vào layer chính
+- Cập nhật từng phần khi bảng ATTACH thêm/xóa/sửa; xây lại khi commit/rollback/reload
+"""
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsApplication, QgsExpression, QgsFeatureRequest, QgsField, QgsTask, QgsVectorLayerFeatureSource,
+    qgsfunction
+)
+
+from .attachment_keys import normalize_key
+from .attachment_stats import AttachmentCounts, accumulate_rows, attachment_size
+
+# tên trường ảo trên layer chính (trùng với thuật toán Processing "đếm attachment")
+COUNT_FIELD = "ATT_COUNT"
+BYTES_FIELD = "ATT_BYTES"
+
+COUNT_FUNCTION = "attachment_count"
+BYTES_FUNCTION = "attachment_bytes"
+FUNCTION_GROUP = "ArcGIS Attachments"
+
+# layer chính id -> (AttachmentCounts, tên trường khóa); đọc từ thread render.
+# Tra theo tên: thêm/xóa trường của layer chính không làm lệch khóa
+_BINDINGS = {}
+
+
+class _BuildCountsTask(QgsTask):
+    """Đọc cột rel + kích thước của toàn bảng ATTACH và GROUP BY khóa ở thread nền."""
+
+    def __init__(self, counts, callback):
+        super().__init__(f"ArcGIS Attachments: counting {counts.layer.name()}", QgsTask.CanCancel)
+        self.counts = counts
+        self.generation = counts.generation
+        self.row_by_fid = {}
+        self.totals = {}
+        self._callback = callback
+        # feature source phải tạo trên main thread, dùng được ở thread khác
+        self._source = QgsVectorLayerFeatureSource(counts.layer)
+        self._rel_idx = counts.rel_idx
+        self._size_idx = counts.size_idx
+        self._total = counts.layer.featureCount()
+
+    def run(self):
+        attrs = [self._rel_idx]
+        if self._size_idx >= 0:
+            attrs.append(self._size_idx)
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(attrs)
+        for i, feat in enumerate(self._source.getFeatures(request)):
+            if self.isCanceled():
+                return False
+            key = normalize_key(feat.attribute(self._rel_idx))
+            if key is not None:
+                size = feat.attribute(self._size_idx) if self._size_idx >= 0 else None
+                self.row_by_fid[feat.id()] = (key, attachment_size(size))
+            if self._total and self._total > 0 and i % 1000 == 0:
+                self.setProgress(min(100.0, i * 100.0 / self._total))
+        self.totals = accumulate_rows((key, size, None) for key, size in self.row_by_fid.values())
+        return True
+
+    def finished(self, result):
+        self._callback(self, result)
+
+
+# ---------------- Hàm biểu thức ----------------
+def _lookup(feature, context):
+    if context is None or not context.hasVariable("layer_id"):
+        return None
+    binding = _BINDINGS.get(context.variable("layer_id"))
+    if binding is None:
+        return None
+    counts, key_name = binding
+    try:
+        return counts.lookup(feature.attribute(key_name))
+    except Exception:
+        return None
+
+
+@qgsfunction(args="auto", group=FUNCTION_GROUP, register=False)
+def attachment_count(feature, parent, context):
+    """
+    Số attachment của feature (bảng ATTACH của layer, đếm sẵn bởi plugin ArcGIS Attachments Reader).
+    <p>NULL khi layer chưa bật đếm attachment hoặc đang đếm.</p>
+    <h4>Example</h4>
+    <ul><li>attachment_count() &gt; 0 -> true nếu feature có attachment</li></ul>
+    """
+    entry = _lookup(feature, context)
+    return entry[0] if entry is not None else None
+
+
+@qgsfunction(args="auto", group=FUNCTION_GROUP, register=False)
+def attachment_bytes(feature, parent, context):
+    """
+    Tổng dung lượng (byte) attachment của feature (plugin ArcGIS Attachments Reader).
+    <p>NULL khi layer chưa bật đếm attachment hoặc đang đếm.</p>
+    <h4>Example</h4>
+    <ul><li>attachment_bytes() / 1048576 -> MB</li></ul>
+    """
+    entry = _lookup(feature, context)
+    return entry[1] if entry is not None else None
+
+
+def register_functions():
+    for function in (attachment_count, attachment_bytes):
+        if not QgsExpression.isFunctionName(function.name()):
+            QgsExpression.registerFunction(function)
+
+
+def unregister_functions():
+    for name in (COUNT_FUNCTION, BYTES_FUNCTION):
+        try:
+            QgsExpression.unregisterFunction(name)
+        except Exception:
+            pass
+
+
+def uses_count_fields(layer):
+    """Layer có trường ảo gọi attachment_count()/attachment_bytes() (vd. nạp từ project)."""
+    fields = layer.fields()
+    for i in range(fields.count()):
+        expression = layer.expressionField(i) or ""
+        if COUNT_FUNCTION in expression or BYTES_FUNCTION in expression:
+            return True
+    return False
+
+
+class AttachmentCountManager:
+    """
+    Quản lý AttachmentCounts theo layer ATTACH id và liên kết layer chính -> counts.
+    Đếm xong / dữ liệu đổi thì vẽ lại các layer chính liên quan.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._tasks = {}
+        self._connections = {}
+        # layer ATTACH id -> (tên trường rel, tên trường kích thước hoặc None):
+        # tìm lại index khi bảng ATTACH thêm/xóa trường
+        self._field_names = {}
+        # layer ATTACH id -> {layer chính id: layer chính}
+        self._main_layers = {}
+
+    def enable(self, layer, attach_layer, schema):
+        """Đếm attachment cho layer chính (bắt đầu xây nền nếu chưa có). Gọi trên main thread."""
+        counts = self._counts_for(attach_layer, schema)
+        _BINDINGS[layer.id()] = (counts, layer.fields().at(schema.key_idx).name())
+        self._main_layers.setdefault(attach_layer.id(), {})[layer.id()] = layer
+        if not counts.ready:
+            self._start_build(counts)
+        return counts
+
+    def add_fields(self, layer, attach_layer, schema):
+        """
+        Thêm trường ảo ATT_COUNT / ATT_BYTES (nếu chưa có) vào layer chính.
+        Trả về số trường đã thêm.
+        """
+        self.enable(layer, attach_layer, schema)
+        added = 0
+        for name, expression, field_type in (
+            (COUNT_FIELD, f"{COUNT_FUNCTION}()", QVariant.Int),
+            (BYTES_FIELD, f"{BYTES_FUNCTION}()", QVariant.LongLong),
+        ):
+            if layer.fields().indexOf(name) >= 0:
+                continue
+            layer.addExpressionField(expression, QgsField(name, field_type))
+            added += 1
+        return added
+
+    def disable(self, layer_id):
+        _BINDINGS.pop(layer_id, None)
+        for main_layers in self._main_layers.values():
+            main_layers.pop(layer_id, None)
+
+    def clear(self):
+        for task in list(self._tasks.values()):
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        self._tasks = {}
+        for layer_id in list(self._counts.keys()):
+            self._drop(layer_id)
+        _BINDINGS.clear()
+        self._main_layers = {}
+
+    # ---------------- internal ----------------
+    def _counts_for(self, attach_layer, schema):
+        layer_id = attach_layer.id()
+        counts = self._counts.get(layer_id)
+        if counts is not None and counts.rel_idx == schema.rel_idx and counts.size_idx == schema.size_idx:
+            return counts
+        if counts is not None:
+            self._drop(layer_id)
+        counts = AttachmentCounts(attach_layer, schema.rel_idx, schema.size_idx)
+        self._counts[layer_id] = counts
+        fields = attach_layer.fields()
+        self._field_names[layer_id] = (
+            schema.rel_name, fields.at(schema.size_idx).name() if schema.size_idx >= 0 else None
+        )
+        self._connect(attach_layer)
+        return counts
+
+    def _start_build(self, counts):
+        layer_id = counts.layer.id()
+        if layer_id in self._tasks or counts.rel_idx < 0:
+            return
+        task = _BuildCountsTask(counts, self._on_built)
+        # giữ tham chiếu để task không bị GC
+        self._tasks[layer_id] = task
+        QgsApplication.taskManager().addTask(task)
+
+    def _on_built(self, task, result):
+        counts = task.counts
+        layer_id = None
+        for lid, t in list(self._tasks.items()):
+            if t is task:
+                layer_id = lid
+                del self._tasks[lid]
+                break
+        if not result or layer_id is None:
+            return
+        if self._counts.get(layer_id) is not counts:
+            return
+        if not counts.accept(task.generation, task.row_by_fid, task.totals):
+            # dữ liệu đã thay đổi trong lúc đếm -> đếm lại
+            self._start_build(counts)
+            return
+        self._repaint(layer_id)
+
+    def _repaint(self, attach_layer_id):
+        for layer in list(self._main_layers.get(attach_layer_id, {}).values()):
+            try:
+                layer.triggerRepaint()
+            except Exception:
+                pass
+
+    def _connect(self, layer):
+        layer_id = layer.id()
+
+        def _counts():
+            return self._counts.get(layer_id)
+
+        def _read(counts, fid):
+            feat = layer.getFeature(fid)
+            size = feat.attribute(counts.size_idx) if counts.size_idx >= 0 else None
+            return feat.attribute(counts.rel_idx), size
+
+        def _rebuild(counts):
+            counts.invalidate()
+            self._start_build(counts)
+
+        def on_feature_added(fid):
+            counts = _counts()
+            if not counts:
+                return
+            if not counts.ready:
+                _rebuild(counts)
+                return
+            try:
+                counts.add(fid, *_read(counts, fid))
+            except Exception:
+                _rebuild(counts)
+            self._repaint(layer_id)
+
+        def on_feature_deleted(fid):
+            counts = _counts()
+            if not counts:
+                return
+            if not counts.ready:
+                _rebuild(counts)
+                return
+            counts.remove(fid)
+            self._repaint(layer_id)
+
+        def on_attribute_changed(fid, idx, value):
+            counts = _counts()
+            if not counts or idx not in (counts.rel_idx, counts.size_idx):
+                return
+            if not counts.ready:
+                _rebuild(counts)
+                return
+            counts.remove(fid)
+            try:
+                counts.add(fid, *_read(counts, fid))
+            except Exception:
+                _rebuild(counts)
+            self._repaint(layer_id)
+
+        def on_reset(*args):
+            counts = _counts()
+            if counts:
+                _rebuild(counts)
+
+        def on_data_changed():
+            # khi đang edit, thay đổi đã được cập nhật từng phần ở trên
+            if not layer.isEditable():
+                on_reset()
+
+        def on_fields_changed(*args):
+            # vị trí trường đổi: tìm lại rel/size theo tên, bỏ kết quả đếm theo cột cũ
+            counts = _counts()
+            if not counts:
+                return
+            rel_name, size_name = self._field_names.get(layer_id, (None, None))
+            fields = layer.fields()
+            counts.rel_idx = fields.indexOf(rel_name) if rel_name else -1
+            counts.size_idx = fields.indexOf(size_name) if size_name else -1
+            _rebuild(counts)
+            self._repaint(layer_id)
+
+        def on_deleted():
+            self._drop(layer_id)
+
+        connections = [
+            (layer.featureAdded, on_feature_added),
+            (layer.featureDeleted, on_feature_deleted),
+            (layer.attributeValueChanged, on_attribute_changed),
+            (layer.afterCommitChanges, on_reset),
+            (layer.afterRollBack, on_reset),
+            (layer.dataSourceChanged, on_reset),
+            (layer.dataChanged, on_data_changed),
+            (layer.attributeAdded, on_fields_changed),
+            (layer.attributeDeleted, on_fields_changed),
+            (layer.updatedFields, on_fields_changed),
+            (layer.willBeDeleted, on_deleted),
+        ]
+        for signal, slot in connections:
+            signal.connect(slot)
+        self._connections[layer_id] = connections
+
+    def _drop(self, layer_id):
+        task = self._tasks.pop(layer_id, None)
+        if task is not None:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        for signal, slot in self._connections.pop(layer_id, []):
+            try:
+                signal.disconnect(slot)
+            except Exception:
+                pass
+        counts = self._counts.pop(layer_id, None)
+        self._field_names.pop(layer_id, None)
+        for main_id in list(self._main_layers.pop(layer_id, {}).keys()):
+            binding = _BINDINGS.get(main_id)
+            if binding is not None and binding[0] is counts:
+                del _BINDINGS[main_id]
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_index.py - chỉ mục quan hệ cho bảng ATTACH
+- Ánh xạ khóa REL_GLOBALID/REL_OBJECTID (đã chuẩn hóa) -> danh sách feature id
+- Xây dựng lười một lần, chạy nền bằng QgsTask
+- Cập nhật từng phần khi sửa dữ liệu; hủy khi commit/rollback/reload
+"""
+
+from qgis.core import (
+    QgsApplication, QgsFeatureRequest, QgsTask, QgsVectorLayerFeatureSource
+)
+
+from .attachment_keys import normalize_key
+
+
+class AttachmentIndex:
+    """Chỉ mục khóa quan hệ -> fid cho một layer ATTACH."""
+
+    def __init__(self, layer, rel_field):
+        self.layer = layer
+        self.rel_field = rel_field
+        self.rel_idx = layer.fields().indexOf(rel_field)
+        self.ready = False
+        # tăng mỗi lần hủy, để bỏ kết quả của task đang chạy dở
+        self.generation = 0
+        # tăng mỗi khi dữ liệu layer thay đổi (kể cả trường không phải rel);
+        # cache metadata so sánh với version để bỏ mục cũ
+        self.version = 0
+        self._fids_by_key = {}
+        self._key_by_fid = {}
+
+    def lookup(self, value):
+        """Trả về list fid khớp với value, hoặc None nếu chỉ mục chưa sẵn sàng."""
+        if not self.ready:
+            return None
+        key = normalize_key(value)
+        if key is None:
+            return []
+        return list(self._fids_by_key.get(key, ()))
+
+    def load(self, key_by_fid):
+        self._key_by_fid = key_by_fid
+        self._fids_by_key = {}
+        for fid, key in key_by_fid.items():
+            self._fids_by_key.setdefault(key, []).append(fid)
+        self.ready = True
+        # metadata cache lúc chưa có chỉ mục chỉ so khớp chính xác phía provider
+        # (bỏ sót GUID hoa/thường lẫn lộn) -> làm cũ một lần
+        self.version += 1
+
+    def touch(self):
+        self.version += 1
+
+    def invalidate(self):
+        self.ready = False
+        self.generation += 1
+        self.version += 1
+        self._fids_by_key = {}
+        self._key_by_fid = {}
+
+    def add(self, fid, value):
+        self.version += 1
+        key = normalize_key(value)
+        if key is None:
+            return
+        self._key_by_fid[fid] = key
+        self._fids_by_key.setdefault(key, []).append(fid)
+
+    def remove(self, fid):
+        self.version += 1
+        key = self._key_by_fid.pop(fid, None)
+        if key is None:
+            return
+        fids = self._fids_by_key.get(key)
+        if fids and fid in fids:
+            fids.remove(fid)
+            if not fids:
+                del self._fids_by_key[key]
+
+
+class _BuildIndexTask(QgsTask):
+    """Đọc cột rel của toàn bảng ATTACH (không geometry, không BLOB) ở thread nền."""
+
+    def __init__(self, index, callback):
+        super().__init__(f"ArcGIS Attachments: indexing {index.layer.name()}", QgsTask.CanCancel)
+        self.index = index
+        self.generation = index.generation
+        self.key_by_fid = {}
+        self._callback = callback
+        # feature source phải tạo trên main thread, dùng được ở thread khác
+        self._source = QgsVectorLayerFeatureSource(index.layer)
+        self._rel_idx = index.rel_idx
+        self._total = index.layer.featureCount()
+
+    def run(self):
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([self._rel_idx])
+        for i, feat in enumerate(self._source.getFeatures(request)):
+            if self.isCanceled():
+                return False
+            key = normalize_key(feat.attribute(self._rel_idx))
+            if key is not None:
+                self.key_by_fid[feat.id()] = key
+            if self._total and self._total > 0 and i % 1000 == 0:
+                self.setProgress(min(100.0, i * 100.0 / self._total))
+        return True
+
+    def finished(self, result):
+        self._callback(self, result)
+
+
+class AttachmentIndexManager:
+    """
+    Quản lý chỉ mục theo layer id. Chỉ mục được xây lần đầu khi cần;
+    trong lúc xây, lookup() trả None để caller lọc phía provider.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._tasks = {}
+        self._connections = {}
+
+    def index_for(self, layer, rel_field):
+        """
+        AttachmentIndex của layer (None nếu không có trường rel).
+        Bắt đầu xây nền nếu chưa sẵn sàng. Gọi trên main thread; đối tượng
+        trả về có thể đọc (lookup) từ thread nền.
+        """
+        index = self._index_for(layer, rel_field)
+        if index.rel_idx < 0:
+            return None
+        if not index.ready:
+            self._start_build(index)
+        return index
+
+    def lookup(self, layer, rel_field, value):
+        """Trả về list fid khớp, hoặc None nếu chỉ mục đang được xây."""
+        index = self.index_for(layer, rel_field)
+        if index is None:
+            return None
+        return index.lookup(value)
+
+    def invalidate(self, layer_id):
+        index = self._indexes.get(layer_id)
+        if index:
+            index.invalidate()
+
+    def clear(self):
+        for task in list(self._tasks.values()):
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        self._tasks = {}
+        for layer_id in list(self._indexes.keys()):
+            self._drop(layer_id)
+
+    # ---------------- internal ----------------
+    def _index_for(self, layer, rel_field):
+        layer_id = layer.id()
+        index = self._indexes.get(layer_id)
+        # so cả vị trí trường: thêm/xóa trường trước REL_* làm lệch rel_idx
+        if (index is not None and index.rel_field == rel_field
+                and index.rel_idx == layer.fields().indexOf(rel_field)):
+            return index
+        if index is not None:
+            self._drop(layer_id)
+        index = AttachmentIndex(layer, rel_field)
+        self._indexes[layer_id] = index
+        self._connect(layer)
+        return index
+
+    def _start_build(self, index):
+        layer_id = index.layer.id()
+        if layer_id in self._tasks:
+            return
+        task = _BuildIndexTask(index, self._on_built)
+        # giữ tham chiếu để task không bị GC
+        self._tasks[layer_id] = task
+        QgsApplication.taskManager().addTask(task)
+
+    def _on_built(self, task, result):
+        index = task.index
+        layer_id = None
+        for lid, t in list(self._tasks.items()):
+            if t is task:
+                layer_id = lid
+                del self._tasks[lid]
+                break
+        if not result or layer_id is None:
+            return
+        if self._indexes.get(layer_id) is not index:
+            return
+        # dữ liệu đã thay đổi trong lúc xây -> bỏ kết quả, lần lookup sau xây lại
+        if task.generation != index.generation:
+            return
+        index.load(task.key_by_fid)
+
+    def _connect(self, layer):
+        layer_id = layer.id()
+
+        def _index():
+            return self._indexes.get(layer_id)
+
+        def on_feature_added(fid):
+            index = _index()
+            if not index:
+                return
+            if not index.ready:
+                index.invalidate()
+                return
+            try:
+                feat = layer.getFeature(fid)
+                index.add(fid, feat.attribute(index.rel_idx))
+            except Exception:
+                index.invalidate()
+
+        def on_feature_deleted(fid):
+            index = _index()
+            if not index:
+                return
+            if not index.ready:
+                index.invalidate()
+                return
+            index.remove(fid)
+
+        def on_attribute_changed(fid, idx, value):
+            index = _index()
+            if not index:
+                return
+            if idx != index.rel_idx:
+                # tên/kích thước... đổi: chỉ làm cũ cache metadata
+                index.touch()
+                return
+            if not index.ready:
+                index.invalidate()
+                return
+            index.remove(fid)
+            index.add(fid, value)
+
+        def on_reset(*args):
+            index = _index()
+            if index:
+                index.invalidate()
+
+        def on_data_changed():
+            # khi đang edit, thay đổi đã được cập nhật từng phần ở trên
+            if not layer.isEditable():
+                on_reset()
+
+        def on_fields_changed(*args):
+            # vị trí trường đổi: đọc lại rel_idx, dữ liệu đã nạp theo cột cũ không còn dùng được
+            index = _index()
+            if index:
+                index.rel_idx = layer.fields().indexOf(index.rel_field)
+                index.invalidate()
+
+        def on_deleted():
+            self._drop(layer_id)
+
+        connections = [
+            (layer.featureAdded, on_feature_added),
+            (layer.featureDeleted, on_feature_deleted),
+            (layer.attributeValueChanged, on_attribute_changed),
+            (layer.afterCommitChanges, on_reset),
+            (layer.afterRollBack, on_reset),
+            (layer.dataSourceChanged, on_reset),
+            (layer.dataChanged, on_data_changed),
+            (layer.attributeAdded, on_fields_changed),
+            (layer.attributeDeleted, on_fields_changed),
+            (layer.updatedFields, on_fields_changed),
+            (layer.willBeDeleted, on_deleted),
+        ]
+        for signal, slot in connections:
+            signal.connect(slot)
+        self._connections[layer_id] = connections
+
+    def _drop(self, layer_id):
+        task = self._tasks.pop(layer_id, None)
+        if task is not None:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        for signal, slot in self._connections.pop(layer_id, []):
+            try:
+                signal.disconnect(slot)
+            except Exception:
+                pass
+        self._indexes.pop(layer_id, None)
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_io.py - truy cập BLOB không sao chép và ghi tệp theo từng khối
+- AttachmentBuffer bọc QByteArray/bytes của provider qua memoryview (không sao chép
+  nếu đối tượng hỗ trợ buffer protocol; QByteArray không hỗ trợ thì sao chép một lần
+  thành bytes và bỏ QByteArray gốc)
+- Ghi ra đĩa theo khối, không tạo bản sao bytes của cả tệp
+- TempFileCache: tệp tạm dùng lại theo định danh attachment, có giới hạn dung lượng;
+  thư mục theo pid, thư mục của tiến trình đã chết (crash/kill) được dọn khi khởi động
+- PayloadStore: ngân sách RAM chung cho BLOB đang giữ; tệp lớn/vượt ngân sách
+  được ghi ra tệp tạm và đọc qua mmap
+- Không phụ thuộc Qt/QGIS
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+# kích thước mỗi khối khi ghi tệp
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+def _as_memoryview(blob):
+    """
+    (đối tượng giữ dữ liệu, memoryview). blob có buffer protocol: dùng thẳng, không sao chép;
+    nếu không (QByteArray của PyQt5) thì sao chép một lần thành bytes và không giữ bản gốc,
+    để RAM chỉ chứa một bản (khớp với len() mà PayloadStore tính vào ngân sách).
+    """
+    try:
+        return blob, memoryview(blob).cast("B")
+    except TypeError:
+        pass
+    try:
+        data = blob.data()
+    except Exception:
+        data = bytes(blob)
+    return data, memoryview(data).cast("B")
+
+
+class AttachmentBuffer:
+    """
+    BLOB của một attachment. raw là đối tượng gốc của provider nếu đọc được qua
+    memoryview, nếu không thì là bản sao bytes duy nhất; chỉ sao chép khi gọi tobytes().
+    """
+
+    def __init__(self, blob):
+        self.raw, self._view = _as_memoryview(blob)
+        # đường dẫn tệp nếu dữ liệu được ánh xạ từ đĩa (from_file)
+        self.path = None
+
+    @classmethod
+    def from_blob(cls, blob):
+        """AttachmentBuffer hoặc None nếu blob rỗng/NULL/không đọc được."""
+        if blob is None:
+            return None
+        try:
+            if blob.isNull():
+                return None
+        except AttributeError:
+            pass
+        try:
+            return cls(blob)
+        except Exception:
+            return None
+
+    def __len__(self):
+        return self._view.nbytes
+
+    def __bool__(self):
+        return self._view.nbytes > 0
+
+    def view(self):
+        return self._view
+
+    def chunks(self, chunk_size=WRITE_CHUNK_SIZE):
+        view = self._view
+        for start in range(0, view.nbytes, chunk_size):
+            yield view[start:start + chunk_size]
+
+    def write_to(self, target, chunk_size=WRITE_CHUNK_SIZE):
+        """Ghi vào đường dẫn hoặc file object (mở nhị phân), theo từng khối."""
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as f:
+                return self.write_to(f, chunk_size)
+        written = 0
+        for chunk in self.chunks(chunk_size):
+            target.write(chunk)
+            written += chunk.nbytes
+        return written
+
+    @classmethod
+    def from_file(cls, path):
+        """AttachmentBuffer ánh xạ bộ nhớ (mmap, chỉ đọc) trên tệp; None nếu tệp rỗng/không mở được."""
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        buffer = cls(mapped)
+        buffer.path = path
+        return buffer
+
+    def tobytes(self):
+        """Bản sao bytes (chỉ dùng khi API bên ngoài bắt buộc bytes)."""
+        if isinstance(self.raw, bytes):
+            return self.raw
+        return self._view.tobytes()
+
+    def release(self):
+        try:
+            self._view.release()
+        except Exception:
+            pass
+        if isinstance(self.raw, mmap.mmap):
+            try:
+                self.raw.close()
+            except Exception:
+                pass
+        self.raw = None
+
+
+def safe_filename(name, default="attachment"):
+    """Tên tệp an toàn trên mọi hệ điều hành (bỏ thư mục và ký tự cấm)."""
+    name = os.path.basename(str(name or "").replace("\\", "/"))
+    name = "".join("_" if c in '<>:"/\\|?*' or ord(c) < 32 else c for c in name).strip(" .")
+    return name or default
+
+
+def pid_alive(pid):
+    """True nếu tiến trình pid còn chạy (không chắc chắn -> coi như còn chạy)."""
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        # os.kill trên Windows sẽ kết thúc tiến trình, dùng OpenProcess
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            # ERROR_ACCESS_DENIED: tiến trình của người dùng khác, vẫn đang chạy
+            return ctypes.get_last_error() == 5
+        try:
+            code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            return code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def process_temp_root(parent, prefix):
+    """
+    Thư mục tạm riêng của tiến trình này: <parent>/<prefix>-<pid>.
+    Xóa các thư mục <prefix>-<pid> cùng cấp của tiến trình đã kết thúc mà không
+    gọi được cleanup() (QGIS crash/bị kill) -> /tmp không phình dần qua các phiên.
+    """
+    own = os.getpid()
+    try:
+        names = os.listdir(parent)
+    except OSError:
+        names = []
+    for name in names:
+        head, sep, pid = name.rpartition("-")
+        if head != prefix or not sep or not pid.isdigit():
+            continue
+        if int(pid) != own and not pid_alive(int(pid)):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+    return os.path.join(parent, f"{prefix}-{own}")
+
+
+class TempFileCache:
+    """
+    Thư mục tạm quản lý các tệp attachment đã ghi ra đĩa (để mở bằng ứng dụng ngoài).
+    - Khóa theo định danh attachment (nguồn + fid + dấu vân tay dữ liệu):
+      mở lại cùng tệp thì dùng ngay tệp đã có, không đọc lại BLOB
+    - Giới hạn tổng dung lượng, loại tệp ít dùng gần đây nhất; chỉ mục
+      {đường dẫn: kích thước} theo thứ tự dùng giữ trong RAM (quét thư mục
+      một lần khi dùng lần đầu), không quét lại thư mục mỗi lần ghi
+    - cleanup() xóa toàn bộ thư mục (gọi khi unload plugin)
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+        # đường dẫn -> kích thước, cũ nhất trước; None = chưa quét thư mục
+        self._files = None
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        """Tổng dung lượng các tệp đang quản lý."""
+        with self._lock:
+            self._load()
+            return self._total
+
+    def path_for(self, identity, name):
+        digest = hashlib.sha1(str(identity).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest, safe_filename(name))
+
+    def materialize(self, identity, name, load_buffer):
+        """
+        Đường dẫn tệp tạm của attachment; chỉ gọi load_buffer() (-> AttachmentBuffer)
+        khi tệp chưa có. Trả về None nếu không đọc được dữ liệu.
+        """
+        path = self.path_for(identity, name)
+        if os.path.isfile(path):
+            # đánh dấu vừa dùng (cho LRU)
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            with self._lock:
+                self._load()
+                if path in self._files:
+                    self._files.move_to_end(path)
+                else:
+                    self._add(path, os.path.getsize(path))
+            return path
+
+        buffer = load_buffer()
+        if buffer is None:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".part"
+        try:
+            written = buffer.write_to(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._load()
+            # tệp cũ cùng đường dẫn đã bị xóa ngoài ý muốn -> thay mục cũ
+            self._total -= self._files.pop(path, 0)
+            self._add(path, written)
+            self._evict(keep=path)
+        return path
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        with self._lock:
+            self._files = OrderedDict()
+            self._total = 0
+
+    def _load(self):
+        """Quét thư mục một lần (tệp còn lại từ trước), cũ nhất (mtime) trước."""
+        if self._files is not None:
+            return
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(fpath)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, fpath))
+        self._files = OrderedDict((fpath, size) for _, size, fpath in sorted(entries))
+        self._total = sum(self._files.values())
+
+    def _add(self, path, size):
+        self._files[path] = size
+        self._total += size
+
+    def _evict(self, keep=None):
+        if self._total <= self.max_bytes:
+            return
+        for fpath, size in list(self._files.items()):
+            if self._total <= self.max_bytes:
+                break
+            if fpath == keep:
+                continue
+            try:
+                os.remove(fpath)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # tệp đang mở (Windows): giữ lại, thử lần sau
+                continue
+            del self._files[fpath]
+            self._total -= size
+            try:
+                # xóa thư mục theo khóa nếu đã rỗng
+                os.rmdir(os.path.dirname(fpath))
+            except OSError:
+                pass
+
+
+class PayloadStore:
+    """
+    Ngân sách RAM chung cho BLOB mà giao diện đang giữ (ảnh gốc đang xem).
+    - BLOB >= spill_bytes, hoặc làm tổng vượt max_bytes: ghi ra tệp tạm
+      (TempFileCache) và thay bằng AttachmentBuffer mmap -> RAM chỉ là page cache
+    - release()/release_all() trả bộ nhớ (gọi khi đóng viewer / xóa kết quả identify)
+    """
+
+    def __init__(self, temp_files, max_bytes, spill_bytes):
+        self.temp_files = temp_files
+        self.max_bytes = max(0, int(max_bytes))
+        self.spill_bytes = max(0, int(spill_bytes))
+        self.spilled = 0
+        self._held = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        """Tổng số byte BLOB đang giữ trong RAM (không tính phần đã ghi ra đĩa)."""
+        return self._total
+
+    def hold(self, identity, name, buffer):
+        """
+        Giữ buffer (AttachmentBuffer) trong ngân sách; trả về buffer dùng thay cho
+        buffer truyền vào (có thể là bản mmap từ tệp tạm, có .path). None nếu buffer rỗng.
+        """
+        if not buffer:
+            return None
+        size = len(buffer)
+        with self._lock:
+            if id(buffer) in self._held:
+                return buffer
+            in_ram = size < self.spill_bytes and self._total + size <= self.max_bytes
+            if in_ram:
+                self._held[id(buffer)] = (buffer, size)
+                self._total += size
+                return buffer
+        path = self.temp_files.materialize(identity, name, lambda: buffer)
+        mapped = AttachmentBuffer.from_file(path) if path else None
+        if mapped is None:
+            # không ghi được ra đĩa: vẫn dùng bản trong RAM (ngoài ngân sách)
+            return buffer
+        buffer.release()
+        with self._lock:
+            self.spilled += 1
+            self._held[id(mapped)] = (mapped, 0)
+        return mapped
+
+    def release(self, buffer):
+        if buffer is None:
+            return
+        with self._lock:
+            entry = self._held.pop(id(buffer), None)
+            if entry is not None:
+                self._total -= entry[1]
+        if entry is not None:
+            entry[0].release()
+
+    def release_all(self):
+        with self._lock:
+            held = list(self._held.values())
+            self._held = {}
+            self._total = 0
+        for buffer, _ in held:
+            buffer.release()
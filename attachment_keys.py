@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_keys.py - chuẩn hóa khóa quan hệ GlobalID/ObjectID
+- Không phụ thuộc Qt/QGIS để dùng chung cho chỉ mục và truy vấn
+"""
+
+# số khóa tối đa trong một biểu thức IN (...)
+FILTER_BATCH_SIZE = 200
+
+
+def normalize_key(value):
+    """
+    Chuẩn hóa giá trị khóa quan hệ để so sánh:
+    bỏ khoảng trắng, bỏ dấu ngoặc nhọn của GUID, viết hoa.
+    Trả về None nếu giá trị rỗng/NULL.
+    """
+    if value is None:
+        return None
+    try:
+        # QVariant NULL (PyQGIS) không phải None
+        if value.isNull():
+            return None
+    except AttributeError:
+        pass
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    if text.startswith("{") and text.endswith("}"):
+        text = text[1:-1].strip()
+    text = text.upper()
+    return text or None
+
+
+def key_variants(value):
+    """
+    Các dạng lưu trữ hợp lệ của một khóa để đẩy điều kiện xuống provider:
+    GUID có/không ngoặc nhọn, chữ hoa/chữ thường.
+    Provider so sánh chính xác (dùng được attribute index) nên cần liệt kê
+    đủ các dạng thay vì upper("REL_GLOBALID") = ... (làm mất index).
+    GUID lưu chữ hoa/thường lẫn lộn không khớp dạng nào: chỉ tìm thấy qua chỉ mục
+    (AttachmentIndex/build_index, khóa đã chuẩn hóa).
+    """
+    key = normalize_key(value)
+    if key is None:
+        return []
+    variants = []
+    for text in (key, key.lower()):
+        for form in (text, "{" + text + "}"):
+            if form not in variants:
+                variants.append(form)
+    return variants
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def chunked(values, size):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def build_in_filter(field_name, values, numeric=False):
+    """
+    Tạo biểu thức "<field>" IN (...) cho một hoặc nhiều khóa.
+    Với trường số, các khóa được chuyển sang số nguyên; khóa không hợp lệ bị bỏ.
+    Trả về None nếu không còn khóa nào.
+    """
+    literals = []
+    seen = set()
+    for value in values:
+        if numeric:
+            key = normalize_key(value)
+            try:
+                forms = [str(int(float(key)))] if key is not None else []
+            except ValueError:
+                forms = []
+        else:
+            forms = [quote_literal(v) for v in key_variants(value)]
+        for form in forms:
+            if form not in seen:
+                seen.add(form)
+                literals.append(form)
+    if not literals:
+        return None
+    return f"{quote_identifier(field_name)} IN ({', '.join(literals)})"
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_query.py - truy vấn bảng ATTACH theo khóa quan hệ
+- Làm việc trên "source" bất kỳ có getFeatures(request): QgsVectorLayer (main thread)
+  hoặc QgsVectorLayerFeatureSource (thread nền, QgsTask)
+- Pha 1: metadata (không BLOB); pha 2: đọc BLOB theo feature id (AttachmentBuffer)
+"""
+
+from qgis.core import QgsFeatureRequest
+
+from .attachment_io import AttachmentBuffer
+from .attachment_keys import FILTER_BATCH_SIZE, normalize_key, build_in_filter, chunked
+from .attachment_stats import accumulate_rows, attachment_record
+
+# quá số lô IN (...) này (chọn vùng lớn): quét bảng ATTACH một lượt, lọc khóa phía Python
+MAX_FILTER_BATCHES = 10
+
+
+def feature_keys(features, schema):
+    """dict {khóa đã chuẩn hóa: giá trị gốc} của các feature layer chính."""
+    keys = {}
+    if schema.key_idx < 0:
+        return keys
+    for feature in features:
+        value = feature.attribute(schema.key_idx)
+        key = normalize_key(value)
+        if key is not None:
+            keys[key] = value
+    return keys
+
+
+def attachment_requests(schema, keys, index=None):
+    """
+    Sinh các QgsFeatureRequest cho tập khóa:
+    - chỉ mục đã sẵn sàng -> setFilterFids (O(số kết quả))
+    - chưa sẵn sàng -> đẩy biểu thức IN (...) xuống provider (OGR/GPKG/PostGIS
+      tự lọc và dùng attribute index nếu có), chia theo lô FILTER_BATCH_SIZE
+    - rất nhiều khóa -> một request không lọc; caller lọc theo keys (tránh
+      hàng chục lượt quét khi provider không có attribute index)
+    IN (...) chỉ khớp các dạng của key_variants; GUID lưu chữ hoa/thường lẫn lộn
+    chỉ được tìm thấy qua chỉ mục (đã chuẩn hóa) khi nó sẵn sàng. Không thêm
+    lượt upper(...) phía provider: biểu thức đó không dùng được attribute index,
+    mỗi click vào feature không có attachment sẽ tốn thêm một lượt quét bảng.
+    """
+    fids = None
+    if index is not None and index.ready:
+        fids = []
+        for value in keys.values():
+            matched = index.lookup(value)
+            if matched is None:
+                fids = None
+                break
+            fids.extend(matched)
+
+    if fids is not None:
+        if fids:
+            yield QgsFeatureRequest().setFilterFids(fids)
+        return
+
+    if len(keys) > FILTER_BATCH_SIZE * MAX_FILTER_BATCHES:
+        yield QgsFeatureRequest()
+        return
+
+    for batch in chunked(keys.values(), FILTER_BATCH_SIZE):
+        expression = build_in_filter(schema.rel_name, batch, numeric=schema.rel_numeric)
+        if expression:
+            yield QgsFeatureRequest().setFilterExpression(expression)
+
+
+def query_attachments(source, schema, keys, index=None, layer_id=None, is_canceled=None):
+    """
+    Pha 1: đọc metadata attachment cho tập khóa.
+    Trả về dict {khóa: [{"ATT_NAME", "fid", "size", "content_type", "layer_id"}, ...]}.
+    """
+    rel_idx = schema.rel_idx
+    name_idx = schema.name_idx
+    size_idx = schema.size_idx
+    type_idx = schema.type_idx
+    if rel_idx < 0 or not keys:
+        return {}
+
+    results = {}
+    for request in attachment_requests(schema, keys, index):
+        # chỉ đọc metadata, không geometry, không cột DATA
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([i for i in (rel_idx, name_idx, size_idx, type_idx) if i >= 0])
+        for att_feat in source.getFeatures(request):
+            if is_canceled is not None and is_canceled():
+                return results
+            rel_key = normalize_key(att_feat.attribute(rel_idx))
+
+            # provider đã lọc; kiểm tra lại vì so khớp phía provider có thể lỏng hơn
+            if rel_key not in keys:
+                continue
+
+            results.setdefault(rel_key, []).append(attachment_record(
+                att_feat.id(),
+                att_feat.attribute(name_idx) if name_idx >= 0 else None,
+                att_feat.attribute(size_idx) if size_idx >= 0 else None,
+                att_feat.attribute(type_idx) if type_idx >= 0 else None,
+                layer_id,
+            ))
+    return results
+
+
+def metadata_nbytes(entry):
+    """Ước lượng bộ nhớ một mục cache metadata (version, [attachment...])."""
+    return 64 + 256 * len(entry[1])
+
+
+def query_attachments_cached(source, schema, keys, index=None, layer_id=None, cache=None,
+                             is_canceled=None):
+    """
+    Như query_attachments nhưng dùng cache metadata (ByteLRUCache, khóa (layer_id, khóa rel)).
+    Mục cache chỉ hợp lệ khi index.version không đổi; feature không có attachment
+    cũng được cache (list rỗng). Không có index/cache -> truy vấn trực tiếp.
+    """
+    if cache is None or index is None or layer_id is None:
+        return query_attachments(source, schema, keys, index, layer_id, is_canceled)
+
+    version = index.version
+    results = {}
+    missing = {}
+    for key, value in keys.items():
+        entry = cache.get((layer_id, key))
+        if entry is not None and entry[0] == version:
+            if entry[1]:
+                # bản sao nông: caller có thể thêm "thumbnail"/"data" vào dict
+                results[key] = [dict(att) for att in entry[1]]
+        else:
+            missing[key] = value
+    if not missing:
+        return results
+
+    fetched = query_attachments(source, schema, missing, index, layer_id, is_canceled)
+    if is_canceled is not None and is_canceled():
+        return results
+    for key in missing:
+        attachments = fetched.get(key, [])
+        cache.put((layer_id, key), (version, [dict(att) for att in attachments]))
+        if attachments:
+            results[key] = attachments
+    return results
+
+
+def read_attachment_buffer(source, data_idx, fid):
+    """
+    Pha 2: đọc BLOB của một attachment theo feature id.
+    Trả về AttachmentBuffer (không sao chép dữ liệu của provider) hoặc None.
+    """
+    if data_idx < 0:
+        return None
+    request = QgsFeatureRequest(fid)
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([data_idx])
+    for att_feat in source.getFeatures(request):
+        return AttachmentBuffer.from_blob(att_feat.attribute(data_idx))
+    return None
+
+
+def aggregate_attachments(source, schema, keys=None, index=None, is_canceled=None, type_counts=None):
+    """
+    Một lượt GROUP BY khóa rel trên bảng ATTACH (chỉ đọc rel/size/content type, không BLOB).
+    keys=None: toàn bảng; ngược lại chỉ các khóa đã cho (lọc phía provider/chỉ mục).
+    Trả về dict {khóa: [số attachment, tổng byte]}; type_counts (dict) nếu có
+    được cộng dồn số attachment theo content type.
+    """
+    rel_idx = schema.rel_idx
+    size_idx = schema.size_idx
+    type_idx = schema.type_idx
+    if rel_idx < 0:
+        return {}
+    attrs = [rel_idx]
+    if size_idx >= 0:
+        attrs.append(size_idx)
+    if type_counts is not None and type_idx >= 0:
+        attrs.append(type_idx)
+
+    totals = {}
+    if keys is None:
+        requests = [QgsFeatureRequest()]
+    else:
+        requests = attachment_requests(schema, keys, index)
+
+    for request in requests:
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(attrs)
+        rows = _aggregate_rows(
+            source.getFeatures(request), rel_idx, size_idx,
+            type_idx if type_counts is not None else -1, is_canceled
+        )
+        accumulate_rows(rows, keys, type_counts if type_idx >= 0 else None, totals)
+        if is_canceled is not None and is_canceled():
+            break
+    return totals
+
+
+def _aggregate_rows(features, rel_idx, size_idx, type_idx, is_canceled=None):
+    for att_feat in features:
+        if is_canceled is not None and is_canceled():
+            return
+        yield (
+            att_feat.attribute(rel_idx),
+            att_feat.attribute(size_idx) if size_idx >= 0 else None,
+            att_feat.attribute(type_idx) if type_idx >= 0 else None,
+        )
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_resolver.py - tìm layer ATTACH cho layer chính, có cache
+- Cache theo id layer chính
+- Chỉ hủy cache khi project thêm/xóa layer hoặc layer đổi tên
+- Cache schema (index các trường) theo cặp layer, hủy khi trường thay đổi
+"""
+
+from qgis.core import QgsProject, QgsProviderRegistry, QgsVectorLayer
+
+from .attachment_schema import (
+    AttachmentSchema, detect_roles, find_attachment_table, select_key_index
+)
+
+
+class AttachmentLayerResolver:
+    """Cache main layer id -> attachment layer id (hoặc None nếu không có)."""
+
+    def __init__(self, project=None):
+        self._project = project or QgsProject.instance()
+        self._cache = {}
+        self._name_connections = {}
+        self._project.layersAdded.connect(self._on_layers_added)
+        self._project.layersRemoved.connect(self._on_layers_removed)
+        for lyr in self._project.mapLayers().values():
+            self._watch_name(lyr)
+
+    def resolve(self, main_layer):
+        if not main_layer:
+            return None
+        layer_id = main_layer.id()
+        if layer_id in self._cache:
+            attach_id = self._cache[layer_id]
+            if attach_id is None:
+                return None
+            attach_layer = self._project.mapLayer(attach_id)
+            if attach_layer is not None:
+                return attach_layer
+        attach_layer = self._find_attachment_layer(main_layer)
+        self._cache[layer_id] = attach_layer.id() if attach_layer else None
+        return attach_layer
+
+    def warm_all(self):
+        """Giải trước cho mọi layer vector trong project."""
+        for lyr in list(self._project.mapLayers().values()):
+            if isinstance(lyr, QgsVectorLayer):
+                self.resolve(lyr)
+
+    def invalidate(self, *args):
+        self._cache = {}
+
+    def clear(self):
+        self._cache = {}
+        for signal, slot in [
+            (self._project.layersAdded, self._on_layers_added),
+            (self._project.layersRemoved, self._on_layers_removed),
+        ]:
+            try:
+                signal.disconnect(slot)
+            except Exception:
+                pass
+        for lyr_id in list(self._name_connections.keys()):
+            self._unwatch_name(lyr_id)
+
+    # ---------------- internal ----------------
+    def _on_layers_added(self, layers):
+        for lyr in layers:
+            self._watch_name(lyr)
+        self.invalidate()
+
+    def _on_layers_removed(self, layer_ids):
+        for lyr_id in layer_ids:
+            self._unwatch_name(lyr_id)
+        self.invalidate()
+
+    def _watch_name(self, lyr):
+        if lyr.id() in self._name_connections:
+            return
+        try:
+            lyr.nameChanged.connect(self.invalidate)
+        except Exception:
+            return
+        self._name_connections[lyr.id()] = lyr
+
+    def _unwatch_name(self, lyr_id):
+        lyr = self._name_connections.pop(lyr_id, None)
+        if lyr is None:
+            return
+        try:
+            lyr.nameChanged.disconnect(self.invalidate)
+        except Exception:
+            pass
+
+    def _find_attachment_layer(self, main_layer):
+        return find_attachment_layer(main_layer, self._project.mapLayers().values())
+
+
+def find_attachment_layer(main_layer, layers):
+    """
+    Tìm layer ATTACH tương ứng: tìm theo tên <name>__ATTACH, <name>_ATTACH,
+    hoặc tên chứa main_layer.name() và 'attach', hoặc fallback tìm table có các trường đặc trưng.
+    """
+    layers = [lyr for lyr in layers if isinstance(lyr, QgsVectorLayer)]
+    names = []
+    for lyr in layers:
+        try:
+            names.append(lyr.name())
+        except Exception:
+            names.append("")
+
+    idx = find_attachment_table(main_layer.name(), names, lambda i: layers[i].fields().names())
+    return layers[idx] if idx >= 0 else None
+
+
+def open_sibling_attachment_layer(main_layer):
+    """
+    Mở bảng <name>__ATTACH / <name>_ATTACH cùng nguồn OGR với layer chính
+    (dùng khi bảng ATTACH không có trong project, ví dụ qgis_process).
+    """
+    if main_layer.providerType() != "ogr":
+        return None
+    registry = QgsProviderRegistry.instance()
+    parts = registry.decodeUri("ogr", main_layer.source())
+    base_name = parts.get("layerName") or main_layer.name()
+    if not parts.get("path"):
+        return None
+    for suffix in ("__ATTACH", "_ATTACH"):
+        uri_parts = dict(parts)
+        uri_parts["layerName"] = f"{base_name}{suffix}"
+        uri_parts.pop("layerId", None)
+        uri = registry.encodeUri("ogr", uri_parts)
+        lyr = QgsVectorLayer(uri, f"{base_name}{suffix}", "ogr")
+        if lyr.isValid():
+            return lyr
+    return None
+
+
+def build_attachment_schema(main_layer, attach_layer, roles=None):
+    """AttachmentSchema (index các trường) cho cặp layer chính/ATTACH, không cache."""
+    if roles is None:
+        roles = detect_roles(attach_layer.fields().names())
+    rel_idx = roles["rel"]
+    rel_name = None
+    rel_numeric = False
+    if rel_idx >= 0:
+        rel_field = attach_layer.fields().at(rel_idx)
+        rel_name = rel_field.name()
+        rel_numeric = rel_field.isNumeric()
+    # cùng quy tắc với attachment_core: REL_OBJECTID khớp OBJECTID, không phải GlobalID
+    key_idx = select_key_index(main_layer.fields().names(), rel_numeric)
+    return AttachmentSchema(
+        key_idx=key_idx,
+        rel_idx=rel_idx,
+        rel_name=rel_name,
+        rel_numeric=rel_numeric,
+        name_idx=roles["name"],
+        data_idx=roles["data"],
+        size_idx=roles["size"],
+        type_idx=roles["content_type"],
+    )
+
+
+class AttachmentSchemaCache:
+    """
+    Cache AttachmentSchema theo cặp (layer chính, layer ATTACH).
+    Hủy các mục liên quan khi layer phát attributeAdded/attributeDeleted/updatedFields.
+    """
+
+    def __init__(self):
+        self._schemas = {}
+        self._roles = {}
+        self._connections = {}
+
+    def get(self, main_layer, attach_layer):
+        pair = (main_layer.id(), attach_layer.id())
+        schema = self._schemas.get(pair)
+        if schema is None:
+            roles = self.attach_roles(attach_layer)
+            self._watch(main_layer)
+            schema = build_attachment_schema(main_layer, attach_layer, roles)
+            self._schemas[pair] = schema
+        return schema
+
+    def attach_roles(self, attach_layer):
+        """dict vai trò -> index trường của riêng layer ATTACH (cache theo layer id)."""
+        roles = self._roles.get(attach_layer.id())
+        if roles is None:
+            roles = detect_roles(attach_layer.fields().names())
+            self._roles[attach_layer.id()] = roles
+            self._watch(attach_layer)
+        return roles
+
+    def invalidate(self, layer_id):
+        self._roles.pop(layer_id, None)
+        for pair in [p for p in self._schemas if layer_id in p]:
+            del self._schemas[pair]
+
+    def clear(self):
+        self._schemas = {}
+        self._roles = {}
+        for layer_id in list(self._connections.keys()):
+            self._unwatch(layer_id)
+
+    # ---------------- internal ----------------
+    def _watch(self, layer):
+        layer_id = layer.id()
+        if layer_id in self._connections:
+            return
+
+        def on_fields_changed(*args):
+            self.invalidate(layer_id)
+
+        def on_deleted():
+            self.invalidate(layer_id)
+            self._unwatch(layer_id)
+
+        connections = [
+            (layer.attributeAdded, on_fields_changed),
+            (layer.attributeDeleted, on_fields_changed),
+            (layer.updatedFields, on_fields_changed),
+            (layer.willBeDeleted, on_deleted),
+        ]
+        for signal, slot in connections:
+            signal.connect(slot)
+        self._connections[layer_id] = connections
+
+    def _unwatch(self, layer_id):
+        for signal, slot in self._connections.pop(layer_id, []):
+            try:
+                signal.disconnect(slot)
+            except Exception:
+                pass
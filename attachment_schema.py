@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_schema.py - nhận diện vai trò các trường (globalid, rel, name, data...)
+- Làm việc trên danh sách tên trường, không phụ thuộc Qt/QGIS
+- Kết quả là chỉ số (index) trường để đọc bằng attribute(idx)
+"""
+
+from collections import namedtuple
+
+# các tên trường ứng viên cho từng vai trò trong bảng ATTACH (không phân biệt hoa thường)
+ROLE_CANDIDATES = {
+    "name": ["att_name", "name", "filename", "file_name"],
+    "data": ["data", "attachment", "att_data", "blob"],
+    "rel": ["rel_globalid", "rel_objectid", "rel_fid", "parent_globalid", "relid"],
+    "size": ["data_size", "att_size", "size", "filesize"],
+    "content_type": ["content_type", "contenttype", "mime_type", "att_type"],
+}
+
+# trường khóa của layer chính: globalid ưu tiên, rồi objectid/fid/id
+KEY_CANDIDATES = [["globalid"], ["objectid", "fid", "id"]]
+
+AttachmentSchema = namedtuple("AttachmentSchema", [
+    "key_idx",       # index trường khóa trong layer chính (-1 nếu không có)
+    "rel_idx",       # index trường REL_* trong layer ATTACH
+    "rel_name",      # tên trường REL_* (để tạo biểu thức lọc)
+    "rel_numeric",   # REL_* là trường số (REL_OBJECTID)
+    "name_idx",
+    "data_idx",
+    "size_idx",
+    "type_idx",
+])
+
+
+def find_field_index(field_names, candidates):
+    """Index của tên trường đầu tiên khớp danh sách ứng viên, -1 nếu không có."""
+    lower_fields = [n.lower() for n in field_names]
+    for c in candidates:
+        if c in lower_fields:
+            return lower_fields.index(c)
+    return -1
+
+
+def detect_key_index(field_names):
+    lower_fields = [n.lower() for n in field_names]
+    for group in KEY_CANDIDATES:
+        for i, name in enumerate(lower_fields):
+            if name in group:
+                return i
+    return -1
+
+
+def select_key_index(field_names, rel_numeric=False):
+    """
+    Index trường khóa của layer chính khớp kiểu trường REL_* của bảng ATTACH:
+    REL_* số (REL_OBJECTID) -> objectid/fid/id, REL_* chuỗi -> globalid ưu tiên.
+    -1 nếu không có trường phù hợp.
+    """
+    if rel_numeric:
+        return find_field_index(field_names, KEY_CANDIDATES[1])
+    return detect_key_index(field_names)
+
+
+def detect_roles(field_names):
+    """Trả về dict vai trò -> index trường (-1 nếu không có)."""
+    return {role: find_field_index(field_names, names) for role, names in ROLE_CANDIDATES.items()}
+
+
+def looks_like_attachment_table(field_names):
+    """Bảng có trường REL_* + tên tệp + dữ liệu (dùng khi không tìm được theo tên layer)."""
+    fnames = [n.lower() for n in field_names]
+    return (("rel_globalid" in fnames or "rel_objectid" in fnames or "rel_fid" in fnames) and
+            ("att_name" in fnames or "name" in fnames) and
+            ("data" in fnames or "attachment" in fnames or "att_data" in fnames))
+
+
+def find_attachment_table(main_name, table_names, field_names=None, fallback=True):
+    """
+    Vị trí bảng ATTACH của lớp main_name trong table_names, -1 nếu không có.
+    Thứ tự: <name>__ATTACH, rồi <name>_ATTACH / tên chứa tên lớp và 'attach',
+    rồi (fallback) bảng đầu tiên có các trường đặc trưng; field_names(i) chỉ được
+    gọi ở bước fallback.
+    """
+    target1 = f"{main_name}__ATTACH".lower()
+    target2 = f"{main_name}_ATTACH".lower()
+    main_lower = str(main_name).lower()
+    candidate = -1
+    for i, name in enumerate(table_names):
+        lname = str(name).lower()
+        if lname == target1:
+            return i
+        if candidate < 0 and (lname == target2 or (main_lower in lname and "attach" in lname)):
+            candidate = i
+    if candidate >= 0 or not fallback or field_names is None:
+        return candidate
+
+    for i in range(len(table_names)):
+        try:
+            fnames = field_names(i)
+        except Exception:
+            fnames = []
+        if looks_like_attachment_table(fnames):
+            return i
+    return -1
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+attachment_stats.py - gom nhóm attachment theo khóa quan hệ và tổng hợp thống kê
+- Đầu vào là các dòng (giá trị REL, kích thước, content type) từ bất kỳ nguồn nào
+  (QGIS provider hoặc OGR trực tiếp)
+- AttachmentCounts: kết quả GROUP BY giữ trong RAM, cập nhật từng phần khi bảng ATTACH đổi
+- Không phụ thuộc Qt/QGIS
+"""
+
+from .attachment_keys import normalize_key
+
+
+def attachment_size(size):
+    """Giá trị trường kích thước -> số byte (0 nếu NULL/không hợp lệ)."""
+    try:
+        return int(size) if size is not None else 0
+    except Exception:
+        return 0
+
+
+def format_size(size):
+    """Số byte -> chuỗi dễ đọc ("512 B", "1.5 MB"); "-" nếu không rõ kích thước."""
+    if size is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024.0
+
+
+def accumulate_rows(rows, keys=None, type_counts=None, totals=None):
+    """
+    GROUP BY khóa rel: rows là iterable (rel_value, size, content_type).
+    keys (dict/set khóa chuẩn hóa) nếu có thì bỏ các dòng không thuộc keys.
+    Trả về dict {khóa: [số attachment, tổng byte]}; type_counts (dict) nếu có
+    được cộng dồn số attachment theo content type.
+    """
+    if totals is None:
+        totals = {}
+    for rel_value, size, content_type in rows:
+        key = normalize_key(rel_value)
+        if key is None or (keys is not None and key not in keys):
+            continue
+        size = attachment_size(size)
+        entry = totals.get(key)
+        if entry is None:
+            totals[key] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+        if type_counts is not None:
+            content_type = str(content_type) if content_type else "unknown"
+            type_counts[content_type] = type_counts.get(content_type, 0) + 1
+    return totals
+
+
+def summarize(totals, keys, type_counts=None):
+    """
+    Thống kê cho tập feature cha `keys` (khóa chuẩn hóa) từ kết quả accumulate_rows.
+    Attachment có khóa không thuộc keys được tính là mồ côi.
+    """
+    matched = {k: v for k, v in totals.items() if k in keys}
+    stats = {
+        "total_attachments": sum(v[0] for v in matched.values()),
+        "total_bytes": sum(v[1] for v in matched.values()),
+        "features_with_attachments": len(matched),
+        "features_without_attachments": len(keys) - len(matched),
+        "max_per_feature": max((v[0] for v in matched.values()), default=0),
+        "orphan_attachments": sum(v[0] for k, v in totals.items() if k not in keys),
+    }
+    if type_counts is not None:
+        stats["content_types"] = dict(sorted(type_counts.items(), key=lambda kv: -kv[1]))
+    return stats
+
+
+def attachment_record(fid, name, size=None, content_type=None, layer_id=None):
+    """Metadata một attachment (dict dùng chung cho dock, export, CLI)."""
+    try:
+        size = int(size) if size is not None else None
+    except Exception:
+        size = None
+    return {
+        "ATT_NAME": str(name) if name else f"attachment_{fid}",
+        "fid": fid,
+        "size": size,
+        "content_type": str(content_type) if content_type else None,
+        "layer_id": layer_id,
+    }
+
+
+class AttachmentCounts:
+    """
+    Bảng {khóa: [số attachment, tổng byte]} của một layer ATTACH, cập nhật từng phần.
+    layer chỉ được giữ làm tham chiếu (AttachmentCountManager dùng để xây nền).
+    """
+
+    def __init__(self, layer, rel_idx, size_idx):
+        self.layer = layer
+        self.rel_idx = rel_idx
+        self.size_idx = size_idx
+        self.ready = False
+        # tăng mỗi lần hủy, để bỏ kết quả của task đang chạy dở
+        self.generation = 0
+        self._totals = {}
+        # fid -> (khóa, byte): để trừ lại khi xóa/sửa một attachment
+        self._row_by_fid = {}
+
+    def lookup(self, value):
+        """(số attachment, tổng byte) của khóa value; None nếu chưa sẵn sàng."""
+        if not self.ready:
+            return None
+        entry = self._totals.get(normalize_key(value))
+        return (entry[0], entry[1]) if entry else (0, 0)
+
+    def load(self, row_by_fid, totals):
+        self._row_by_fid = row_by_fid
+        self._totals = totals
+        self.ready = True
+
+    def accept(self, generation, row_by_fid, totals):
+        """
+        Nạp kết quả đếm nền nếu được bắt đầu ở generation hiện tại.
+        False: dữ liệu đã đổi trong lúc đếm (invalidate), caller đếm lại.
+        """
+        if generation != self.generation:
+            return False
+        self.load(row_by_fid, totals)
+        return True
+
+    def invalidate(self):
+        self.ready = False
+        self.generation += 1
+        self._totals = {}
+        self._row_by_fid = {}
+
+    def add(self, fid, rel_value, size):
+        key = normalize_key(rel_value)
+        if key is None:
+            return
+        size = attachment_size(size)
+        self._row_by_fid[fid] = (key, size)
+        entry = self._totals.get(key)
+        if entry is None:
+            self._totals[key] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def remove(self, fid):
+        row = self._row_by_fid.pop(fid, None)
+        if row is None:
+            return
+        key, size = row
+        entry = self._totals.get(key)
+        if entry is None:
+            return
+        entry[0] -= 1
+        entry[1] -= size
+        if entry[0] <= 0:
+            del self._totals[key]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+bench_blob_memory.py - đo bộ nhớ đỉnh khi lưu một attachment lớn ra đĩa
+- legacy: bytes(blob) rồi ghi một lần (như _to_bytes + f.write cũ)
+- buffer: AttachmentBuffer (memoryview) + ghi theo khối
+
+Chạy: python benchmarks/bench_blob_memory.py [--size-mb 200]
+Hai dạng BLOB:
+- bytearray: có buffer protocol -> AttachmentBuffer không sao chép
+- QByteArray (kiểu provider QGIS trả về): đo khi có PyQt; nếu bản PyQt không hỗ trợ
+  buffer protocol thì _as_memoryview sao chép qua data() và con số phản ánh bản sao đó.
+  Không có PyQt -> kết quả ghi rõ là chưa đo.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attachment_io import AttachmentBuffer  # noqa: E402
+
+
+def _qbytearray_class():
+    for module in ("qgis.PyQt.QtCore", "PyQt5.QtCore", "PyQt6.QtCore"):
+        try:
+            return __import__(module, fromlist=["QByteArray"]).QByteArray
+        except ImportError:
+            continue
+    return None
+
+
+def legacy_save(blob, path):
+    raw = bytes(blob)
+    with open(path, "wb") as f:
+        f.write(raw)
+
+
+def buffer_save(blob, path):
+    AttachmentBuffer(blob).write_to(path)
+
+
+def measure(func, blob, path):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func(blob, path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 4), "peak_bytes": peak}
+
+
+def run_case(blob, path):
+    return {"legacy": measure(legacy_save, blob, path), "buffer": measure(buffer_save, blob, path)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    # BLOB giả lập được tạo trước khi đo (thuộc về provider, không tính)
+    blob = bytearray(os.urandom(1024 * 1024)) * args.size_mb
+    results = {"size_bytes": len(blob)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "attachment.bin")
+        results["bytearray"] = run_case(blob, path)
+
+        QByteArray = _qbytearray_class()
+        if QByteArray is None:
+            results["qbytearray"] = {"measured": False, "reason": "PyQt not installed"}
+        else:
+            qblob = QByteArray(bytes(blob))
+            try:
+                memoryview(qblob)
+                zero_copy = True
+            except TypeError:
+                zero_copy = False
+            # QByteArray nằm trên heap C++ (tracemalloc không thấy); bản sao data() là bytes Python
+            results["qbytearray"] = dict(run_case(qblob, path), measured=True, buffer_protocol=zero_copy)
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+bench_suite.py - bộ benchmark tái lập được cho các bước chính của plugin
+Mỗi quy mô (--scales NxM: N feature x M attachment) tạo/dùng lại một bộ dữ liệu giả lập
+(generate_dataset.py), rồi đo:
+- lookup_ogr_filter / lookup_ogr_index: AttachmentStore.list_attachments cho một feature
+  (lọc IN (...) phía OGR / qua chỉ mục REL đã xây); không cần QGIS
+- lookup_qgis_filter / lookup_qgis_index: phần truy vấn của get_attachments_for_feature
+  (feature_keys + query_attachments) trên QgsVectorLayer
+- thumbnail_decode: decode_thumbnail (QImageReader thu nhỏ) trên BLOB ảnh
+- lookup_plugin / dock: get_attachments_for_feature và show_feature_in_dock của plugin
+  đang chạy (chỉ khi chạy trong QGIS, có iface)
+- extract_ogr / extract_qgis: xuất toàn bộ attachment ra thư mục tạm
+Kịch bản thiếu phụ thuộc được ghi "skipped" kèm lý do, không làm hỏng cả lượt chạy.
+Kết quả: JSON (ms: median/p95/min/max) trong benchmarks/results/, so sánh hai lượt
+bằng compare_results.py.
+
+Chạy: python benchmarks/bench_suite.py --scales 1000x2,10000x3 --format gpkg
+Trong QGIS (Python console, để đo cả dock):
+    import sys; sys.path.insert(0, "<thư mục plugin>/benchmarks")
+    import bench_suite; bench_suite.main(["--scales", "1000x2"], iface=iface)
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+PACKAGE = os.path.basename(PLUGIN_DIR)
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+import generate_dataset  # noqa: E402
+
+
+def _module(name):
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+def plugin_version():
+    try:
+        with open(os.path.join(PLUGIN_DIR, "metadata.txt"), encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("version="):
+                    return line.split("=", 1)[1].strip()
+    except OSError:
+        pass
+    return "unknown"
+
+
+def summarize(samples_ms):
+    samples = sorted(samples_ms)
+    n = len(samples)
+    if not n:
+        return {"n": 0}
+    return {
+        "n": n,
+        "median_ms": round(samples[n // 2], 4),
+        "p95_ms": round(samples[min(n - 1, int(n * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def measure(func, args_list):
+    """Gọi func(*args) cho từng phần tử args_list, trả về thống kê thời gian (ms)."""
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def dataset_for(scale, args):
+    """Đường dẫn dữ liệu cho quy mô; chỉ tạo lại khi tham số khác lần trước."""
+    features, attachments = (int(x) for x in scale.lower().split("x"))
+    ext = "gdb" if args.format == "gdb" else "gpkg"
+    name = f"{args.relation}_{features}x{attachments}_{args.blob_kb}kb.{ext}"
+    path = os.path.join(args.data_dir, name)
+    params = {
+        "format": args.format, "features": features, "attachments": attachments,
+        "blob_kb": args.blob_kb, "relation": args.relation, "seed": args.seed,
+    }
+    sidecar = path + ".json"
+    if os.path.exists(path) and os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as f:
+            info = json.load(f)
+        if all(info.get(k if k != "attachments" else "attachments_per_feature") == v for k, v in params.items()):
+            return info
+    os.makedirs(args.data_dir, exist_ok=True)
+    info = generate_dataset.generate(
+        path, args.format, features, attachments, args.blob_kb, args.relation, seed=args.seed
+    )
+    with open(sidecar, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=1)
+    return info
+
+
+# ---------------- OGR (không QGIS) ----------------
+def bench_ogr(info, args, rng, record):
+    try:
+        core = _module("attachment_core")
+    except ImportError as e:
+        for name in ("lookup_ogr_filter", "lookup_ogr_index", "extract_ogr"):
+            record(name, skipped=str(e))
+        return
+
+    layer = generate_dataset.LAYER_NAME
+    with core.AttachmentStore(info["path"]) as store:
+        all_keys = list(store.feature_keys(layer).items())
+        sample = [({k: v},) for k, v in rng.sample(all_keys, min(args.lookups, len(all_keys)))]
+
+        def lookup(keys):
+            store.list_attachments(layer, keys)
+
+        record("lookup_ogr_filter", measure(lookup, sample))
+        start = time.perf_counter()
+        store.build_index(layer)
+        build_ms = (time.perf_counter() - start) * 1000.0
+        record("lookup_ogr_index", measure(lookup, sample), index_build_ms=round(build_ms, 2))
+
+        if args.skip_extract:
+            return
+        out_dir = tempfile.mkdtemp(prefix="bench-extract-")
+        try:
+            start = time.perf_counter()
+            writer = store.extract(layer, out_dir, workers=args.workers, resume=False)
+            seconds = time.perf_counter() - start
+            record("extract_ogr", summarize([seconds * 1000.0]), files=writer.written,
+                   mb_per_s=round(writer.bytes_written / 1048576.0 / max(seconds, 1e-9), 2))
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+# ---------------- QGIS ----------------
+_qgs_app = None
+
+
+def qgis_available():
+    """Khởi tạo QgsApplication không GUI nếu chưa chạy trong QGIS."""
+    global _qgs_app
+    try:
+        from qgis.core import QgsApplication
+    except ImportError:
+        return False
+    if QgsApplication.instance() is None:
+        _qgs_app = QgsApplication([], False)
+        _qgs_app.initQgis()
+    return True
+
+
+def load_layers(info):
+    from qgis.core import QgsVectorLayer
+    layer = generate_dataset.LAYER_NAME
+    main = QgsVectorLayer(f"{info['path']}|layername={layer}", layer, "ogr")
+    attach = QgsVectorLayer(f"{info['path']}|layername={layer}__ATTACH", f"{layer}__ATTACH", "ogr")
+    if not main.isValid() or not attach.isValid():
+        raise RuntimeError(f"Cannot load {info['path']} in QGIS")
+    return main, attach
+
+
+def bench_qgis(info, args, rng, record, iface=None):
+    names = ["lookup_qgis_filter", "lookup_qgis_index", "thumbnail_decode", "extract_qgis",
+             "lookup_plugin", "dock"]
+    if not qgis_available():
+        for name in names:
+            record(name, skipped="qgis not importable")
+        return
+
+    from qgis.core import QgsFeatureRequest
+    query = _module("attachment_query")
+    resolver = _module("attachment_resolver")
+    index_mod = _module("attachment_index")
+    thumbnails = _module("thumbnails")
+
+    main, attach = load_layers(info)
+    schema = resolver.build_attachment_schema(main, attach)
+    fids = rng.sample(range(1, main.featureCount() + 1), min(args.lookups, main.featureCount()))
+    features = [(f,) for f in main.getFeatures(QgsFeatureRequest().setFilterFids(fids))]
+
+    def lookup(feature, index=None):
+        query.query_attachments(attach, schema, query.feature_keys([feature], schema), index)
+
+    record("lookup_qgis_filter", measure(lookup, features))
+
+    # chỉ mục dựng đồng bộ (giống _BuildIndexTask nhưng trên thread hiện tại)
+    start = time.perf_counter()
+    index = index_mod.AttachmentIndex(attach, schema.rel_name)
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([index.rel_idx])
+    normalize_key = _module("attachment_keys").normalize_key
+    key_by_fid = {}
+    for feat in attach.getFeatures(request):
+        key = normalize_key(feat.attribute(index.rel_idx))
+        if key is not None:
+            key_by_fid[feat.id()] = key
+    index.load(key_by_fid)
+    build_ms = (time.perf_counter() - start) * 1000.0
+    record("lookup_qgis_index", measure(lambda f: lookup(f, index), features),
+           index_build_ms=round(build_ms, 2))
+
+    # thumbnail: các BLOB ảnh đầu tiên
+    images = []
+    for feat, in features:
+        for att in query.query_attachments(attach, schema, query.feature_keys([feat], schema)).values():
+            for a in att:
+                if a["content_type"] == "image/png" and len(images) < args.decodes:
+                    images.append((query.read_attachment_buffer(attach, schema.data_idx, a["fid"]),))
+    if images:
+        record("thumbnail_decode", measure(
+            lambda buf: thumbnails.decode_thumbnail(buf, thumbnails.THUMBNAIL_WIDTH), images
+        ))
+    else:
+        record("thumbnail_decode", skipped="no image attachments in dataset")
+
+    if args.skip_extract:
+        record("extract_qgis", skipped="--skip-extract")
+    else:
+        export_task = _module("export_task")
+        out_dir = tempfile.mkdtemp(prefix="bench-extract-")
+        try:
+            start = time.perf_counter()
+            writer, _ = export_task.export_layer_attachments(
+                main, attach, schema, out_dir, workers=args.workers, resume=False,
+                attach_total=attach.featureCount()
+            )
+            seconds = time.perf_counter() - start
+            record("extract_qgis", summarize([seconds * 1000.0]), files=writer.written,
+                   mb_per_s=round(writer.bytes_written / 1048576.0 / max(seconds, 1e-9), 2))
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    if iface is None:
+        record("lookup_plugin", skipped="needs a running QGIS (iface)")
+        record("dock", skipped="needs a running QGIS (iface)")
+    else:
+        bench_plugin(main, attach, features, record)
+
+
+def bench_plugin(main, attach, features, record):
+    """get_attachments_for_feature + show_feature_in_dock của plugin đang chạy."""
+    from qgis.core import QgsProject
+    from qgis.PyQt.QtWidgets import QApplication
+    from qgis.utils import plugins
+
+    plugin = plugins.get(PACKAGE)
+    if plugin is None:
+        record("lookup_plugin", skipped=f"plugin {PACKAGE} not loaded")
+        record("dock", skipped=f"plugin {PACKAGE} not loaded")
+        return
+    QgsProject.instance().addMapLayers([main, attach], False)
+    try:
+        record("lookup_plugin", measure(lambda f: plugin.get_attachments_for_feature(main, f), features))
+
+        def dock(feature):
+            # truyền sẵn attachment: đo cùng phần việc như trước (không tính task nền)
+            plugin.show_feature_in_dock(main, feature, plugin.get_attachments_for_feature(main, feature))
+            QApplication.processEvents()
+
+        record("dock", measure(dock, features))
+        plugin.clear_results_panel()
+    finally:
+        QgsProject.instance().removeMapLayers([main.id(), attach.id()])
+
+
+# ---------------- main ----------------
+def environment():
+    env = {
+        "plugin_version": plugin_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        from osgeo import gdal
+        env["gdal"] = gdal.__version__
+    except ImportError:
+        env["gdal"] = None
+    try:
+        from qgis.core import Qgis
+        env["qgis"] = Qgis.version()
+    except ImportError:
+        env["qgis"] = None
+    return env
+
+
+def main(argv=None, iface=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", default="1000x2,10000x3", help="NxM, comma separated")
+    parser.add_argument("--format", choices=["gpkg", "gdb"], default="gpkg")
+    parser.add_argument("--relation", choices=["guid", "objectid"], default="guid")
+    parser.add_argument("--blob-kb", type=int, default=64)
+    parser.add_argument("--lookups", type=int, default=200, help="random features per lookup scenario")
+    parser.add_argument("--decodes", type=int, default=50, help="images per thumbnail scenario")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-extract", action="store_true")
+    parser.add_argument("--data-dir", default=os.path.join(BENCH_DIR, "data"))
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<version>_<time>.json)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for scale in [s.strip() for s in args.scales.split(",") if s.strip()]:
+        info = dataset_for(scale, args)
+        dataset = {k: info[k] for k in ("format", "features", "attachments_per_feature", "blob_kb", "relation")}
+        # cùng seed cho mọi lượt chạy -> cùng tập feature được đo
+        rng = random.Random(args.seed)
+
+        def record(scenario, stats=None, skipped=None, **extra):
+            entry = {"scenario": scenario, "dataset": dataset}
+            if skipped is not None:
+                entry["skipped"] = skipped
+            else:
+                entry["stats"] = stats
+                entry.update(extra)
+            results.append(entry)
+            label = f"skipped ({skipped})" if skipped is not None else f"median {stats.get('median_ms')} ms"
+            print(f"[{scale}] {scenario}: {label}", file=sys.stderr)
+
+        bench_ogr(info, args, rng, record)
+        bench_qgis(info, args, random.Random(args.seed), record, iface)
+
+    report = {
+        "environment": environment(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": {k: v for k, v in vars(args).items() if k not in ("data_dir", "output")},
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(BENCH_DIR, "results", f"{report['environment']['plugin_version']}_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
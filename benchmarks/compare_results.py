@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+compare_results.py - so sánh hai lượt bench_suite.py (median theo từng kịch bản + bộ dữ liệu)
+
+Chạy: python benchmarks/compare_results.py base.json new.json [--threshold 1.2]
+Mã thoát 1 nếu có kịch bản chậm hơn ngưỡng (dùng được trong CI).
+"""
+
+import argparse
+import json
+import sys
+
+
+def _entries(path):
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    entries = {}
+    for entry in report.get("results", []):
+        if "stats" not in entry:
+            continue
+        d = entry["dataset"]
+        key = (entry["scenario"], d["format"], d["relation"], d["features"],
+               d["attachments_per_feature"], d["blob_kb"])
+        entries[key] = entry["stats"].get("median_ms")
+    return report.get("environment", {}), entries
+
+
+def compare(base_path, new_path, threshold=1.2):
+    base_env, base = _entries(base_path)
+    new_env, new = _entries(new_path)
+    print(f"base: {base_env.get('plugin_version')}  new: {new_env.get('plugin_version')}")
+    regressions = []
+    for key in sorted(set(base) & set(new)):
+        old_ms, new_ms = base[key], new[key]
+        if not old_ms or new_ms is None:
+            continue
+        ratio = new_ms / old_ms
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif ratio < 1.0 / threshold:
+            flag = "  faster"
+        scenario, fmt, relation, features, attachments, blob_kb = key
+        print(f"{scenario:20s} {fmt:4s} {relation:8s} {features}x{attachments} {blob_kb}kb  "
+              f"{old_ms:10.3f} -> {new_ms:10.3f} ms  x{ratio:.2f}{flag}")
+    for key in sorted(set(base) ^ set(new)):
+        print(f"{key[0]:20s} only in {'base' if key in base else 'new'}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as regression")
+    args = parser.parse_args(argv)
+    return 1 if compare(args.base, args.new, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
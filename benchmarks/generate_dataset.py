@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+generate_dataset.py - tạo dữ liệu attachment giả lập (GeoPackage / FileGDB) để benchmark
+- N feature điểm x M attachment mỗi feature, kích thước BLOB cấu hình được
+- Quan hệ theo GlobalID (REL_GLOBALID) hoặc OBJECTID (REL_OBJECTID)
+- Nội dung trộn ảnh PNG (giải mã được) và PDF tối thiểu
+- Cùng seed -> cùng dữ liệu (tái lập được)
+
+Chạy: python benchmarks/generate_dataset.py out.gpkg --features 10000 --attachments 3
+      python benchmarks/generate_dataset.py out.gdb --format gdb --relation objectid
+Cần GDAL Python (osgeo); FileGDB ghi bằng driver OpenFileGDB (GDAL >= 3.6) hoặc FileGDB.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import time
+import uuid
+import zlib
+
+from osgeo import ogr, osr
+
+LAYER_NAME = "Poles"
+CONTENT_TYPES = {"image": "image/png", "pdf": "application/pdf"}
+
+
+def make_png(width, height, rng):
+    """PNG RGB nhiễu (nén kém -> kích thước ~ width*height*3)."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(rows, 1)) +
+            chunk(b"IEND", b""))
+
+
+def make_pdf(size, rng):
+    """PDF một trang hợp lệ, đệm bằng stream nhị phân tới ~size byte."""
+    padding = rng.randbytes(max(0, size - 400))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] >>",
+        b"<< /Length " + str(len(padding)).encode() + b" >>\nstream\n" + padding + b"\nendstream",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def make_blob(kind, size, rng):
+    if kind == "pdf":
+        return make_pdf(size, rng)
+    side = max(8, int((size / 3) ** 0.5))
+    return make_png(side, side, rng)
+
+
+def _driver(fmt):
+    if fmt == "gpkg":
+        return ogr.GetDriverByName("GPKG")
+    for name in ("OpenFileGDB", "FileGDB"):
+        driver = ogr.GetDriverByName(name)
+        if driver is not None and driver.GetMetadataItem("DCAP_CREATE") == "YES":
+            return driver
+    raise RuntimeError("No FileGDB driver with write support (GDAL >= 3.6 needed)")
+
+
+def generate(path, fmt="gpkg", features=1000, attachments=2, blob_kb=64, relation="guid",
+             mix=("image", "pdf"), seed=42, index=True):
+    """Tạo dữ liệu; trả về dict mô tả (dùng làm metadata của kết quả benchmark)."""
+    rng = random.Random(seed)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+    start = time.perf_counter()
+    ds = _driver(fmt).CreateDataSource(path)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+
+    main = ds.CreateLayer(LAYER_NAME, srs, ogr.wkbPoint, options=["FID=OBJECTID"])
+    main.CreateField(ogr.FieldDefn("GlobalID", ogr.OFTString))
+    main.CreateField(ogr.FieldDefn("NAME", ogr.OFTString))
+
+    attach = ds.CreateLayer(f"{LAYER_NAME}__ATTACH", None, ogr.wkbNone, options=["FID=ATTACHMENTID"])
+    rel_name = "REL_GLOBALID" if relation == "guid" else "REL_OBJECTID"
+    attach.CreateField(ogr.FieldDefn(rel_name, ogr.OFTString if relation == "guid" else ogr.OFTInteger))
+    for name, ftype in (("CONTENT_TYPE", ogr.OFTString), ("ATT_NAME", ogr.OFTString),
+                        ("DATA_SIZE", ogr.OFTInteger), ("DATA", ogr.OFTBinary)):
+        attach.CreateField(ogr.FieldDefn(name, ftype))
+
+    # bộ BLOB mẫu dùng lại (tạo ảnh nhiễu tốn thời gian hơn ghi)
+    samples = {kind: [make_blob(kind, blob_kb * 1024, rng) for _ in range(4)] for kind in mix}
+    main_defn = main.GetLayerDefn()
+    attach_defn = attach.GetLayerDefn()
+    total_bytes = 0
+
+    main.StartTransaction()
+    attach.StartTransaction()
+    for i in range(features):
+        feat = ogr.Feature(main_defn)
+        guid = "{" + str(uuid.UUID(int=rng.getrandbits(128), version=4)).upper() + "}"
+        feat.SetField("GlobalID", guid)
+        feat.SetField("NAME", f"pole {i}")
+        feat.SetGeometry(ogr.CreateGeometryFromWkt(f"POINT ({rng.uniform(100, 110)} {rng.uniform(8, 22)})"))
+        main.CreateFeature(feat)
+        parent = guid if relation == "guid" else feat.GetFID()
+
+        for j in range(attachments):
+            kind = mix[(i + j) % len(mix)]
+            blob = samples[kind][(i * attachments + j) % len(samples[kind])]
+            att = ogr.Feature(attach_defn)
+            att.SetField(rel_name, parent)
+            att.SetField("CONTENT_TYPE", CONTENT_TYPES[kind])
+            att.SetField("ATT_NAME", f"{kind}_{i}_{j}.{'png' if kind == 'image' else 'pdf'}")
+            att.SetField("DATA_SIZE", len(blob))
+            att.SetFieldBinaryFromHexString("DATA", blob.hex())
+            attach.CreateFeature(att)
+            total_bytes += len(blob)
+        if i and i % 5000 == 0:
+            main.CommitTransaction()
+            attach.CommitTransaction()
+            main.StartTransaction()
+            attach.StartTransaction()
+    main.CommitTransaction()
+    attach.CommitTransaction()
+
+    if index:
+        # chỉ mục thuộc tính trên REL_* như ArcGIS tạo cho bảng ATTACH
+        ds.ExecuteSQL(f"CREATE INDEX idx_{LAYER_NAME}_rel ON {LAYER_NAME}__ATTACH({rel_name})")
+    ds = None
+
+    return {
+        "path": path,
+        "format": fmt,
+        "features": features,
+        "attachments_per_feature": attachments,
+        "blob_kb": blob_kb,
+        "relation": relation,
+        "mix": list(mix),
+        "seed": seed,
+        "rel_index": index,
+        "total_attachment_bytes": total_bytes,
+        "generate_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["gpkg", "gdb"], default="gpkg")
+    parser.add_argument("--features", type=int, default=1000)
+    parser.add_argument("--attachments", type=int, default=2)
+    parser.add_argument("--blob-kb", type=int, default=64)
+    parser.add_argument("--relation", choices=["guid", "objectid"], default="guid")
+    parser.add_argument("--mix", default="image,pdf", help="image,pdf | image | pdf")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-index", action="store_true")
+    args = parser.parse_args(argv)
+
+    info = generate(
+        args.path, args.format, args.features, args.attachments, args.blob_kb, args.relation,
+        tuple(m.strip() for m in args.mix.split(",") if m.strip()), args.seed, not args.no_index
+    )
+    json.dump(info, sys.stdout, indent=2)
+    print()
+    return info
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+cli.py - dòng lệnh cho attachment ArcGIS (không cần QGIS, chỉ cần GDAL Python)
+Chạy từ thư mục chứa plugin:
+    python -m ArcGisAttachmentsReader list data.gdb [--layer Poles] [--key GUID ...] [--json]
+    python -m ArcGisAttachmentsReader extract data.gdb OUT_DIR [--layer Poles] [--where "..."]
+    python -m ArcGisAttachmentsReader stats data.gdb [--layer Poles] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from .attachment_core import AttachmentError, AttachmentStore
+from .attachment_keys import normalize_key
+from .attachment_stats import format_size
+
+
+def _layers(store, args):
+    if args.layer:
+        return [args.layer]
+    layers = [main for main, _ in store.attachment_layers()]
+    if not layers:
+        raise AttachmentError(f"No layer with attachments in {store.path}")
+    return layers
+
+
+def cmd_list(store, args):
+    if not args.layer and not args.key and not args.where:
+        # không chỉ định lớp: liệt kê các lớp có attachment
+        rows = [{"layer": main, "attachment_table": attach} for main, attach in store.attachment_layers()]
+        if args.json:
+            print(json.dumps(rows, ensure_ascii=False, indent=1))
+        else:
+            for row in rows:
+                print(f"{row['layer']}\t{row['attachment_table']}")
+        return 0
+
+    output = {}
+    for layer in _layers(store, args):
+        if args.key:
+            keys = {normalize_key(value): value for value in args.key if normalize_key(value)}
+        else:
+            keys = store.feature_keys(layer, args.where)
+        if len(keys) > 1000:
+            # nhiều khóa: một lượt đọc REL để dựng chỉ mục rẻ hơn nhiều lô IN (...)
+            store.build_index(layer)
+        output[layer] = store.list_attachments(layer, keys)
+
+    if args.json:
+        print(json.dumps(output, ensure_ascii=False, indent=1))
+        return 0
+    for layer, attachments in output.items():
+        for key in sorted(attachments):
+            for att in attachments[key]:
+                print(f"{layer}\t{key}\t{att['fid']}\t{att['ATT_NAME']}\t"
+                      f"{format_size(att['size'])}\t{att['content_type'] or ''}")
+    return 0
+
+
+def cmd_extract(store, args):
+    layers = _layers(store, args)
+    failed = 0
+    for layer in layers:
+        out_dir = args.out_dir if args.layer else os.path.join(args.out_dir, layer)
+
+        def progress(done, total, layer=layer):
+            if not args.quiet:
+                sys.stderr.write(f"\r{layer}: {done}/{total}")
+                sys.stderr.flush()
+
+        writer = store.extract(
+            layer, out_dir, where=args.where, workers=args.workers,
+            resume=not args.no_resume, progress=progress
+        )
+        if not args.quiet:
+            sys.stderr.write("\n")
+        for error in writer.errors:
+            print(error, file=sys.stderr)
+        print(f"{layer}: written {writer.written}, skipped {writer.skipped}, "
+              f"failed {writer.failed}, {format_size(writer.bytes_written)} -> {out_dir}")
+        failed += writer.failed
+    return 1 if failed else 0
+
+
+def cmd_stats(store, args):
+    results = [store.stats(layer, args.where) for layer in _layers(store, args)]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=1))
+        return 0
+    for stats in results:
+        print(f"{stats['layer']} ({stats['attachment_table']})")
+        print(f"  attachments:        {stats['total_attachments']} ({format_size(stats['total_bytes'])})")
+        print(f"  features with:      {stats['features_with_attachments']}")
+        print(f"  features without:   {stats['features_without_attachments']}")
+        print(f"  max per feature:    {stats['max_per_feature']}")
+        print(f"  orphans:            {stats['orphan_attachments']}")
+        for content_type, count in stats.get("content_types", {}).items():
+            print(f"  {content_type}: {count}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="ArcGisAttachmentsReader",
+        description="List, extract and summarize ArcGIS attachments through GDAL/OGR."
+    )
+    sub = parser.add_subparsers(dest="command")
+    sub.required = True
+
+    def common(p):
+        p.add_argument("source", help="File geodatabase (.gdb) or other OGR data source")
+        p.add_argument("--layer", help="Main layer (default: every layer with attachments)")
+        p.add_argument("--where", help="OGR SQL filter on the main layer")
+
+    p = sub.add_parser("list", help="List layers with attachments, or attachments of a layer")
+    common(p)
+    p.add_argument("--key", action="append", help="GlobalID/OBJECTID of a parent feature (repeatable)")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("extract", help="Write attachments to a folder with a manifest")
+    common(p)
+    p.add_argument("out_dir")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--no-resume", action="store_true", help="Ignore an existing manifest")
+    p.add_argument("--quiet", action="store_true")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("stats", help="Attachment statistics per layer")
+    common(p)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        with AttachmentStore(args.source) as store:
+            return args.func(store, args)
+    except AttachmentError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+diagnostics_dialog.py - bảng chẩn đoán độ trễ identify
+- p50/p95/p99 (ms) theo từng bước trên cửa sổ trượt các click gần nhất
+- Byte BLOB đọc mỗi click
+- Bật/tắt ghi log từng click, profile N click tiếp theo và xuất tệp .prof
+- Cache (RAM / đĩa): số mục, dung lượng, hit/miss/eviction
+"""
+
+import qgis.PyQt
+from qgis.PyQt.QtCore import QTimer
+from qgis.PyQt.QtWidgets import (
+    QCheckBox, QDialog, QFileDialog, QHBoxLayout, QLabel, QMessageBox, QPushButton,
+    QSpinBox, QTableWidget, QTableWidgetItem, QVBoxLayout
+)
+
+from .settings import get_setting, set_setting
+
+QT_VERSION = int(qgis.PyQt.QtCore.QT_VERSION_STR.split('.')[0])
+if QT_VERSION >= 6:
+    NO_EDIT_TRIGGERS = QTableWidget.EditTrigger.NoEditTriggers
+else:
+    NO_EDIT_TRIGGERS = QTableWidget.NoEditTriggers
+
+# chu kỳ làm mới bảng khi dialog đang mở (ms)
+REFRESH_MS = 1000
+
+
+def _ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _kb(value):
+    return "-" if value is None else f"{value / 1024.0:.1f} KB"
+
+
+def _mb(value):
+    return f"{(value or 0) / (1024.0 * 1024.0):.1f} MB"
+
+
+def cache_row(label, stats):
+    """Một dòng bảng cache từ stats() của ByteLRUCache / ThumbnailDiskCache."""
+    hits = stats.get("hits", 0)
+    misses = stats.get("misses", 0)
+    lookups = hits + misses
+    return [
+        label,
+        str(stats.get("entries", 0)),
+        f"{_mb(stats.get('bytes'))} / {_mb(stats.get('max_bytes'))}",
+        str(hits),
+        str(misses),
+        str(stats.get("evictions", 0)),
+        f"{hits * 100.0 / lookups:.0f}%" if lookups else "-",
+    ]
+
+
+class LatencyDiagnosticsDialog(QDialog):
+
+    def __init__(self, recorder, capture, parent=None, caches=None):
+        super().__init__(parent)
+        self.setWindowTitle("ArcGIS Attachments - Latency diagnostics")
+        self.resize(620, 560)
+        self._recorder = recorder
+        self._capture = capture
+        # [(nhãn, cache có stats())]
+        self._caches = list(caches or [])
+
+        layout = QVBoxLayout(self)
+        self._summary = QLabel()
+        layout.addWidget(self._summary)
+
+        self._table = QTableWidget(0, 5)
+        self._table.setHorizontalHeaderLabels(["Stage", "n", "p50 (ms)", "p95 (ms)", "p99 (ms)"])
+        self._table.setEditTriggers(NO_EDIT_TRIGGERS)
+        self._table.verticalHeader().setVisible(False)
+        layout.addWidget(self._table)
+
+        self._cache_table = QTableWidget(0, 7)
+        self._cache_table.setHorizontalHeaderLabels(
+            ["Cache", "Entries", "Size", "Hits", "Misses", "Evictions", "Hit rate"]
+        )
+        self._cache_table.setEditTriggers(NO_EDIT_TRIGGERS)
+        self._cache_table.verticalHeader().setVisible(False)
+        self._cache_table.setVisible(bool(self._caches))
+        layout.addWidget(self._cache_table)
+
+        self._log_check = QCheckBox("Log every click to the QGIS message log")
+        self._log_check.setChecked(get_setting("latency_logging"))
+        self._log_check.toggled.connect(lambda checked: set_setting("latency_logging", bool(checked)))
+        layout.addWidget(self._log_check)
+
+        profile_row = QHBoxLayout()
+        self._profile_clicks = QSpinBox()
+        self._profile_clicks.setRange(1, 100)
+        self._profile_clicks.setValue(10)
+        profile_btn = QPushButton("Profile next clicks")
+        profile_btn.clicked.connect(self._arm_profile)
+        self._export_btn = QPushButton("Export .prof...")
+        self._export_btn.clicked.connect(self._export_profile)
+        self._profile_status = QLabel()
+        profile_row.addWidget(self._profile_clicks)
+        profile_row.addWidget(profile_btn)
+        profile_row.addWidget(self._export_btn)
+        profile_row.addWidget(self._profile_status, 1)
+        layout.addLayout(profile_row)
+
+        buttons = QHBoxLayout()
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self._reset)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        buttons.addStretch(1)
+        buttons.addWidget(reset_btn)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self._timer.start(REFRESH_MS)
+
+    def hideEvent(self, event):
+        self._timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        rows = self._recorder.summary()
+        self._table.setRowCount(len(rows))
+        for r, (_, label, stats) in enumerate(rows):
+            values = [label, str(stats["n"]), _ms(stats["p50"]), _ms(stats["p95"]), _ms(stats["p99"])]
+            for c, value in enumerate(values):
+                self._table.setItem(r, c, QTableWidgetItem(value))
+        self._table.resizeColumnsToContents()
+
+        self._cache_table.setRowCount(len(self._caches))
+        for r, (label, cache) in enumerate(self._caches):
+            try:
+                stats = cache.stats()
+            except Exception:
+                stats = {}
+            for c, value in enumerate(cache_row(label, stats)):
+                self._cache_table.setItem(r, c, QTableWidgetItem(value))
+        self._cache_table.resizeColumnsToContents()
+
+        b = self._recorder.bytes_percentiles()
+        self._summary.setText(
+            f"Last {b['n']} of {self._recorder.clicks} clicks (window {self._recorder.window}). "
+            f"BLOB bytes per click: p50 {_kb(b['p50'])}, p95 {_kb(b['p95'])}, p99 {_kb(b['p99'])}"
+        )
+
+        capture = self._capture
+        if capture.active:
+            self._profile_status.setText(f"Profiling {capture.captured}/{capture.requested} clicks")
+        elif capture.has_data():
+            self._profile_status.setText(f"{capture.captured} clicks captured")
+        else:
+            self._profile_status.setText("")
+        self._export_btn.setEnabled(capture.has_data())
+
+    def _arm_profile(self):
+        self._capture.arm(self._profile_clicks.value())
+        self.refresh()
+
+    def _export_profile(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export profile", "identify.prof", "cProfile (*.prof)")
+        if not path:
+            return
+        try:
+            if not self._capture.dump(path):
+                QMessageBox.information(self, "Profile", "No profiled clicks yet.")
+        except Exception as e:
+            QMessageBox.warning(self, "Lỗi", f"Không ghi được tệp profile: {e}")
+
+    def _reset(self):
+        self._recorder.reset()
+        self.refresh()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+export_task.py - xuất attachment của cả lớp hoặc các đối tượng đang chọn (QgsTask)
+- Đọc bảng ATTACH một lượt (stream), ghi đĩa song song bằng ExportWriter
+- Báo tiến độ, hủy được, chạy tiếp được (bỏ qua tệp đã có trong manifest)
+"""
+
+from qgis.core import QgsFeatureRequest, QgsTask, QgsVectorLayerFeatureSource
+
+from .attachment_io import AttachmentBuffer
+from .attachment_keys import normalize_key
+from .attachment_query import attachment_requests
+from .export_writer import ExportWriter
+
+
+def export_layer_attachments(source, attach_source, schema, out_dir, feature_ids=None, index=None,
+                             workers=4, resume=True, is_canceled=None, set_progress=None,
+                             attach_total=None):
+    """
+    Xuất attachment của các feature cha trong `source` (feature_ids=None: toàn bộ).
+    Dùng chung cho QgsTask và thuật toán Processing.
+    attach_total: số dòng bảng ATTACH (tiến độ khi xuất toàn bộ lớp).
+    Trả về (ExportWriter, hoàn tất hay bị hủy).
+    """
+    def canceled():
+        return is_canceled is not None and is_canceled()
+
+    keys = parent_keys(source, schema, feature_ids, canceled)
+    writer = ExportWriter(out_dir, workers=workers, resume=resume)
+    try:
+        if canceled():
+            writer.cancel()
+            return writer, False
+        if not keys:
+            writer.close()
+            return writer, True
+
+        meta_attrs = [i for i in (schema.rel_idx, schema.name_idx, schema.size_idx, schema.type_idx) if i >= 0]
+
+        if feature_ids is None:
+            # toàn bộ lớp: một lượt quét bảng ATTACH, không lọc phía provider
+            requests = [QgsFeatureRequest()]
+        else:
+            requests = list(attachment_requests(schema, keys, index))
+
+        if feature_ids is not None or writer.done_count():
+            # lượt metadata (không BLOB): biết đúng số attachment cần đọc cho tiến độ
+            # khi chỉ xuất đối tượng đang chọn; chạy tiếp thì bỏ những gì đã có
+            remaining = []
+            for request in requests:
+                request.setFlags(QgsFeatureRequest.NoGeometry)
+                request.setSubsetOfAttributes(meta_attrs)
+                for att_feat in attach_source.getFeatures(request):
+                    if canceled():
+                        writer.cancel()
+                        return writer, False
+                    key = normalize_key(att_feat.attribute(schema.rel_idx))
+                    if key not in keys:
+                        continue
+                    if writer.is_done(key, att_feat.id()):
+                        writer.skipped += 1
+                    else:
+                        remaining.append(att_feat.id())
+            if not remaining:
+                writer.close()
+                return writer, True
+            requests = [QgsFeatureRequest().setFilterFids(remaining)]
+            total = len(remaining)
+        else:
+            total = max(1, attach_total or 1)
+
+        count = 0
+        for request in requests:
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(meta_attrs + [schema.data_idx])
+            for att_feat in attach_source.getFeatures(request):
+                if canceled():
+                    writer.cancel()
+                    return writer, False
+                count += 1
+                if set_progress is not None and count % 200 == 0:
+                    set_progress(min(99.0, count * 100.0 / total))
+
+                key = normalize_key(att_feat.attribute(schema.rel_idx))
+                if key not in keys:
+                    continue
+                fid = att_feat.id()
+                if writer.is_done(key, fid):
+                    writer.skipped += 1
+                    continue
+
+                name = att_feat.attribute(schema.name_idx) if schema.name_idx >= 0 else None
+                size = None
+                if schema.size_idx >= 0:
+                    try:
+                        size = int(att_feat.attribute(schema.size_idx))
+                    except Exception:
+                        size = None
+                content_type = att_feat.attribute(schema.type_idx) if schema.type_idx >= 0 else None
+                buffer = AttachmentBuffer.from_blob(att_feat.attribute(schema.data_idx))
+                writer.submit(
+                    key, fid, name or f"attachment_{fid}", buffer, size,
+                    str(content_type) if content_type else None
+                )
+
+        writer.close()
+    except BaseException:
+        # lỗi provider/ghi tệp: dừng thread ghi và đóng manifest trước khi báo lỗi
+        writer.cancel()
+        raise
+    if set_progress is not None:
+        set_progress(100)
+    return writer, True
+
+
+def parent_keys(source, schema, feature_ids=None, is_canceled=None):
+    """dict {khóa chuẩn hóa: giá trị gốc} của feature cha (chỉ đọc trường khóa)."""
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([schema.key_idx])
+    if feature_ids is not None:
+        request.setFilterFids(list(feature_ids))
+    keys = {}
+    for feat in source.getFeatures(request):
+        if is_canceled is not None and is_canceled():
+            break
+        value = feat.attribute(schema.key_idx)
+        key = normalize_key(value)
+        if key is not None:
+            keys[key] = value
+    return keys
+
+
+class ExportAttachmentsTask(QgsTask):
+    """
+    feature_ids: list fid của layer chính (đối tượng đang chọn), None = toàn bộ lớp.
+    Sau khi xong: self.writer chứa số tệp đã ghi/bỏ qua/lỗi.
+    """
+
+    def __init__(self, layer, attach_layer, schema, out_dir, feature_ids=None, index=None,
+                 workers=4, resume=True, callback=None):
+        super().__init__(f"ArcGIS Attachments: export {layer.name()}", QgsTask.CanCancel)
+        self.layer = layer
+        self.out_dir = out_dir
+        self.writer = None
+        self.error = None
+        self._schema = schema
+        self._feature_ids = list(feature_ids) if feature_ids is not None else None
+        self._index = index
+        self._workers = workers
+        self._resume = resume
+        self._callback = callback
+        self._source = QgsVectorLayerFeatureSource(layer)
+        self._attach_source = QgsVectorLayerFeatureSource(attach_layer)
+        self._attach_total = max(1, attach_layer.featureCount())
+
+    def run(self):
+        try:
+            self.writer, completed = export_layer_attachments(
+                self._source, self._attach_source, self._schema, self.out_dir,
+                feature_ids=self._feature_ids, index=self._index, workers=self._workers,
+                resume=self._resume, is_canceled=self.isCanceled, set_progress=self.setProgress,
+                attach_total=self._attach_total
+            )
+            return completed
+        except Exception as e:
+            self.error = e
+            return False
+
+    def finished(self, result):
+        if self._callback:
+            self._callback(self, result)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+export_writer.py - ghi hàng loạt attachment ra thư mục
+- Mỗi feature cha một thư mục (theo GlobalID/OBJECTID), tệp "<fid>_<tên>"
+- Ghi đĩa bằng thread pool, giới hạn số BLOB đang chờ (bộ nhớ có giới hạn)
+- manifest.csv ghi dần (làm nhật ký để chạy tiếp), manifest.json khi kết thúc
+- Không phụ thuộc Qt/QGIS
+"""
+
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .attachment_io import safe_filename
+
+MANIFEST_FIELDS = ["parent_key", "attachment_id", "name", "size", "content_type", "path"]
+
+
+def attachment_filename(fid, name):
+    """Tên tệp duy nhất trong thư mục feature cha (fid làm tiền tố)."""
+    return f"{fid}_{safe_filename(name, f'attachment_{fid}')}"
+
+
+class ExportWriter:
+    """
+    Dùng:
+        writer = ExportWriter(out_dir, workers=4, resume=True)
+        for ...:
+            if writer.is_done(parent_key, fid): continue
+            writer.submit(parent_key, fid, name, buffer, size, content_type)
+        writer.close()
+    """
+
+    def __init__(self, out_dir, workers=4, resume=True, max_pending=None):
+        self.out_dir = out_dir
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.errors = []
+        os.makedirs(out_dir, exist_ok=True)
+        self._manifest_csv = os.path.join(out_dir, "manifest.csv")
+        self._done = set()
+        if resume:
+            self._done = self._read_done()
+        else:
+            for path in (self._manifest_csv, os.path.join(out_dir, "manifest.json")):
+                if os.path.exists(path):
+                    os.remove(path)
+        new_file = not os.path.exists(self._manifest_csv)
+        self._csv_file = open(self._manifest_csv, "a", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=MANIFEST_FIELDS)
+        if new_file:
+            self._csv.writeheader()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        # số BLOB đang chờ ghi tối đa -> bộ nhớ không tăng theo kích thước lớp
+        self._pending = threading.BoundedSemaphore(max_pending or max(2, workers * 2))
+        self._folders = set()
+
+    def is_done(self, parent_key, fid):
+        """Attachment đã được ghi ở lần chạy trước (theo manifest.csv)."""
+        return (str(parent_key), str(fid)) in self._done
+
+    def done_count(self):
+        return len(self._done)
+
+    def submit(self, parent_key, fid, name, buffer, size=None, content_type=None):
+        """Đưa một attachment vào hàng đợi ghi (chặn nếu đã đủ max_pending)."""
+        if buffer is None:
+            self.skipped += 1
+            return
+        folder = os.path.join(self.out_dir, safe_filename(parent_key, "unknown"))
+        if folder not in self._folders:
+            os.makedirs(folder, exist_ok=True)
+            self._folders.add(folder)
+        path = os.path.join(folder, attachment_filename(fid, name))
+        row = {
+            "parent_key": str(parent_key),
+            "attachment_id": str(fid),
+            "name": str(name),
+            "size": size if size is not None else len(buffer),
+            "content_type": content_type or "",
+            "path": os.path.relpath(path, self.out_dir).replace(os.sep, "/"),
+        }
+        self._pending.acquire()
+        try:
+            self._pool.submit(self._write, path, buffer, row)
+        except Exception:
+            self._pending.release()
+            raise
+
+    def close(self, write_json=True):
+        """Chờ ghi xong, đóng manifest.csv và tạo manifest.json."""
+        self._pool.shutdown(wait=True)
+        self._csv_file.close()
+        if write_json:
+            # chạy tiếp nhiều lần có thể ghi lại cùng attachment -> giữ dòng cuối
+            rows = {}
+            with open(self._manifest_csv, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    rows[(row.get("parent_key"), row.get("attachment_id"))] = row
+            rows = list(rows.values())
+            with open(os.path.join(self.out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False, indent=1)
+
+    def cancel(self):
+        """Dừng: bỏ các tác vụ ghi chưa bắt đầu, giữ manifest để chạy tiếp lần sau."""
+        try:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        except TypeError:
+            # Python < 3.9
+            self._pool.shutdown(wait=True)
+        self._csv_file.close()
+
+    # ---------------- internal ----------------
+    def _write(self, path, buffer, row):
+        try:
+            tmp_path = path + ".part"
+            written = buffer.write_to(tmp_path)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._csv.writerow(row)
+                self._csv_file.flush()
+                self.written += 1
+                self.bytes_written += written
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                if len(self.errors) < 100:
+                    self.errors.append(f"{path}: {e}")
+        finally:
+            buffer.release()
+            self._pending.release()
+
+    def _read_done(self):
+        done = set()
+        if not os.path.exists(self._manifest_csv):
+            return done
+        try:
+            with open(self._manifest_csv, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    path = os.path.join(self.out_dir, row.get("path", ""))
+                    # chỉ tính là xong nếu tệp còn trên đĩa
+                    if os.path.isfile(path):
+                        done.add((row.get("parent_key"), row.get("attachment_id")))
+        except (OSError, csv.Error):
+            pass
+        return done
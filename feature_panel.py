@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+feature_panel.py - nội dung dock được dựng một lần, cập nhật tại chỗ mỗi click
+- FeatureAttributesModel: bảng thuộc tính (QAbstractTableModel), giá trị định dạng lười
+- FeaturePanel: thumbnail / nút PDF / lưới attachment (gallery) / bảng thuộc tính
+- DockPanel: QStackedWidget gồm trang thông báo (đang tải...), trang feature
+  và trang kết quả nhiều lớp; chuyển trang thay vì tạo lại widget
+"""
+
+import qgis.PyQt
+from qgis.PyQt.QtCore import QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+from qgis.PyQt.QtGui import QColor, QPixmap
+from qgis.PyQt.QtWidgets import (
+    QGroupBox, QLabel, QProgressBar, QPushButton, QStackedWidget, QTableView, QVBoxLayout, QWidget
+)
+
+from .gallery import AttachmentGallery
+from .attachment_stats import format_size
+
+QT_VERSION = int(qgis.PyQt.QtCore.QT_VERSION_STR.split('.')[0])
+if QT_VERSION >= 6:
+    from qgis.PyQt.QtCore import Qt
+    from qgis.PyQt.QtGui import QPalette
+    from qgis.PyQt.QtWidgets import QSizePolicy
+    DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+    TOOLTIP_ROLE = Qt.ItemDataRole.ToolTipRole
+    TEXT_ALIGNMENT_ROLE = Qt.ItemDataRole.TextAlignmentRole
+    HORIZONTAL = Qt.Orientation.Horizontal
+    ALIGN_LEFT = Qt.AlignmentFlag.AlignLeft
+    ALIGN_CENTER = Qt.AlignmentFlag.AlignCenter
+    ALIGN_VCENTER = Qt.AlignmentFlag.AlignVCenter
+    ITEM_IS_ENABLED = Qt.ItemFlag.ItemIsEnabled
+    ITEM_IS_SELECTABLE = Qt.ItemFlag.ItemIsSelectable
+    POINTING_HAND_CURSOR = Qt.CursorShape.PointingHandCursor
+    PALETTE_BASE = QPalette.ColorRole.Base
+    PALETTE_ALTERNATE_BASE = QPalette.ColorRole.AlternateBase
+    SIZE_EXPANDING = QSizePolicy.Policy.Expanding
+    SIZE_FIXED = QSizePolicy.Policy.Fixed
+    NO_EDIT_TRIGGERS = QTableView.EditTrigger.NoEditTriggers
+    SINGLE_SELECTION = QTableView.SelectionMode.SingleSelection
+else:
+    from qgis.PyQt.QtCore import Qt
+    from qgis.PyQt.QtGui import QPalette
+    from qgis.PyQt.QtWidgets import QSizePolicy
+    DISPLAY_ROLE = Qt.DisplayRole
+    TOOLTIP_ROLE = Qt.ToolTipRole
+    TEXT_ALIGNMENT_ROLE = Qt.TextAlignmentRole
+    HORIZONTAL = Qt.Horizontal
+    ALIGN_LEFT = Qt.AlignLeft
+    ALIGN_CENTER = Qt.AlignCenter
+    ALIGN_VCENTER = Qt.AlignVCenter
+    ITEM_IS_ENABLED = Qt.ItemIsEnabled
+    ITEM_IS_SELECTABLE = Qt.ItemIsSelectable
+    POINTING_HAND_CURSOR = Qt.PointingHandCursor
+    PALETTE_BASE = QPalette.Base
+    PALETTE_ALTERNATE_BASE = QPalette.AlternateBase
+    SIZE_EXPANDING = QSizePolicy.Expanding
+    SIZE_FIXED = QSizePolicy.Fixed
+    NO_EDIT_TRIGGERS = QTableView.NoEditTriggers
+    SINGLE_SELECTION = QTableView.SingleSelection
+
+NULL_TEXT = "<Null>"
+
+GROUP_STYLE = """
+    QGroupBox {
+        font-weight: bold;
+        border: 2px solid #4a90e2;
+        border-radius: 8px;
+        margin-top: 10px;
+        background-color: #f9f9f9;
+    }
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        subcontrol-position: top left;
+        padding: 0 5px;
+        color: #4a90e2;
+    }
+"""
+
+# stylesheet thống nhất cho mọi nền tảng và phiên bản Qt
+TABLE_STYLE = """
+    QTableView {
+        background-color: #ffffff;
+        alternate-background-color: #f7faff;
+        gridline-color: #e0e0e0;
+        font-size: 13px;
+        border: 1px solid #d0d0d0;
+        selection-background-color: #e0e9ff;
+        selection-color: black;
+    }
+    QTableView::item {
+        border-bottom: 1px solid #e0e0e0;
+        padding: 2px;
+        color: black;
+    }
+    QTableView::item:alternate {
+        background-color: #f7faff;
+    }
+    QHeaderView::section {
+        background-color: #f0f0f0;
+        color: black;
+        font-weight: bold;
+        padding: 4px;
+        border: 1px solid #ccc;
+    }
+    QHeaderView {
+        background-color: #f0f0f0;
+    }
+    QTableView::item:selected {
+        background-color: #e0e9ff;
+        color: black;
+    }
+"""
+
+
+class FeatureAttributesModel(QAbstractTableModel):
+    """
+    Hai cột Field / Value cho một feature. set_feature() chỉ thay dữ liệu
+    (beginResetModel/endResetModel); chuỗi giá trị được định dạng khi view cần.
+    """
+
+    HEADERS = ("Field", "Value")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._names = []
+        self._feature = None
+        self._values = []
+
+    def set_feature(self, layer, feature):
+        self.beginResetModel()
+        if layer is not None and feature is not None:
+            self._names = [field.alias() or field.name() for field in layer.fields()]
+        else:
+            self._names = []
+        self._feature = feature
+        # None = chưa định dạng
+        self._values = [None] * len(self._names)
+        self.endResetModel()
+
+    def clear(self):
+        self.set_feature(None, None)
+
+    def value_text(self, row):
+        text = self._values[row]
+        if text is None:
+            try:
+                value = self._feature.attribute(row)
+            except Exception:
+                value = None
+            if value in (None, ""):
+                text = NULL_TEXT
+            else:
+                text = str(value)
+            self._values[row] = text
+        return text
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def data(self, index, role=DISPLAY_ROLE):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role in (DISPLAY_ROLE, TOOLTIP_ROLE):
+            if index.column() == 0:
+                return self._names[row]
+            return self.value_text(row)
+        if role == TEXT_ALIGNMENT_ROLE:
+            return int(ALIGN_LEFT | ALIGN_VCENTER)
+        return None
+
+    def flags(self, index):
+        if index.column() == 1:
+            return ITEM_IS_ENABLED | ITEM_IS_SELECTABLE
+        return ITEM_IS_ENABLED
+
+    def headerData(self, section, orientation, role=DISPLAY_ROLE):
+        if orientation == HORIZONTAL and role == DISPLAY_ROLE:
+            return self.HEADERS[section]
+        return None
+
+
+class AttributesView(QTableView):
+    """
+    QTableView chỉ tính chiều cao (word wrap) cho các dòng đang hiển thị,
+    thay cho resizeRowsToContents() trên toàn bộ trường.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._sized = set()
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.timeout.connect(self._resize_visible_rows)
+        self.verticalScrollBar().valueChanged.connect(self._schedule_resize)
+        self.horizontalHeader().sectionResized.connect(self._on_column_resized)
+
+    def setModel(self, model):
+        super().setModel(model)
+        model.modelReset.connect(self._on_column_resized)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._schedule_resize()
+
+    def _schedule_resize(self, *args):
+        self._resize_timer.start(0)
+
+    def _on_column_resized(self, *args):
+        # độ rộng cột đổi -> chiều cao dòng wrap phải tính lại
+        self._sized = set()
+        self._schedule_resize()
+
+    def _resize_visible_rows(self):
+        model = self.model()
+        if model is None:
+            return
+        count = model.rowCount()
+        row = self.rowAt(0)
+        if row < 0:
+            row = 0
+        height = self.viewport().height()
+        while row < count and self.rowViewportPosition(row) < height:
+            if row not in self._sized:
+                self._sized.add(row)
+                self.resizeRowToContents(row)
+            row += 1
+
+
+class FeaturePanel(QWidget):
+    """
+    Trang chi tiết một feature. Tín hiệu: thumbnailClicked, pdfClicked,
+    attachmentActivated(metadata) khi mở một ô trong gallery.
+    """
+
+    thumbnailClicked = pyqtSignal()
+    pdfClicked = pyqtSignal()
+    attachmentActivated = pyqtSignal(object)
+
+    def __init__(self, image_cache=None, disk_cache=None, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        # --- Thumbnail area (if first attachment is image) ---
+        self.thumb_label = QLabel()
+        self.thumb_label.setAlignment(ALIGN_CENTER)
+        self.thumb_label.setSizePolicy(SIZE_EXPANDING, SIZE_FIXED)
+        self.thumb_label.setCursor(POINTING_HAND_CURSOR)
+        self.thumb_label.setMinimumHeight(200)
+        self.thumb_label.mousePressEvent = lambda e: self.thumbnailClicked.emit()
+        layout.addWidget(self.thumb_label)
+
+        self.pdf_button = QPushButton()
+        self.pdf_button.clicked.connect(self.pdfClicked.emit)
+        layout.addWidget(self.pdf_button)
+
+        # --- Files (gallery ảo hóa, thumbnail chỉ cho ô đang hiển thị) ---
+        self.files_label = QLabel()
+        self.files_label.setWordWrap(True)
+        layout.addWidget(self.files_label)
+        self.gallery = AttachmentGallery(image_cache, disk_cache)
+        self.gallery.attachmentActivated.connect(self.attachmentActivated.emit)
+        layout.addWidget(self.gallery)
+
+        # --- Attribute table ---
+        info_group = QGroupBox("Infomation")
+        info_group.setStyleSheet(GROUP_STYLE)
+        info_group.setMinimumHeight(200)
+
+        self.model = FeatureAttributesModel(self)
+        self.table = AttributesView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setDefaultAlignment(ALIGN_LEFT | ALIGN_VCENTER)
+        self.table.setAlternatingRowColors(True)
+        pal = self.table.palette()
+        pal.setColor(PALETTE_BASE, QColor("#ffffff"))
+        pal.setColor(PALETTE_ALTERNATE_BASE, QColor("#f7faff"))
+        self.table.setPalette(pal)
+        self.table.setStyleSheet(TABLE_STYLE)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(NO_EDIT_TRIGGERS)
+        self.table.setSelectionMode(SINGLE_SELECTION)
+        self.table.setWordWrap(True)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().setDefaultSectionSize(180)
+
+        layout_info = QVBoxLayout(info_group)
+        layout_info.addWidget(self.table)
+        layout.addWidget(info_group, 1)
+
+        self.clear()
+
+    def clear(self):
+        self.clear_preview()
+        self.files_label.hide()
+        self.gallery.clear()
+        self.gallery.hide()
+        self.model.clear()
+
+    def clear_preview(self):
+        self.thumb_label.clear()
+        self.thumb_label.hide()
+        self.pdf_button.hide()
+
+    def set_feature(self, layer, feature):
+        self.model.set_feature(layer, feature)
+        self.table.scrollToTop()
+
+    def show_thumbnail(self, image=None, text=None):
+        """image: QImage đã thu nhỏ; text: thông báo khi chưa có ảnh."""
+        self.pdf_button.hide()
+        if image is not None:
+            self.thumb_label.setPixmap(QPixmap.fromImage(image))
+        else:
+            self.thumb_label.clear()
+            self.thumb_label.setText(text or "")
+        self.thumb_label.show()
+
+    def show_pdf_button(self, name):
+        self.thumb_label.hide()
+        self.pdf_button.setText(f"Mở PDF: {name}")
+        self.pdf_button.show()
+
+    def set_attachments(self, attachments, attach_layer=None, data_idx=-1):
+        """Gallery các attachment (metadata); attach_layer/data_idx để đọc BLOB thumbnail."""
+        if not attachments:
+            self.files_label.hide()
+            self.gallery.clear()
+            self.gallery.hide()
+            return
+        total = sum(att.get("size") or 0 for att in attachments)
+        text = f"<b>Files attachment:</b> {len(attachments)}"
+        if total:
+            text += f" ({format_size(total)})"
+        self.files_label.setText(text)
+        self.files_label.show()
+        self.gallery.show()
+        self.gallery.set_attachments(attachments, attach_layer, data_idx)
+
+
+class DockPanel(QStackedWidget):
+    """Nội dung cố định của dock: trang thông báo, trang feature, trang kết quả nhiều lớp."""
+
+    def __init__(self, image_cache=None, disk_cache=None, parent=None):
+        super().__init__(parent)
+        self.message_page = QWidget()
+        ph_layout = QVBoxLayout(self.message_page)
+        self.message_label = QLabel()
+        self.message_label.setAlignment(ALIGN_CENTER)
+        self.message_label.setStyleSheet("color: gray; font-style: italic;")
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        ph_layout.addStretch()
+        ph_layout.addWidget(self.message_label)
+        ph_layout.addWidget(self.progress_bar)
+        ph_layout.addStretch()
+        self.addWidget(self.message_page)
+
+        self.feature_page = FeaturePanel(image_cache, disk_cache)
+        self.addWidget(self.feature_page)
+
+        # trang kết quả nhiều lớp: widget thay mới mỗi lần (cây phụ thuộc số lớp)
+        self._results_page = None
+
+    def show_message(self, text, progress=False):
+        """Trang thông báo; progress=True hiện thanh tiến độ (trả về thanh đó)."""
+        self.message_label.setText(text)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(progress)
+        self.feature_page.clear()
+        self._drop_results_page()
+        self.setCurrentWidget(self.message_page)
+        return self.progress_bar if progress else None
+
+    def show_feature_page(self):
+        self._drop_results_page()
+        self.setCurrentWidget(self.feature_page)
+        return self.feature_page
+
+    def show_results_page(self, widget):
+        self._drop_results_page()
+        self.feature_page.clear()
+        self._results_page = widget
+        self.addWidget(widget)
+        self.setCurrentWidget(widget)
+
+    def _drop_results_page(self):
+        page = self._results_page
+        self._results_page = None
+        if page is not None:
+            self.removeWidget(page)
+            try:
+                page.deleteLater()
+            except Exception:
+                pass
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+gallery.py - lưới thumbnail attachment cho feature có rất nhiều tệp
+- QListView (IconMode) + model lười: chỉ ô nào được vẽ mới yêu cầu thumbnail
+- Giải mã bằng ThumbnailTask trên thread pool của QgsTaskManager, tối đa
+  GALLERY_MAX_INFLIGHT task cùng lúc; ô cuộn khỏi màn hình thì hủy/bỏ khỏi hàng đợi
+- QPixmap giữ trong ByteLRUCache riêng; QImage dùng chung cache thumbnail
+  (RAM + đĩa) của plugin -> bộ nhớ có giới hạn dù feature có bao nhiêu attachment
+"""
+
+import os
+
+import qgis.PyQt
+from qgis.PyQt.QtCore import QAbstractListModel, QFileInfo, QModelIndex, QSize, QTimer, pyqtSignal
+from qgis.PyQt.QtGui import QIcon, QPixmap
+from qgis.PyQt.QtWidgets import QFileIconProvider, QListView
+from qgis.core import QgsApplication, QgsVectorLayerFeatureSource
+
+from .attachment_cache import ByteLRUCache
+from .thumbnails import IMAGE_EXTENSIONS, ThumbnailTask, image_cache_key, pixmap_nbytes
+from .attachment_stats import format_size
+
+QT_VERSION = int(qgis.PyQt.QtCore.QT_VERSION_STR.split('.')[0])
+if QT_VERSION >= 6:
+    from qgis.PyQt.QtCore import Qt
+    DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+    DECORATION_ROLE = Qt.ItemDataRole.DecorationRole
+    TOOLTIP_ROLE = Qt.ItemDataRole.ToolTipRole
+    ICON_MODE = QListView.ViewMode.IconMode
+    RESIZE_ADJUST = QListView.ResizeMode.Adjust
+    MOVEMENT_STATIC = QListView.Movement.Static
+    SCROLL_PER_PIXEL = QListView.ScrollMode.ScrollPerPixel
+    ELIDE_MIDDLE = Qt.TextElideMode.ElideMiddle
+else:
+    from qgis.PyQt.QtCore import Qt
+    DISPLAY_ROLE = Qt.DisplayRole
+    DECORATION_ROLE = Qt.DecorationRole
+    TOOLTIP_ROLE = Qt.ToolTipRole
+    ICON_MODE = QListView.IconMode
+    RESIZE_ADJUST = QListView.Adjust
+    MOVEMENT_STATIC = QListView.Static
+    SCROLL_PER_PIXEL = QListView.ScrollPerPixel
+    ELIDE_MIDDLE = Qt.ElideMiddle
+
+# kích thước thumbnail trong lưới (px)
+GALLERY_THUMB_WIDTH = 128
+
+# số task giải mã chạy cùng lúc
+GALLERY_MAX_INFLIGHT = 4
+
+# ngân sách QPixmap đã chuyển đổi cho các ô
+GALLERY_PIXMAP_CACHE_MB = 16
+
+# giữ thêm bao nhiêu ô ngoài vùng nhìn thấy (trên/dưới) khi dọn hàng đợi
+GALLERY_MARGIN_ROWS = 20
+
+
+class AttachmentGalleryModel(QAbstractListModel):
+    """
+    Danh sách metadata attachment của một feature. Thumbnail được yêu cầu
+    khi view hỏi DecorationRole (tức là ô đang được vẽ).
+    """
+
+    def __init__(self, image_cache=None, disk_cache=None, parent=None):
+        super().__init__(parent)
+        self._image_cache = image_cache
+        self._disk_cache = disk_cache
+        self._pixmaps = ByteLRUCache(GALLERY_PIXMAP_CACHE_MB * 1024 * 1024, sizeof=pixmap_nbytes)
+        self._attachments = []
+        self._source = None
+        self._uri = None
+        self._data_idx = -1
+        # hàng đợi row chờ giải mã, task đang chạy {row: task}, row lỗi
+        self._queue = []
+        self._inflight = {}
+        self._failed = set()
+        self._icons = {}
+        self._placeholder = None
+        self._icon_provider = QFileIconProvider()
+
+    def set_attachments(self, attachments, attach_layer=None, data_idx=-1):
+        self.cancel()
+        self.beginResetModel()
+        self._attachments = list(attachments or [])
+        self._source = None
+        self._uri = None
+        self._data_idx = data_idx
+        if attach_layer is not None and data_idx >= 0:
+            # feature source phải tạo trên main thread
+            self._source = QgsVectorLayerFeatureSource(attach_layer)
+            self._uri = attach_layer.source()
+        self._failed = set()
+        self._pixmaps.clear()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_attachments([])
+
+    def cancel(self):
+        """Hủy mọi yêu cầu thumbnail (đổi feature, đóng dock)."""
+        self._queue = []
+        inflight = self._inflight
+        self._inflight = {}
+        for task in inflight.values():
+            try:
+                task.cancel()
+            except Exception:
+                pass
+
+    def attachment(self, row):
+        if 0 <= row < len(self._attachments):
+            return self._attachments[row]
+        return None
+
+    def set_visible_rows(self, first, last):
+        """Bỏ các yêu cầu của ô đã cuộn khỏi màn hình (giữ biên GALLERY_MARGIN_ROWS)."""
+        low = first - GALLERY_MARGIN_ROWS
+        high = last + GALLERY_MARGIN_ROWS
+        self._queue = [row for row in self._queue if low <= row <= high]
+        for row in [row for row in self._inflight if not low <= row <= high]:
+            task = self._inflight.pop(row)
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        self._pump()
+
+    # ---------------- Qt model ----------------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._attachments)
+
+    def data(self, index, role=DISPLAY_ROLE):
+        if not index.isValid():
+            return None
+        att = self._attachments[index.row()]
+        if role == DISPLAY_ROLE:
+            return att.get("ATT_NAME", "")
+        if role == TOOLTIP_ROLE:
+            size = att.get("size")
+            parts = [att.get("ATT_NAME", "")]
+            if size:
+                parts.append(format_size(size))
+            if att.get("content_type"):
+                parts.append(att["content_type"])
+            return "\n".join(parts)
+        if role == DECORATION_ROLE:
+            return self._decoration(index.row(), att)
+        return None
+
+    # ---------------- internal ----------------
+    def _is_image(self, att):
+        return os.path.splitext(att.get("ATT_NAME", ""))[1].lower() in IMAGE_EXTENSIONS
+
+    def _file_icon(self, name):
+        ext = os.path.splitext(name)[1].lower()
+        icon = self._icons.get(ext)
+        if icon is None:
+            icon = self._icon_provider.icon(QFileInfo(name or "file"))
+            self._icons[ext] = icon
+        return icon
+
+    def _decoration(self, row, att):
+        if not self._is_image(att) or self._source is None or row in self._failed:
+            return self._file_icon(att.get("ATT_NAME", ""))
+        key = image_cache_key(self._uri, att["fid"], GALLERY_THUMB_WIDTH)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is None and self._image_cache is not None:
+            image = self._image_cache.get(key)
+            if image is not None:
+                pixmap = QPixmap.fromImage(image)
+                self._pixmaps.put(key, pixmap)
+        if pixmap is not None:
+            return pixmap
+        self._request(row)
+        if self._placeholder is None:
+            self._placeholder = QgsApplication.getThemeIcon("/mIconRaster.svg")
+            if self._placeholder.isNull():
+                self._placeholder = QIcon()
+        return self._placeholder
+
+    def _request(self, row):
+        if row in self._inflight or row in self._queue:
+            return
+        # ô vừa vẽ gần đây nhất được giải mã trước
+        self._queue.append(row)
+        self._pump()
+
+    def _pump(self):
+        while self._queue and len(self._inflight) < GALLERY_MAX_INFLIGHT:
+            row = self._queue.pop()
+            att = self._attachments[row]
+            key = image_cache_key(self._uri, att["fid"], GALLERY_THUMB_WIDTH)
+            task = ThumbnailTask(self._source, self._data_idx, att["fid"], GALLERY_THUMB_WIDTH,
+                                 callback=lambda task, result, row=row: self._on_done(row, task, result),
+                                 cache=self._image_cache, cache_key=key, disk_cache=self._disk_cache)
+            self._inflight[row] = task
+            QgsApplication.taskManager().addTask(task)
+
+    def _on_done(self, row, task, result):
+        if self._inflight.get(row) is not task:
+            # đã hủy hoặc model đã đổi feature
+            return
+        del self._inflight[row]
+        if result and task.image is not None:
+            att = self._attachments[row]
+            self._pixmaps.put(image_cache_key(self._uri, att["fid"], GALLERY_THUMB_WIDTH),
+                              QPixmap.fromImage(task.image))
+        elif not task.isCanceled():
+            self._failed.add(row)
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [DECORATION_ROLE])
+        self._pump()
+
+
+class AttachmentGallery(QListView):
+    """Lưới icon ảo hóa; attachmentActivated(metadata) khi double-click / Enter."""
+
+    attachmentActivated = pyqtSignal(object)
+
+    def __init__(self, image_cache=None, disk_cache=None, parent=None):
+        super().__init__(parent)
+        self.gallery_model = AttachmentGalleryModel(image_cache, disk_cache, self)
+        self.setModel(self.gallery_model)
+        self.setViewMode(ICON_MODE)
+        self.setResizeMode(RESIZE_ADJUST)
+        self.setMovement(MOVEMENT_STATIC)
+        self.setUniformItemSizes(True)
+        self.setWrapping(True)
+        self.setWordWrap(False)
+        self.setTextElideMode(ELIDE_MIDDLE)
+        self.setVerticalScrollMode(SCROLL_PER_PIXEL)
+        self.setIconSize(QSize(GALLERY_THUMB_WIDTH, GALLERY_THUMB_WIDTH * 3 // 4))
+        self.setGridSize(QSize(GALLERY_THUMB_WIDTH + 16, GALLERY_THUMB_WIDTH * 3 // 4 + 28))
+        self.setSpacing(4)
+        self.activated.connect(self._on_activated)
+
+        self._visible_timer = QTimer(self)
+        self._visible_timer.setSingleShot(True)
+        self._visible_timer.timeout.connect(self._update_visible)
+        self.verticalScrollBar().valueChanged.connect(lambda value: self._visible_timer.start(50))
+
+    def set_attachments(self, attachments, attach_layer=None, data_idx=-1):
+        self.gallery_model.set_attachments(attachments, attach_layer, data_idx)
+        self.scrollToTop()
+        # vừa một hàng nếu ít tệp, tối đa khoảng hai hàng rưỡi
+        grid = self.gridSize()
+        per_line = max(1, self.viewport().width() // max(1, grid.width()))
+        lines = min(2.5, max(1, -(-len(attachments or []) // per_line)))
+        self.setFixedHeight(int(lines * grid.height()) + 2 * self.frameWidth() + 8)
+
+    def clear(self):
+        self.gallery_model.clear()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._visible_timer.start(50)
+
+    def _update_visible(self):
+        grid = self.gridSize()
+        per_line = max(1, self.viewport().width() // max(1, grid.width()))
+        first_line = self.verticalScrollBar().value() // max(1, grid.height())
+        lines = self.viewport().height() // max(1, grid.height()) + 2
+        self.gallery_model.set_visible_rows(first_line * per_line, (first_line + lines) * per_line - 1)
+
+    def _on_activated(self, index):
+        att = self.gallery_model.attachment(index.row())
+        if att is not None:
+            self.attachmentActivated.emit(att)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+identify_task.py - identify chạy nền (QgsTask)
+- Tìm feature gần điểm click nhất (chỉ mục không gian nếu sẵn sàng), truy vấn metadata attachment, giải mã thumbnail
+- LayerIdentifyTask: mọi feature trong vùng click / hình chữ nhật / polygon của
+  một layer + số attachment (identify tất cả lớp hoặc chọn theo vùng; mỗi layer
+  một task chạy song song)
+- AttachmentListTask: metadata attachment của một feature (mở nút cây kết quả,
+  hiển thị chi tiết feature từ identify nhiều lớp)
+- Chỉ dùng QgsVectorLayerFeatureSource (tạo trên main thread) trong run()
+- Kết quả được trả về main thread qua finished()
+"""
+
+import os
+
+from qgis.core import QgsFeatureRequest, QgsGeometry, QgsTask, QgsVectorLayerFeatureSource
+
+from .attachment_query import aggregate_attachments, feature_keys, query_attachments_cached, read_attachment_buffer
+from .latency import ClickTrace
+from .thumbnails import IMAGE_EXTENSIONS, THUMBNAIL_WIDTH, image_cache_key, load_thumbnail
+
+
+class IdentifyTask(QgsTask):
+    """
+    Identify một layer tại hình chữ nhật tìm kiếm (tọa độ layer): feature gần tâm
+    rect nhất, trong bán kính nửa cạnh rect. locator (spatial_locator.LayerLocator)
+    nếu đã sẵn sàng thì không cần quét provider theo rect.
+    Sau khi xong: self.feature (hoặc None), self.attachments (list metadata);
+    attachment đầu tiên là ảnh thì có thêm "thumbnail" (QImage đã thu nhỏ).
+    """
+
+    def __init__(self, layer, rect, attach_layer=None, schema=None, index=None, callback=None,
+                 image_cache=None, disk_cache=None, trace=None, metadata_cache=None, locator=None):
+        super().__init__(f"ArcGIS Attachments: identify {layer.name()}", QgsTask.CanCancel)
+        self.layer = layer
+        self.rect = rect
+        self.feature = None
+        self.attachments = []
+        self.error = None
+        self._callback = callback
+        self._schema = schema
+        self._index = index
+        # feature source phải tạo trên main thread
+        self._source = QgsVectorLayerFeatureSource(layer)
+        self._attach_source = QgsVectorLayerFeatureSource(attach_layer) if attach_layer else None
+        self._attach_layer_id = attach_layer.id() if attach_layer else None
+        self._attach_uri = attach_layer.source() if attach_layer else None
+        self._image_cache = image_cache
+        self._disk_cache = disk_cache
+        self._metadata_cache = metadata_cache
+        self._locator = locator
+        # thời gian từng bước (latency.ClickTrace)
+        self.trace = trace if trace is not None else ClickTrace()
+        self.trace.stamp()
+
+    def run(self):
+        self.trace.since_stamp("queue")
+        try:
+            with self.trace.profile():
+                return self._run()
+        except Exception as e:
+            self.error = e
+            return False
+
+    def _run(self):
+        trace = self.trace
+        with trace.span("feature"):
+            self.feature = self._nearest_feature()
+        if self.isCanceled():
+            return False
+        self.setProgress(30)
+        if self.feature is None or self._attach_source is None or self._schema is None:
+            self.setProgress(100)
+            return True
+
+        with trace.span("query"):
+            keys = feature_keys([self.feature], self._schema)
+            results = query_attachments_cached(
+                self._attach_source, self._schema, keys, self._index,
+                layer_id=self._attach_layer_id, cache=self._metadata_cache, is_canceled=self.isCanceled
+            )
+        if self.isCanceled():
+            return False
+        self.attachments = next(iter(results.values()), [])
+        self.setProgress(70)
+
+        # giải mã thumbnail ảnh đầu tiên ngay ở thread nền; không giữ BLOB gốc
+        if self.attachments:
+            first = self.attachments[0]
+            ext = os.path.splitext(first["ATT_NAME"])[1].lower()
+            if ext in IMAGE_EXTENSIONS:
+                first["thumbnail"] = load_thumbnail(
+                    lambda: read_attachment_buffer(self._attach_source, self._schema.data_idx, first["fid"]),
+                    THUMBNAIL_WIDTH, self._image_cache,
+                    image_cache_key(self._attach_uri, first["fid"], THUMBNAIL_WIDTH),
+                    self._disk_cache, trace
+                )
+                if self.isCanceled():
+                    return False
+        self.setProgress(100)
+        return not self.isCanceled()
+
+    def _nearest_feature(self):
+        center = self.rect.center()
+        tolerance = max(self.rect.width(), self.rect.height()) / 2.0
+        locator = self._locator
+        if locator is not None and locator.ready:
+            fid = locator.nearest(center, tolerance)
+            if fid is None:
+                return None
+            for feat in self._source.getFeatures(QgsFeatureRequest(fid)):
+                return feat
+            return None
+
+        # chưa có chỉ mục: lọc theo rect ở provider, chọn feature gần tâm nhất
+        point = QgsGeometry.fromPointXY(center)
+        best = None
+        best_distance = None
+        for feat in self._source.getFeatures(QgsFeatureRequest().setFilterRect(self.rect)):
+            if self.isCanceled():
+                return None
+            geom = feat.geometry()
+            if geom is None or geom.isEmpty():
+                continue
+            distance = geom.distance(point)
+            if best is None or distance < best_distance:
+                best = feat
+                best_distance = distance
+                if distance == 0:
+                    break
+        return best
+
+    def finished(self, result):
+        if self._callback:
+            self._callback(self, result)
+
+
+class LayerIdentifyTask(QgsTask):
+    """
+    Identify tất cả feature của một layer trong hình chữ nhật (chế độ nhiều lớp),
+    hoặc trong polygon `geometry` (chọn theo vùng; tọa độ layer).
+    Chỉ đếm attachment (một lượt GROUP BY cho mọi khóa, không BLOB); danh sách
+    attachment được truy vấn khi người dùng mở nút feature.
+    Sau khi xong: self.features (list), self.counts {khóa: [số attachment, tổng byte]}.
+    """
+
+    def __init__(self, layer, rect, attach_layer, schema, index=None, max_features=100, callback=None,
+                 geometry=None):
+        super().__init__(f"ArcGIS Attachments: identify {layer.name()}", QgsTask.CanCancel)
+        self.layer = layer
+        self.rect = rect
+        self.geometry = geometry
+        self.schema = schema
+        self.features = []
+        self.counts = {}
+        self.truncated = False
+        self.error = None
+        self._index = index
+        self._max_features = max(1, int(max_features))
+        self._callback = callback
+        # feature source phải tạo trên main thread
+        self._source = QgsVectorLayerFeatureSource(layer)
+        self._attach_source = QgsVectorLayerFeatureSource(attach_layer)
+
+    def run(self):
+        try:
+            return self._run()
+        except Exception as e:
+            self.error = e
+            return False
+
+    def _run(self):
+        request = QgsFeatureRequest().setFilterRect(self.rect)
+        request.setFlags(QgsFeatureRequest.ExactIntersect)
+        engine = None
+        if self.geometry is not None:
+            # polygon: lọc bbox ở provider, kiểm tra giao chính xác bằng geometry đã chuẩn bị
+            engine = QgsGeometry.createGeometryEngine(self.geometry.constGet())
+            engine.prepareGeometry()
+        for feat in self._source.getFeatures(request):
+            if self.isCanceled():
+                return False
+            if engine is not None and (not feat.hasGeometry() or not engine.intersects(feat.geometry().constGet())):
+                continue
+            if len(self.features) >= self._max_features:
+                self.truncated = True
+                break
+            self.features.append(feat)
+        self.setProgress(40)
+        if not self.features:
+            return True
+
+        keys = feature_keys(self.features, self.schema)
+        self.counts = aggregate_attachments(
+            self._attach_source, self.schema, keys, self._index, is_canceled=self.isCanceled
+        )
+        self.setProgress(100)
+        return not self.isCanceled()
+
+    def finished(self, result):
+        if self._callback:
+            self._callback(self, result)
+
+
+class AttachmentListTask(QgsTask):
+    """
+    Truy vấn metadata attachment của một feature (không BLOB).
+    Sau khi xong: self.attachments (list metadata).
+    """
+
+    def __init__(self, layer, feature, attach_layer, schema, index=None, metadata_cache=None, callback=None):
+        super().__init__(f"ArcGIS Attachments: attachments of {layer.name()}", QgsTask.CanCancel)
+        self.layer = layer
+        self.feature = feature
+        self.attachments = []
+        self.error = None
+        self._schema = schema
+        self._index = index
+        self._metadata_cache = metadata_cache
+        self._callback = callback
+        # feature source phải tạo trên main thread
+        self._attach_source = QgsVectorLayerFeatureSource(attach_layer)
+        self._attach_layer_id = attach_layer.id()
+
+    def run(self):
+        try:
+            keys = feature_keys([self.feature], self._schema)
+            results = query_attachments_cached(
+                self._attach_source, self._schema, keys, self._index,
+                layer_id=self._attach_layer_id, cache=self._metadata_cache, is_canceled=self.isCanceled
+            )
+            self.attachments = next(iter(results.values()), [])
+            return not self.isCanceled()
+        except Exception as e:
+            self.error = e
+            return False
+
+    def finished(self, result):
+        if self._callback:
+            self._callback(self, result)
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+image_viewer.py - trình xem ảnh gốc dạng tile nhiều mức (image pyramid)
+- Mở ngay với ảnh preview giải mã thu nhỏ (QImageReader.setScaledSize, cạnh dài
+  ~PREVIEW_WIDTH); preview được giữ trong cache ảnh của plugin cho lần mở sau
+- Các mức mịn hơn preview (1/1, 1/2, 1/4...) không giải mã cả ảnh: chỉ vùng tile
+  đang hiển thị được giải mã ở thread nền (setClipRect / setScaledSize +
+  setScaledClipRect), khi người dùng zoom vượt độ phân giải của preview
+- QGraphicsView vẽ các tile 512 px đang hiển thị của mức phù hợp với tỉ lệ zoom;
+  tile QPixmap được cache (ByteLRUCache, TILE_CACHE_MB) -> RAM của viewer chỉ là
+  preview + ngân sách tile, không phụ thuộc kích thước ảnh gốc
+- Đang zoom/pan: vẽ nhanh (không làm mượt); dừng tay thì vẽ lại mượt
+"""
+
+import math
+
+import qgis.PyQt
+from qgis.PyQt.QtCore import QBuffer, QRect, QRectF, QSize, QTimer
+from qgis.PyQt.QtGui import QImageReader, QPainter, QPixmap
+from qgis.PyQt.QtWidgets import (
+    QDialog, QGraphicsItem, QGraphicsScene, QGraphicsView, QHBoxLayout, QLabel, QPushButton,
+    QStyleOptionGraphicsItem, QVBoxLayout
+)
+from qgis.core import QgsApplication, QgsTask
+
+from .attachment_cache import ByteLRUCache
+from .thumbnails import IO_READ_ONLY, PREVIEW_WIDTH, as_qbytearray, pixmap_nbytes
+
+QT_VERSION = int(qgis.PyQt.QtCore.QT_VERSION_STR.split('.')[0])
+if QT_VERSION >= 6:
+    from qgis.PyQt.QtCore import Qt
+    KEEP_ASPECT_RATIO = Qt.AspectRatioMode.KeepAspectRatio
+    SMOOTH_PIXMAP_HINT = QPainter.RenderHint.SmoothPixmapTransform
+    ANCHOR_UNDER_MOUSE = QGraphicsView.ViewportAnchor.AnchorUnderMouse
+    SCROLL_HAND_DRAG = QGraphicsView.DragMode.ScrollHandDrag
+    USES_EXTENDED_STYLE_OPTION = QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption
+else:
+    from qgis.PyQt.QtCore import Qt
+    KEEP_ASPECT_RATIO = Qt.KeepAspectRatio
+    SMOOTH_PIXMAP_HINT = QPainter.SmoothPixmapTransform
+    ANCHOR_UNDER_MOUSE = QGraphicsView.AnchorUnderMouse
+    SCROLL_HAND_DRAG = QGraphicsView.ScrollHandDrag
+    USES_EXTENDED_STYLE_OPTION = QGraphicsItem.ItemUsesExtendedStyleOption
+
+# cạnh tile (px của mức đang vẽ)
+TILE_SIZE = 512
+
+# ngân sách cache tile QPixmap
+TILE_CACHE_MB = 96
+
+# số tile tối đa giải mã trong một lần đọc (giới hạn RAM tạm của vùng giải mã)
+DETAIL_BATCH_TILES = 16
+
+# dừng zoom/pan bao lâu (ms) thì vẽ lại mượt
+IDLE_MS = 200
+
+# hệ số zoom mỗi nấc lăn chuột và giới hạn zoom (so với ảnh gốc)
+ZOOM_STEP = 1.15
+MAX_SCALE = 20.0
+MIN_SCALE = 0.1
+
+
+def _open_reader(data):
+    """
+    (QImageReader, QBuffer hoặc None) cho data: đường dẫn tệp / buffer có .path
+    (đọc thẳng từ đĩa) hoặc dữ liệu trong RAM (AttachmentBuffer/bytes/QByteArray).
+    """
+    path = data if isinstance(data, str) else getattr(data, "path", None)
+    if path:
+        return QImageReader(path), None
+    buf = QBuffer()
+    buf.setData(as_qbytearray(data))
+    if not buf.open(IO_READ_ONLY):
+        return None, None
+    return QImageReader(buf), buf
+
+
+def read_image(data, size=None):
+    """Giải mã ảnh; size (QSize) -> giải mã thu nhỏ. None nếu không đọc được."""
+    reader, buf = _open_reader(data)
+    if reader is None:
+        return None
+    try:
+        if size is not None:
+            reader.setScaledSize(size)
+        image = reader.read()
+    finally:
+        if buf is not None:
+            buf.close()
+    return None if image.isNull() else image
+
+
+def image_size(data):
+    """Kích thước ảnh gốc (đọc header, không giải mã); QSize không hợp lệ nếu không biết."""
+    reader, buf = _open_reader(data)
+    if reader is None:
+        return QSize()
+    try:
+        return reader.size()
+    finally:
+        if buf is not None:
+            buf.close()
+
+
+def read_region(data, size, clip):
+    """
+    Giải mã riêng vùng clip (QRect theo px của ảnh thu nhỏ về `size`, hoặc px ảnh
+    gốc nếu size=None). JPEG được giải mã thu nhỏ/cắt ngay trong decoder; định dạng
+    không hỗ trợ thì Qt giải mã tạm cả ảnh rồi cắt (RAM chỉ tăng trong lúc đọc).
+    """
+    reader, buf = _open_reader(data)
+    if reader is None:
+        return None
+    try:
+        if size is None:
+            reader.setClipRect(clip)
+        else:
+            reader.setScaledSize(size)
+            reader.setScaledClipRect(clip)
+        image = reader.read()
+    finally:
+        if buf is not None:
+            buf.close()
+    return None if image.isNull() else image
+
+
+class ImagePyramid:
+    """
+    Các mức ảnh: mức k rộng width // 2^k (tọa độ scene = px ảnh gốc).
+    Mức preview_level có sẵn cả ảnh (preview); các mức mịn hơn chỉ có các tile
+    đã giải mã, nằm trong cache tile (byte-bounded) cùng tile của preview.
+    """
+
+    def __init__(self, width, height, preview_level=0, preview=None):
+        self.width = width
+        self.height = height
+        self.preview_level = preview_level
+        self.preview = preview
+        self._tiles = ByteLRUCache(TILE_CACHE_MB * 1024 * 1024, sizeof=pixmap_nbytes)
+
+    @staticmethod
+    def wanted_level(scale):
+        """Mức thô nhất vẫn đủ chi tiết cho tỉ lệ zoom `scale` (px màn hình / px ảnh gốc)."""
+        if scale <= 0 or scale >= 1:
+            return 0
+        return int(math.floor(math.log2(1.0 / scale)))
+
+    def detail_level(self, wanted, rect):
+        """
+        Mức mịn hơn preview để vẽ rect: `wanted`, hoặc thô hơn nếu tile của rect
+        không vừa nửa ngân sách cache (tránh giải mã lại tile vừa bị loại).
+        """
+        budget = TILE_CACHE_MB * 1024 * 1024 // 2
+        level = wanted
+        while level < self.preview_level:
+            count = sum(1 for _ in self.tile_grid(level, rect))
+            if count * TILE_SIZE * TILE_SIZE * 4 <= budget:
+                break
+            level += 1
+        return level
+
+    def level_size(self, level):
+        factor = 2 ** level
+        return QSize(max(1, self.width // factor), max(1, self.height // factor))
+
+    def tile_grid(self, level, rect):
+        """(tx, ty, QRect theo px của mức, QRectF đích theo tọa độ scene) giao với rect."""
+        size = self.level_size(level)
+        sx = self.width / float(size.width())
+        sy = self.height / float(size.height())
+        x0 = max(0, int(rect.left() / sx) // TILE_SIZE)
+        y0 = max(0, int(rect.top() / sy) // TILE_SIZE)
+        x1 = min((size.width() - 1) // TILE_SIZE, int(rect.right() / sx) // TILE_SIZE)
+        y1 = min((size.height() - 1) // TILE_SIZE, int(rect.bottom() / sy) // TILE_SIZE)
+        for ty in range(y0, y1 + 1):
+            for tx in range(x0, x1 + 1):
+                source = self.tile_rect(level, tx, ty, size)
+                target = QRectF(source.left() * sx, source.top() * sy, source.width() * sx, source.height() * sy)
+                yield tx, ty, source, target
+
+    def tile_rect(self, level, tx, ty, size=None):
+        """QRect của tile (tx, ty) theo px của mức."""
+        if size is None:
+            size = self.level_size(level)
+        left = tx * TILE_SIZE
+        top = ty * TILE_SIZE
+        return QRect(left, top, min(TILE_SIZE, size.width() - left), min(TILE_SIZE, size.height() - top))
+
+    def preview_tiles(self, rect):
+        """(QRectF đích, QPixmap) cho các tile preview giao với rect (cắt từ preview khi cần)."""
+        level = self.preview_level
+        for tx, ty, source, target in self.tile_grid(level, rect):
+            key = (level, tx, ty)
+            pixmap = self._tiles.get(key)
+            if pixmap is None:
+                pixmap = QPixmap.fromImage(self.preview.copy(source))
+                self._tiles.put(key, pixmap)
+            yield target, pixmap
+
+    def detail_tiles(self, level, rect):
+        """(tx, ty, QRectF đích, QPixmap hoặc None nếu chưa giải mã) của mức mịn hơn preview."""
+        for tx, ty, _, target in self.tile_grid(level, rect):
+            yield tx, ty, target, self._tiles.get((level, tx, ty))
+
+    def put_tile(self, level, tx, ty, image):
+        self._tiles.put((level, tx, ty), QPixmap.fromImage(image))
+
+    def clear(self):
+        self.preview = None
+        self._tiles.clear()
+
+
+class TiledImageItem(QGraphicsItem):
+    """
+    Vẽ phần ảnh đang hiển thị: tile preview làm nền, phủ tile của mức mịn hơn nếu
+    đã có; need_detail(level, [(tx, ty), ...]) cho các tile còn thiếu.
+    """
+
+    def __init__(self, pyramid, need_detail=None):
+        super().__init__()
+        self.pyramid = pyramid
+        self._need_detail = need_detail
+        self.setFlag(USES_EXTENDED_STYLE_OPTION, True)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def paint(self, painter, option, widget=None):
+        if self.pyramid.preview is None:
+            return
+        rect = option.exposedRect.intersected(self.boundingRect())
+        for target, pixmap in self.pyramid.preview_tiles(rect):
+            painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pyramid.wanted_level(scale)
+        if level >= self.pyramid.preview_level:
+            return
+        level = self.pyramid.detail_level(level, rect)
+        if level >= self.pyramid.preview_level:
+            return
+        missing = []
+        for tx, ty, target, pixmap in self.pyramid.detail_tiles(level, rect):
+            if pixmap is None:
+                missing.append((tx, ty))
+            else:
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+        if missing and self._need_detail is not None:
+            self._need_detail(level, missing)
+
+
+class TileTask(QgsTask):
+    """
+    Giải mã các tile (tx, ty) của một mức ở thread nền: một lần đọc vùng bao các
+    tile (read_region) rồi cắt thành tile; kết quả: self.tiles {(tx, ty): QImage}.
+    """
+
+    def __init__(self, data, pyramid, level, tiles, callback=None):
+        super().__init__("ArcGIS Attachments: decode image tiles", QgsTask.CanCancel)
+        self.level = level
+        self.tiles = {}
+        self._data = data
+        self._callback = callback
+        self._size = pyramid.level_size(level)
+        self._full = level == 0
+        self._rects = {(tx, ty): pyramid.tile_rect(level, tx, ty) for tx, ty in tiles}
+
+    def run(self):
+        if self.isCanceled() or not self._rects:
+            return False
+        try:
+            bounds = QRect()
+            for rect in self._rects.values():
+                bounds = bounds.united(rect)
+            image = read_region(self._data, None if self._full else self._size, bounds)
+            self._data = None
+            if image is None or self.isCanceled():
+                return False
+            for key, rect in self._rects.items():
+                self.tiles[key] = image.copy(rect.translated(-bounds.left(), -bounds.top()))
+            return True
+        except Exception:
+            return False
+
+    def finished(self, result):
+        if self._callback:
+            self._callback(self, result)
+
+
+class ImageViewer(QDialog):
+    """Modal image viewer - Fit / 1:1 / pan / scroll"""
+
+    def __init__(self, data, parent=None, cache=None, cache_key=None):
+        super().__init__(parent)
+        self.setWindowTitle("Zoom")
+        self.resize(900, 700)
+        self._data = data
+        # cache preview (ByteLRUCache QImage của plugin), khóa riêng cho mức preview
+        self._cache = cache if cache_key is not None else None
+        self._cache_key = cache_key
+        self._is_fit_mode = True
+        self._task = None
+        self.valid = self._build_pyramid()
+
+        self.layout = QVBoxLayout(self)
+
+        self.scene = QGraphicsScene(self)
+        self.item = TiledImageItem(self.pyramid, self._load_detail)
+        self.scene.addItem(self.item)
+        self.scene.setSceneRect(self.item.boundingRect())
+
+        self.view = QGraphicsView(self.scene)
+        self.view.setTransformationAnchor(ANCHOR_UNDER_MOUSE)
+        self.view.setDragMode(SCROLL_HAND_DRAG)
+        self.view.setRenderHint(SMOOTH_PIXMAP_HINT, True)
+        # lăn chuột = zoom (không cuộn)
+        self.view.wheelEvent = self.wheelEvent
+        self.view.horizontalScrollBar().valueChanged.connect(self._interacting)
+        self.view.verticalScrollBar().valueChanged.connect(self._interacting)
+        self.layout.addWidget(self.view)
+
+        self._idle_timer = QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.timeout.connect(self._smooth_render)
+
+        self.toggle_btn = QPushButton("Fit")
+        self.toggle_btn.clicked.connect(self.toggle_mode)
+        self.status_label = QLabel()
+        self.close_btn = QPushButton("Close")
+        self.close_btn.clicked.connect(self.close)
+
+        btn_layout = QHBoxLayout()
+        btn_layout.addWidget(self.toggle_btn)
+        btn_layout.addWidget(self.status_label)
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.close_btn)
+        self.layout.addLayout(btn_layout)
+
+    def _build_pyramid(self):
+        """Preview thu nhỏ (mức preview) để mở ngay; vùng ảnh gốc chỉ giải mã khi zoom cần."""
+        size = image_size(self._data)
+        if not size.isValid() or size.width() <= 0 or size.height() <= 0:
+            # không đọc được kích thước từ header: giải mã toàn bộ một lần
+            image = read_image(self._data)
+            self._data = None
+            if image is None:
+                self.pyramid = ImagePyramid(1, 1)
+                return False
+            self.pyramid = ImagePyramid(image.width(), image.height(), 0, image)
+            return True
+
+        longest = max(size.width(), size.height())
+        preview_level = 0
+        if longest > PREVIEW_WIDTH:
+            preview_level = int(math.ceil(math.log2(longest / float(PREVIEW_WIDTH))))
+        self.pyramid = ImagePyramid(size.width(), size.height(), preview_level)
+        preview = self._cache.get(self._cache_key) if self._cache is not None else None
+        if preview is None:
+            preview = read_image(self._data, self.pyramid.level_size(preview_level))
+            if preview is None:
+                return False
+            if self._cache is not None:
+                self._cache.put(self._cache_key, preview)
+        self.pyramid.preview = preview
+        if preview_level == 0:
+            self._data = None
+        return True
+
+    # ---------------- Chi tiết (thread nền) ----------------
+    def _load_detail(self, level, tiles):
+        """Giải mã các tile đang thiếu; tile còn thiếu sau đó được yêu cầu ở lần vẽ kế."""
+        if self._task is not None or self._data is None:
+            return
+        self.status_label.setText("Đang tải chi tiết...")
+        self._task = TileTask(self._data, self.pyramid, level, tiles[:DETAIL_BATCH_TILES],
+                              callback=self._on_detail_loaded)
+        QgsApplication.taskManager().addTask(self._task)
+
+    def _on_detail_loaded(self, task, result):
+        if task is not self._task:
+            return
+        self._task = None
+        if result:
+            for (tx, ty), image in task.tiles.items():
+                self.pyramid.put_tile(task.level, tx, ty, image)
+            self.status_label.clear()
+        elif not task.isCanceled():
+            # không giải mã được: giữ preview, không yêu cầu lại
+            self._data = None
+            self.status_label.setText("Không giải mã được ảnh gốc.")
+        try:
+            self.item.update()
+        except RuntimeError:
+            # dialog đã đóng
+            pass
+
+    # ---------------- Zoom / pan ----------------
+    def _current_scale(self):
+        return self.view.transform().m11()
+
+    def _fit(self):
+        self.view.fitInView(self.item, KEEP_ASPECT_RATIO)
+
+    def toggle_mode(self):
+        self._is_fit_mode = not self._is_fit_mode
+        self.toggle_btn.setText("Original" if self._is_fit_mode else "Fit")
+        if self._is_fit_mode:
+            self._fit()
+        else:
+            self.view.resetTransform()
+        self._interacting()
+
+    def wheelEvent(self, event):
+        if self._is_fit_mode:
+            self._is_fit_mode = False
+            self.toggle_btn.setText("Fit")
+
+        delta = event.angleDelta().y()
+        factor = ZOOM_STEP if delta > 0 else 1.0 / ZOOM_STEP
+        # Giới hạn zoom (ảnh rất lớn: cho phép thu nhỏ tới vừa khung)
+        fit_scale = min(self.view.viewport().width() / float(self.pyramid.width),
+                        self.view.viewport().height() / float(self.pyramid.height))
+        target = max(min(MIN_SCALE, fit_scale), min(self._current_scale() * factor, MAX_SCALE))
+        self._interacting()
+        self.view.scale(target / self._current_scale(), target / self._current_scale())
+        event.accept()
+
+    def _interacting(self, *args):
+        """Đang tương tác: vẽ nhanh; hẹn vẽ lại mượt khi dừng."""
+        if self.view.renderHints() & SMOOTH_PIXMAP_HINT:
+            self.view.setRenderHint(SMOOTH_PIXMAP_HINT, False)
+        self._idle_timer.start(IDLE_MS)
+
+    def _smooth_render(self):
+        self.view.setRenderHint(SMOOTH_PIXMAP_HINT, True)
+        self.view.viewport().update()
+
+    # ---------------- Dialog ----------------
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._is_fit_mode:
+            self._fit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self._is_fit_mode:
+            self._fit()
+
+    def done(self, result):
+        self._idle_timer.stop()
+        task = self._task
+        self._task = None
+        if task is not None:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        self.pyramid.clear()
+        super().done(result)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+latency.py - đo thời gian từng bước của một lượt identify (click -> dock)
+- ClickTrace: các span (ms) + số byte BLOB đã đọc của một click
+- LatencyRecorder: cửa sổ trượt các click gần nhất, p50/p95/p99 theo từng bước
+- ProfileCapture: cProfile cho N click tiếp theo, xuất ra tệp .prof
+- Không phụ thuộc Qt/QGIS
+"""
+
+import cProfile
+import math
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# thứ tự hiển thị các bước của pipeline identify
+STAGES = [
+    ("wait", "Coalesce wait"),
+    ("resolve", "Resolve ATTACH layer"),
+    ("queue", "Task queue"),
+    ("feature", "Find feature"),
+    ("query", "ATTACH scan"),
+    ("blob", "BLOB read"),
+    ("decode", "Image decode"),
+    ("highlight", "Highlight"),
+    ("dock", "Build dock"),
+    ("total", "Total"),
+]
+
+
+class ClickTrace:
+    """Các span của một click; chỉ một thread ghi tại một thời điểm (các bước nối tiếp)."""
+
+    def __init__(self, profiler=None):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.bytes_read = 0
+        # ProfileCapture nếu click này được chọn để profile
+        self.profiler = profiler
+        self._stamp = self.started
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start)
+
+    def add(self, name, since):
+        """Cộng thời gian từ `since` (perf_counter) tới bây giờ vào bước name."""
+        self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - since) * 1000.0
+
+    def stamp(self):
+        """Đánh dấu thời điểm (để đo khoảng chờ giữa hai bước bằng since_stamp)."""
+        self._stamp = time.perf_counter()
+
+    def since_stamp(self, name):
+        self.add(name, self._stamp)
+
+    def add_bytes(self, nbytes):
+        self.bytes_read += int(nbytes or 0)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000.0
+
+    @contextmanager
+    def profile(self):
+        if self.profiler is None:
+            yield
+            return
+        with self.profiler.profile():
+            yield
+
+
+def percentile(sorted_values, q):
+    """Percentile theo nearest-rank trên list đã sắp xếp."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def format_trace(trace, total_ms=None):
+    """Một dòng log: tổng, từng bước (ms) và số byte đã đọc."""
+    total_ms = trace.stages.get("total") if total_ms is None else total_ms
+    parts = [f"{name} {trace.stages[name]:.1f}" for name, _ in STAGES
+             if name in trace.stages and name != "total"]
+    return f"identify {total_ms or 0:.1f} ms: {', '.join(parts)}; {trace.bytes_read / 1024.0:.1f} KB read"
+
+
+class LatencyRecorder:
+    """Thống kê trượt (window click gần nhất) theo từng bước."""
+
+    def __init__(self, window=200):
+        self.window = max(1, int(window))
+        self.clicks = 0
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._bytes = deque(maxlen=self.window)
+        self._listeners = []
+
+    def record(self, trace):
+        """Kết thúc click: thêm "total" và lưu mẫu."""
+        trace.stages["total"] = trace.total_ms()
+        with self._lock:
+            self.clicks += 1
+            for name, ms in trace.stages.items():
+                samples = self._samples.get(name)
+                if samples is None:
+                    samples = self._samples[name] = deque(maxlen=self.window)
+                samples.append(ms)
+            self._bytes.append(trace.bytes_read)
+        for listener in list(self._listeners):
+            try:
+                listener(trace)
+            except Exception:
+                pass
+
+    def percentiles(self, name):
+        with self._lock:
+            values = sorted(self._samples.get(name, ()))
+        return {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+
+    def bytes_percentiles(self):
+        with self._lock:
+            values = sorted(self._bytes)
+        return {"n": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                "p99": percentile(values, 99)}
+
+    def summary(self):
+        """[(tên bước, nhãn, percentiles)] theo thứ tự STAGES, chỉ các bước đã có mẫu."""
+        rows = []
+        for name, label in STAGES:
+            stats = self.percentiles(name)
+            if stats["n"]:
+                rows.append((name, label, stats))
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self.clicks = 0
+            self._samples = {}
+            self._bytes.clear()
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        try:
+            self._listeners.remove(callback)
+        except ValueError:
+            pass
+
+
+class ProfileCapture:
+    """
+    cProfile cho N click tiếp theo. Mỗi đoạn được profile (main thread hoặc
+    thread của task) có một Profile riêng; dump() gộp tất cả vào một tệp .prof.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self.requested = 0
+        self.captured = 0
+        self._profiles = []
+
+    def arm(self, clicks):
+        with self._lock:
+            self._remaining = max(0, int(clicks))
+            self.requested = self._remaining
+            self.captured = 0
+            self._profiles = []
+
+    @property
+    def active(self):
+        return self._remaining > 0
+
+    def claim(self):
+        """True nếu click hiện tại được profile (giảm số click còn lại)."""
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            self.captured += 1
+            return True
+
+    @contextmanager
+    def profile(self):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: chỉ một profiler hoạt động tại một thời điểm
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._profiles.append(profiler)
+
+    def has_data(self):
+        return bool(self._profiles)
+
+    def dump(self, path):
+        """Ghi các profile đã thu vào path (đọc bằng pstats/snakeviz). False nếu chưa có dữ liệu."""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return False
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+        return True
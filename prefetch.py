@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+prefetch.py - nạp trước attachment quanh vùng đang xem và click gần nhất
+- Sau khi canvas đổi extent (debounce) hoặc sau một identify: K feature gần click
+  gần nhất (hoặc tâm extent) trong extent, lấy từ chỉ mục không gian
+  (SpatialLocatorManager); chưa có chỉ mục thì đọc theo rect rồi sắp theo khoảng cách
+- Làm nóng cache metadata và cache thumbnail (RAM + đĩa) ở thread nền,
+  ưu tiên thấp, trong giới hạn số feature và số byte BLOB đọc
+- Hủy ngay khi có click thật để identify không phải chờ
+"""
+
+import os
+
+from qgis.PyQt.QtCore import QTimer
+from qgis.core import (
+    QgsApplication, QgsFeatureRequest, QgsGeometry, QgsProject, QgsTask, QgsVectorLayer,
+    QgsVectorLayerFeatureSource
+)
+
+from .attachment_query import feature_keys, query_attachments_cached, read_attachment_buffer
+from .settings import get_setting
+from .thumbnails import IMAGE_EXTENSIONS, THUMBNAIL_WIDTH, image_cache_key, load_thumbnail
+
+# độ ưu tiên trong QgsTaskManager (số lớn = ưu tiên cao; identify dùng 0)
+PREFETCH_PRIORITY = -10
+
+# số khóa mỗi lượt truy vấn metadata
+PREFETCH_BATCH = 50
+
+
+class PrefetchTask(QgsTask):
+    """
+    Làm nóng cache cho các feature của một layer trong rect (tọa độ layer),
+    gần focus (QgsPointXY, tọa độ layer) trước.
+    """
+
+    def __init__(self, layer, rect, focus, attach_layer, schema, index, max_features, max_bytes,
+                 metadata_cache=None, image_cache=None, disk_cache=None, locator=None):
+        flags = QgsTask.CanCancel
+        # không hiện thông báo hoàn tất (QGIS >= 3.26)
+        flags |= getattr(QgsTask, "Silent", 0)
+        super().__init__(f"ArcGIS Attachments: prefetch {layer.name()}", flags)
+        self.rect = rect
+        self.focus = focus
+        self.features_done = 0
+        self.bytes_read = 0
+        self.thumbnails = 0
+        self._schema = schema
+        self._index = index
+        self._max_features = max(0, int(max_features))
+        self._max_bytes = max(0, int(max_bytes))
+        self._metadata_cache = metadata_cache
+        self._image_cache = image_cache
+        self._disk_cache = disk_cache
+        self._locator = locator
+        # feature source phải tạo trên main thread
+        self._source = QgsVectorLayerFeatureSource(layer)
+        self._attach_source = QgsVectorLayerFeatureSource(attach_layer)
+        self._attach_layer_id = attach_layer.id()
+        self._attach_uri = attach_layer.source()
+
+    def run(self):
+        try:
+            return self._run()
+        except Exception:
+            return False
+
+    def _candidates(self):
+        """Feature trong rect, gần focus trước, tối đa max_features."""
+        nearest = self._locator.nearest_fids(self.focus, self._max_features) if self._locator else None
+        if nearest is not None:
+            return self._nearest_features(nearest)
+
+        # chưa có chỉ mục không gian: gần đúng theo một phần feature trong rect
+        request = QgsFeatureRequest().setFilterRect(self.rect)
+        request.setSubsetOfAttributes([self._schema.key_idx])
+        focus = QgsGeometry.fromPointXY(self.focus)
+        # đọc tối đa gấp vài lần ngân sách rồi chọn gần nhất (giới hạn bộ nhớ khi extent rộng)
+        limit = self._max_features * 5
+        candidates = []
+        for feat in self._source.getFeatures(request):
+            if self.isCanceled():
+                return []
+            geom = feat.geometry()
+            distance = geom.distance(focus) if geom is not None and not geom.isEmpty() else float("inf")
+            candidates.append((distance, feat.id(), feat))
+            if len(candidates) >= limit:
+                break
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        return [c[2] for c in candidates[:self._max_features]]
+
+    def _nearest_features(self, fids):
+        """Feature theo thứ tự fids (gần focus trước), chỉ giữ feature trong rect."""
+        if not fids:
+            return []
+        request = QgsFeatureRequest().setFilterFids(fids)
+        request.setFilterRect(self.rect)
+        request.setSubsetOfAttributes([self._schema.key_idx])
+        by_fid = {}
+        for feat in self._source.getFeatures(request):
+            if self.isCanceled():
+                return []
+            by_fid[feat.id()] = feat
+        return [by_fid[fid] for fid in fids if fid in by_fid]
+
+    def _run(self):
+        if not self._max_features:
+            return True
+        features = self._candidates()
+        schema = self._schema
+        for start in range(0, len(features), PREFETCH_BATCH):
+            if self.isCanceled():
+                return False
+            batch = features[start:start + PREFETCH_BATCH]
+            keys = feature_keys(batch, schema)
+            results = query_attachments_cached(
+                self._attach_source, schema, keys, self._index, self._attach_layer_id,
+                self._metadata_cache, self.isCanceled
+            )
+            for feat in batch:
+                if self.isCanceled():
+                    return False
+                self.features_done += 1
+                self.setProgress(self.features_done * 100.0 / len(features))
+                if self.bytes_read >= self._max_bytes or self._image_cache is None:
+                    continue
+                key = feature_keys([feat], schema)
+                attachments = results.get(next(iter(key), None), [])
+                if attachments:
+                    self._warm_thumbnail(attachments[0])
+        return True
+
+    def _warm_thumbnail(self, attachment):
+        """Thumbnail của attachment đầu tiên (đúng ảnh dock hiển thị) vào cache."""
+        ext = os.path.splitext(attachment["ATT_NAME"])[1].lower()
+        if ext not in IMAGE_EXTENSIONS or self._schema.data_idx < 0:
+            return
+        size = attachment.get("size")
+        if size and self.bytes_read + size > self._max_bytes:
+            return
+        key = image_cache_key(self._attach_uri, attachment["fid"], THUMBNAIL_WIDTH)
+        if self._image_cache.get(key) is not None:
+            return
+
+        def read_data():
+            buffer = read_attachment_buffer(self._attach_source, self._schema.data_idx, attachment["fid"])
+            self.bytes_read += len(buffer) if buffer is not None else 0
+            return buffer
+
+        if load_thumbnail(read_data, THUMBNAIL_WIDTH, self._image_cache, key, self._disk_cache) is not None:
+            self.thumbnails += 1
+
+
+class Prefetcher:
+    """
+    Điều phối prefetch: debounce sau khi extent đổi, chỉ một task tại một thời điểm,
+    hủy khi identify bắt đầu. enabled() đọc setting prefetch_enabled mỗi lần.
+    """
+
+    def __init__(self, plugin, canvas):
+        self.plugin = plugin
+        self.canvas = canvas
+        self._task = None
+        self._layer_id = None
+        self._focus = None
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._start)
+        self.canvas.extentsChanged.connect(self.schedule)
+
+    @staticmethod
+    def enabled():
+        return get_setting("prefetch_enabled")
+
+    def schedule(self):
+        """Prefetch sau khi người dùng ngừng pan/zoom (prefetch_delay_ms)."""
+        self.cancel()
+        if self.enabled():
+            self._timer.start(get_setting("prefetch_delay_ms"))
+
+    def note_identify(self, layer, feature):
+        """Identify vừa xong: prefetch quanh feature đó trên layer đó."""
+        self._layer_id = layer.id()
+        geom = feature.geometry()
+        self._focus = geom.centroid().asPoint() if geom is not None and not geom.isEmpty() else None
+        self.schedule()
+
+    def cancel(self):
+        """Hủy task đang chạy/đang chờ (gọi khi có click thật)."""
+        self._timer.stop()
+        task = self._task
+        self._task = None
+        if task is not None:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+
+    def stop(self):
+        self.cancel()
+        try:
+            self.canvas.extentsChanged.disconnect(self.schedule)
+        except Exception:
+            pass
+
+    # ---------------- internal ----------------
+    def _target_layer(self):
+        layer = None
+        if self._layer_id:
+            layer = QgsProject.instance().mapLayer(self._layer_id)
+        if layer is None:
+            layer = self.plugin.iface.activeLayer()
+            self._focus = None
+        if not isinstance(layer, QgsVectorLayer) or not layer.isSpatial():
+            return None
+        if layer not in self.canvas.layers():
+            return None
+        return layer
+
+    def _start(self):
+        if not self.enabled() or self.plugin.identify_busy():
+            return
+        layer = self._target_layer()
+        if layer is None:
+            return
+        attach_layer = self.plugin.get_attachment_layer(layer)
+        if attach_layer is None:
+            return
+        schema = self.plugin.get_attachment_schema(layer, attach_layer)
+        if schema.key_idx < 0 or schema.rel_idx < 0:
+            return
+        index = self.plugin.attachment_index.index_for(attach_layer, schema.rel_name)
+
+        settings = self.canvas.mapSettings()
+        rect = settings.mapToLayerCoordinates(layer, self.canvas.extent())
+        focus = self._focus if self._focus is not None else rect.center()
+        locator = None
+        if get_setting("spatial_index_enabled"):
+            locator = self.plugin.spatial_locator.locator_for(layer)
+        task = PrefetchTask(
+            layer, rect, focus, attach_layer, schema, index,
+            get_setting("prefetch_max_features"), get_setting("prefetch_max_mb") * 1024 * 1024,
+            self.plugin.metadata_cache, self.plugin.image_cache, self.plugin.disk_cache, locator
+        )
+        task.taskCompleted.connect(lambda task=task: self._on_done(task))
+        task.taskTerminated.connect(lambda task=task: self._on_done(task))
+        self._task = task
+        QgsApplication.taskManager().addTask(task, PREFETCH_PRIORITY)
+
+    def _on_done(self, task):
+        if task is self._task:
+            self._task = None
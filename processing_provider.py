@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+processing_provider.py - Processing provider cho attachment ArcGIS
+- Extract attachments: xuất tệp + manifest (song song, chạy tiếp được)
+- Count attachments per feature: thêm trường ATT_COUNT/ATT_BYTES
+- Attachment statistics: thống kê tổng hợp (+ JSON)
+Chạy được không cần GUI, ví dụ:
+    qgis_process run arcgisattachments:extractattachments -- INPUT=data.gdb|layername=Poles OUTPUT_FOLDER=/tmp/out
+"""
+
+import json
+import os
+
+from qgis.PyQt.QtCore import QCoreApplication, QVariant
+from qgis.core import (
+    QgsFeature, QgsFeatureRequest, QgsFeatureSink, QgsField, QgsFields, QgsProcessing,
+    QgsProcessingAlgorithm, QgsProcessingException, QgsProcessingOutputNumber,
+    QgsProcessingOutputString, QgsProcessingParameterBoolean, QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFileDestination, QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterNumber, QgsProcessingParameterVectorLayer, QgsProcessingProvider,
+    QgsVectorLayerFeatureSource
+)
+
+from .attachment_keys import normalize_key
+from .attachment_query import aggregate_attachments
+from .attachment_resolver import (
+    build_attachment_schema, find_attachment_layer, open_sibling_attachment_layer
+)
+from .attachment_stats import summarize
+from .export_task import export_layer_attachments, parent_keys
+
+
+class AttachmentsProcessingProvider(QgsProcessingProvider):
+
+    def __init__(self, icon_path=None):
+        super().__init__()
+        self._icon_path = icon_path
+
+    def loadAlgorithms(self):
+        self.addAlgorithm(ExtractAttachmentsAlgorithm())
+        self.addAlgorithm(CountAttachmentsAlgorithm())
+        self.addAlgorithm(AttachmentStatisticsAlgorithm())
+
+    def id(self):
+        return "arcgisattachments"
+
+    def name(self):
+        return "ArcGIS Attachments"
+
+    def icon(self):
+        if self._icon_path:
+            from qgis.PyQt.QtGui import QIcon
+            return QIcon(self._icon_path)
+        return super().icon()
+
+
+class _AttachmentAlgorithm(QgsProcessingAlgorithm):
+    """
+    Tham số chung: lớp chính + bảng ATTACH (tự tìm nếu bỏ trống).
+    Layer được giải quyết trong prepareAlgorithm() (main thread) và chỉ đọc qua
+    QgsVectorLayerFeatureSource trong processAlgorithm() (thread worker của Processing).
+    """
+
+    INPUT = "INPUT"
+    ATTACHMENT_TABLE = "ATTACHMENT_TABLE"
+    SELECTED_ONLY = "SELECTED_ONLY"
+
+    def tr(self, string):
+        return QCoreApplication.translate("ArcGisAttachmentsReader", string)
+
+    def group(self):
+        return self.tr("Attachments")
+
+    def groupId(self):
+        return "attachments"
+
+    def createInstance(self):
+        return type(self)()
+
+    def _add_layer_parameters(self):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.INPUT, self.tr("Input layer"), [QgsProcessing.TypeVector]
+        ))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.ATTACHMENT_TABLE, self.tr("Attachment table (auto-detect if empty)"),
+            [QgsProcessing.TypeVector], optional=True
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.SELECTED_ONLY, self.tr("Selected features only"), defaultValue=False
+        ))
+
+    def _resolve(self, parameters, context):
+        """(layer, attach_layer, schema, feature_ids) hoặc QgsProcessingException."""
+        layer = self.parameterAsVectorLayer(parameters, self.INPUT, context)
+        if layer is None:
+            raise QgsProcessingException(self.tr("Invalid input layer"))
+        attach_layer = self.parameterAsVectorLayer(parameters, self.ATTACHMENT_TABLE, context)
+        if attach_layer is None and context.project() is not None:
+            attach_layer = find_attachment_layer(layer, context.project().mapLayers().values())
+        if attach_layer is None:
+            attach_layer = open_sibling_attachment_layer(layer)
+            if attach_layer is not None:
+                # giữ layer sống trong suốt thuật toán
+                context.temporaryLayerStore().addMapLayer(attach_layer)
+        if attach_layer is None:
+            raise QgsProcessingException(self.tr("Attachment table not found for {}").format(layer.name()))
+        schema = build_attachment_schema(layer, attach_layer)
+        if schema.key_idx < 0 or schema.rel_idx < 0:
+            raise QgsProcessingException(
+                self.tr("Could not detect GlobalID/OBJECTID and REL_* fields")
+            )
+        feature_ids = None
+        if self.parameterAsBoolean(parameters, self.SELECTED_ONLY, context):
+            feature_ids = layer.selectedFeatureIds()
+        return layer, attach_layer, schema, feature_ids
+
+    def prepareAlgorithm(self, parameters, context, feedback):
+        layer, attach_layer, schema, feature_ids = self._resolve(parameters, context)
+        # không dùng QgsVectorLayer của project ngoài main thread
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self.attach_source = QgsVectorLayerFeatureSource(attach_layer)
+        self.schema = schema
+        self.feature_ids = feature_ids
+        self.layer_name = layer.name()
+        self.fields = layer.fields()
+        self.wkb_type = layer.wkbType()
+        self.crs = layer.sourceCrs()
+        self.feature_count = layer.featureCount()
+        self.attach_total = attach_layer.featureCount()
+        return True
+
+
+class ExtractAttachmentsAlgorithm(_AttachmentAlgorithm):
+    OUTPUT_FOLDER = "OUTPUT_FOLDER"
+    WORKERS = "WORKERS"
+    RESUME = "RESUME"
+    WRITTEN = "WRITTEN"
+    SKIPPED = "SKIPPED"
+    FAILED = "FAILED"
+    MANIFEST = "MANIFEST"
+
+    def name(self):
+        return "extractattachments"
+
+    def displayName(self):
+        return self.tr("Extract attachments")
+
+    def shortHelpString(self):
+        return self.tr(
+            "Writes every attachment to OUTPUT_FOLDER/<GlobalID or OBJECTID>/<id>_<name> "
+            "with manifest.csv and manifest.json. The attachment table is streamed once and "
+            "files are written by a thread pool. Re-running into the same folder resumes."
+        )
+
+    def initAlgorithm(self, config=None):
+        self._add_layer_parameters()
+        self.addParameter(QgsProcessingParameterNumber(
+            self.WORKERS, self.tr("Writer threads"), QgsProcessingParameterNumber.Integer,
+            defaultValue=4, minValue=1, maxValue=64
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.RESUME, self.tr("Resume (skip files listed in an existing manifest)"), defaultValue=True
+        ))
+        self.addParameter(QgsProcessingParameterFolderDestination(
+            self.OUTPUT_FOLDER, self.tr("Output folder")
+        ))
+        self.addOutput(QgsProcessingOutputNumber(self.WRITTEN, self.tr("Files written")))
+        self.addOutput(QgsProcessingOutputNumber(self.SKIPPED, self.tr("Files skipped")))
+        self.addOutput(QgsProcessingOutputNumber(self.FAILED, self.tr("Files failed")))
+        self.addOutput(QgsProcessingOutputString(self.MANIFEST, self.tr("Manifest")))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        schema = self.schema
+        if schema.data_idx < 0:
+            raise QgsProcessingException(self.tr("Attachment table has no DATA field"))
+        out_dir = self.parameterAsString(parameters, self.OUTPUT_FOLDER, context)
+        writer, completed = export_layer_attachments(
+            self.source, self.attach_source, schema, out_dir, feature_ids=self.feature_ids,
+            workers=self.parameterAsInt(parameters, self.WORKERS, context),
+            resume=self.parameterAsBoolean(parameters, self.RESUME, context),
+            is_canceled=feedback.isCanceled, set_progress=feedback.setProgress,
+            attach_total=self.attach_total
+        )
+        for error in writer.errors:
+            feedback.reportError(error)
+        feedback.pushInfo(self.tr("Written: {}, skipped: {}, failed: {}").format(
+            writer.written, writer.skipped, writer.failed
+        ))
+        if not completed:
+            feedback.pushInfo(self.tr("Canceled; run again with RESUME to continue."))
+        return {
+            self.OUTPUT_FOLDER: out_dir,
+            self.WRITTEN: writer.written,
+            self.SKIPPED: writer.skipped,
+            self.FAILED: writer.failed,
+            self.MANIFEST: os.path.join(out_dir, "manifest.json"),
+        }
+
+
+class CountAttachmentsAlgorithm(_AttachmentAlgorithm):
+    OUTPUT = "OUTPUT"
+    COUNT_FIELD = "ATT_COUNT"
+    BYTES_FIELD = "ATT_BYTES"
+
+    def name(self):
+        return "countattachments"
+
+    def displayName(self):
+        return self.tr("Count attachments per feature")
+
+    def shortHelpString(self):
+        return self.tr(
+            "Copies the input features and adds ATT_COUNT and ATT_BYTES, computed in a "
+            "single grouped pass over the attachment table (no BLOBs are read)."
+        )
+
+    def initAlgorithm(self, config=None):
+        self._add_layer_parameters()
+        self.addParameter(QgsProcessingParameterFeatureSink(self.OUTPUT, self.tr("Counted")))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        schema = self.schema
+        feature_ids = self.feature_ids
+
+        keys = None
+        if feature_ids is not None:
+            keys = parent_keys(self.source, schema, feature_ids, feedback.isCanceled)
+        feedback.setProgressText(self.tr("Aggregating attachment table"))
+        totals = aggregate_attachments(self.attach_source, schema, keys, is_canceled=feedback.isCanceled)
+        if feedback.isCanceled():
+            return {}
+
+        fields = QgsFields(self.fields)
+        fields.append(QgsField(self.COUNT_FIELD, QVariant.Int))
+        fields.append(QgsField(self.BYTES_FIELD, QVariant.LongLong))
+        sink, dest_id = self.parameterAsSink(
+            parameters, self.OUTPUT, context, fields, self.wkb_type, self.crs
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        request = QgsFeatureRequest()
+        if feature_ids is not None:
+            request.setFilterFids(feature_ids)
+        total = max(1, len(feature_ids) if feature_ids is not None else self.feature_count)
+        for i, feat in enumerate(self.source.getFeatures(request)):
+            if feedback.isCanceled():
+                break
+            count, size = totals.get(normalize_key(feat.attribute(schema.key_idx)), (0, 0))
+            out = QgsFeature(fields)
+            out.setGeometry(feat.geometry())
+            out.setAttributes(feat.attributes() + [count, size])
+            sink.addFeature(out, QgsFeatureSink.FastInsert)
+            if i % 500 == 0:
+                feedback.setProgress(i * 100.0 / total)
+        return {self.OUTPUT: dest_id}
+
+
+class AttachmentStatisticsAlgorithm(_AttachmentAlgorithm):
+    OUTPUT_JSON = "OUTPUT_JSON"
+    TOTAL_ATTACHMENTS = "TOTAL_ATTACHMENTS"
+    TOTAL_BYTES = "TOTAL_BYTES"
+    FEATURES_WITH = "FEATURES_WITH_ATTACHMENTS"
+    FEATURES_WITHOUT = "FEATURES_WITHOUT_ATTACHMENTS"
+    MAX_PER_FEATURE = "MAX_PER_FEATURE"
+    ORPHANS = "ORPHAN_ATTACHMENTS"
+
+    def name(self):
+        return "attachmentstatistics"
+
+    def displayName(self):
+        return self.tr("Attachment statistics")
+
+    def shortHelpString(self):
+        return self.tr(
+            "Summarizes the attachment table: totals, features with/without attachments, "
+            "attachments per content type and attachments whose parent no longer exists."
+        )
+
+    def initAlgorithm(self, config=None):
+        self._add_layer_parameters()
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.OUTPUT_JSON, self.tr("Statistics (JSON)"), "JSON files (*.json)", optional=True
+        ))
+        for key, label in [
+            (self.TOTAL_ATTACHMENTS, "Total attachments"),
+            (self.TOTAL_BYTES, "Total bytes"),
+            (self.FEATURES_WITH, "Features with attachments"),
+            (self.FEATURES_WITHOUT, "Features without attachments"),
+            (self.MAX_PER_FEATURE, "Max attachments per feature"),
+            (self.ORPHANS, "Orphan attachments"),
+        ]:
+            self.addOutput(QgsProcessingOutputNumber(key, self.tr(label)))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        schema = self.schema
+        feature_ids = self.feature_ids
+
+        keys = parent_keys(self.source, schema, feature_ids, feedback.isCanceled)
+        feedback.setProgress(20)
+        type_counts = {}
+        # toàn bảng (không lọc) để đếm cả attachment mồ côi
+        totals = aggregate_attachments(
+            self.attach_source, schema, None if feature_ids is None else keys,
+            is_canceled=feedback.isCanceled, type_counts=type_counts
+        )
+        if feedback.isCanceled():
+            return {}
+        feedback.setProgress(90)
+
+        summary = summarize(totals, keys)
+        stats = {
+            self.TOTAL_ATTACHMENTS: summary["total_attachments"],
+            self.TOTAL_BYTES: summary["total_bytes"],
+            self.FEATURES_WITH: summary["features_with_attachments"],
+            self.FEATURES_WITHOUT: summary["features_without_attachments"],
+            self.MAX_PER_FEATURE: summary["max_per_feature"],
+            self.ORPHANS: summary["orphan_attachments"],
+        }
+        for key, value in stats.items():
+            feedback.pushInfo(f"{key}: {value}")
+
+        results = dict(stats)
+        json_path = self.parameterAsFileOutput(parameters, self.OUTPUT_JSON, context)
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(dict(stats, CONTENT_TYPES=type_counts, LAYER=self.layer_name), f, indent=1)
+            results[self.OUTPUT_JSON] = json_path
+        return results
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+results_tree.py - cây kết quả identify nhiều lớp: lớp -> feature -> attachment
+- Nút feature hiển thị số attachment (đã đếm ở thread nền)
+- Danh sách attachment chỉ được truy vấn khi mở nút feature (lazy, chạy nền;
+  nút "Đang tải..." giữ chỗ tới khi có kết quả)
+- Mỗi lớp hiển thị theo trang (PAGE_SIZE feature), nút "Hiển thị thêm" nạp trang kế
+  -> chọn vùng hàng nghìn feature không phải dựng hàng nghìn nút ngay
+"""
+
+import qgis.PyQt
+from qgis.PyQt.QtCore import pyqtSignal
+from qgis.PyQt.QtWidgets import QTreeWidget, QTreeWidgetItem
+from qgis.core import QgsExpression, QgsExpressionContext, QgsExpressionContextUtils
+
+from .attachment_keys import normalize_key
+from .attachment_stats import format_size
+
+QT_VERSION = int(qgis.PyQt.QtCore.QT_VERSION_STR.split('.')[0])
+if QT_VERSION >= 6:
+    SHOW_INDICATOR = QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator
+else:
+    SHOW_INDICATOR = QTreeWidgetItem.ShowIndicator
+
+# số feature mỗi trang trong một nút lớp
+PAGE_SIZE = 200
+
+
+def feature_title(layer, feature):
+    """Tên hiển thị của feature theo display expression của layer, mặc định #fid."""
+    try:
+        context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(layer))
+        context.setFeature(feature)
+        value = QgsExpression(layer.displayExpression()).evaluate(context)
+        if value is not None and str(value) not in ("", "NULL"):
+            return str(value)
+    except Exception:
+        pass
+    return f"#{feature.id()}"
+
+
+class IdentifyResultsTree(QTreeWidget):
+    """
+    load_attachments(layer, feature, callback): truy vấn nền khi mở nút,
+    gọi callback(list metadata attachment, lỗi hoặc None) trên main thread.
+    Tín hiệu: featureSelected / featureActivated (layer, feature),
+    attachmentActivated (metadata attachment).
+    """
+
+    featureSelected = pyqtSignal(object, object)
+    featureActivated = pyqtSignal(object, object)
+    attachmentActivated = pyqtSignal(object)
+
+    def __init__(self, load_attachments, parent=None):
+        super().__init__(parent)
+        self._load_attachments = load_attachments
+        # item -> [layer, feature, đã tải attachment chưa]
+        self._features = {}
+        self._attachments = {}
+        # nút "Hiển thị thêm" -> [layer, list feature còn lại, counts, schema]
+        self._more = {}
+        self.setColumnCount(2)
+        self.setHeaderLabels(["Feature", "Attachments"])
+        self.setUniformRowHeights(True)
+        self.itemExpanded.connect(self._on_expanded)
+        self.itemDoubleClicked.connect(self._on_double_clicked)
+        self.currentItemChanged.connect(self._on_current_changed)
+
+    def add_layer(self, layer, features, counts, schema, truncated=False):
+        """
+        Nút lớp với các feature trúng; counts = {khóa: [số attachment, tổng byte]}.
+        Chỉ trang đầu (PAGE_SIZE feature) được dựng ngay, phần còn lại theo yêu cầu.
+        """
+        total = 0
+        total_bytes = 0
+        for count, size in counts.values():
+            total += count
+            total_bytes += size
+        layer_item = QTreeWidgetItem(self)
+        self._add_page(layer_item, layer, list(features), counts, schema)
+
+        more = "+" if truncated else ""
+        layer_item.setText(0, f"{layer.name()} ({len(features)}{more} features)")
+        layer_item.setText(1, f"{total} ({format_size(total_bytes)})" if total_bytes else str(total))
+        layer_item.setExpanded(True)
+        self.resizeColumnToContents(0)
+        return layer_item
+
+    def feature_count(self):
+        """Tổng số feature (kể cả các trang chưa hiển thị)."""
+        return len(self._features) + sum(len(entry[1]) for entry in self._more.values())
+
+    # ---------------- internal ----------------
+    def _add_page(self, layer_item, layer, features, counts, schema):
+        page, rest = features[:PAGE_SIZE], features[PAGE_SIZE:]
+        for feature in page:
+            key = normalize_key(feature.attribute(schema.key_idx)) if schema.key_idx >= 0 else None
+            count, size = counts.get(key, (0, 0))
+            item = QTreeWidgetItem(layer_item, [
+                feature_title(layer, feature),
+                f"{count} ({format_size(size)})" if count and size else str(count)
+            ])
+            self._features[item] = [layer, feature, False]
+            if count:
+                # nút con giả để hiện mũi tên mở rộng; thay bằng attachment khi mở
+                item.setChildIndicatorPolicy(SHOW_INDICATOR)
+                QTreeWidgetItem(item, ["Đang tải..."])
+        if rest:
+            more_item = QTreeWidgetItem(layer_item, [
+                f"Hiển thị thêm {min(PAGE_SIZE, len(rest))} (còn {len(rest)})..."
+            ])
+            self._more[more_item] = [layer, rest, counts, schema]
+
+    def _load_more(self, item):
+        entry = self._more.pop(item, None)
+        if entry is None:
+            return
+        layer_item = item.parent()
+        layer_item.removeChild(item)
+        self._add_page(layer_item, *entry)
+
+    def _on_expanded(self, item):
+        entry = self._features.get(item)
+        if entry is None or entry[2]:
+            return
+        entry[2] = True
+        layer, feature, _ = entry
+        # giữ nút "Đang tải..." tới khi truy vấn nền xong
+        try:
+            self._load_attachments(layer, feature, lambda attachments, error: self._show_attachments(
+                item, attachments, error
+            ))
+        except Exception as e:
+            self._show_attachments(item, [], e)
+
+    def _show_attachments(self, item, attachments, error):
+        try:
+            item.takeChildren()
+        except RuntimeError:
+            # cây đã bị thay bằng kết quả khác
+            return
+        if error is not None:
+            QTreeWidgetItem(item, [f"Lỗi: {error}"])
+            return
+        for att in attachments:
+            size = att.get("size")
+            child = QTreeWidgetItem(item, [att.get("ATT_NAME", ""), format_size(size) if size else ""])
+            child.setToolTip(0, att.get("content_type") or "")
+            self._attachments[child] = att
+        if not attachments:
+            QTreeWidgetItem(item, ["(không có attachment)"])
+
+    def _on_double_clicked(self, item, column):
+        if item in self._more:
+            self._load_more(item)
+            return
+        att = self._attachments.get(item)
+        if att is not None:
+            self.attachmentActivated.emit(att)
+            return
+        entry = self._features.get(item)
+        if entry is not None:
+            self.featureActivated.emit(entry[0], entry[1])
+
+    def _on_current_changed(self, current, previous):
+        entry = self._features.get(current)
+        if entry is None and current is not None:
+            # attachment đang chọn -> feature cha
+            entry = self._features.get(current.parent())
+        if entry is not None:
+            self.featureSelected.emit(entry[0], entry[1])
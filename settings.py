@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+settings.py - cấu hình plugin lưu trong QgsSettings
+"""
+
+from qgis.core import QgsSettings
+
+SETTINGS_PREFIX = "ArcGisAttachmentsReader/"
+
+DEFAULTS = {
+    # quét trước toàn bộ project để tìm layer ATTACH khi nạp plugin
+    "warm_resolver_on_load": False,
+    # ngân sách (MB) cho cache thumbnail/preview đã giải mã trong RAM
+    "image_cache_mb": 64,
+    # cache thumbnail trên đĩa (SQLite trong thư mục profile QGIS)
+    "disk_cache_enabled": True,
+    "disk_cache_mb": 256,
+    # dung lượng tối đa (MB) thư mục tệp tạm để mở attachment (PDF...)
+    "temp_cache_mb": 1024,
+    # ngân sách RAM (MB) cho BLOB đang giữ (ảnh gốc đang xem, attachment nạp sẵn)
+    "payload_budget_mb": 256,
+    # BLOB từ ngưỡng này (MB) luôn ghi ra tệp tạm và đọc qua mmap
+    "payload_spill_mb": 32,
+    # số thread ghi đĩa khi xuất hàng loạt attachment
+    "export_workers": 4,
+    # ghi thời gian từng bước của mỗi click vào QgsMessageLog
+    "latency_logging": False,
+    # số click gần nhất dùng để tính p50/p95/p99
+    "latency_window": 200,
+    # identify mọi lớp đang hiển thị có bảng ATTACH (thay vì chỉ lớp đang chọn)
+    "identify_all_layers": False,
+    # số feature tối đa mỗi lớp trong chế độ identify nhiều lớp
+    "identify_max_features": 100,
+    # chỉ mục không gian (QgsSpatialIndex) cho hit-test identify, xây nền theo layer
+    "spatial_index_enabled": True,
+    # số feature tối đa mỗi lớp khi chọn theo hình chữ nhật / polygon
+    "area_max_features": 5000,
+    # ngân sách (MB) cho cache metadata attachment (tên, kích thước, loại)
+    "metadata_cache_mb": 8,
+    # nạp trước attachment quanh vùng đang xem (thread nền, ưu tiên thấp)
+    "prefetch_enabled": False,
+    # số feature tối đa mỗi lượt prefetch, gần click/tâm extent trước
+    "prefetch_max_features": 200,
+    # số MB BLOB tối đa đọc để làm nóng thumbnail mỗi lượt prefetch
+    "prefetch_max_mb": 32,
+    # chờ (ms) sau khi ngừng pan/zoom mới bắt đầu prefetch
+    "prefetch_delay_ms": 400,
+}
+
+
+def get_setting(name):
+    default = DEFAULTS[name]
+    return QgsSettings().value(SETTINGS_PREFIX + name, default, type=type(default))
+
+
+def set_setting(name, value):
+    QgsSettings().setValue(SETTINGS_PREFIX + name, value)
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+spatial_locator.py - chỉ mục không gian cho hit-test identify
+- QgsSpatialIndex (lưu cả geometry) cho từng layer chính, xây nền bằng QgsTask
+- nearest(): feature gần điểm click nhất trong bán kính, khoảng cách tới
+  geometry thật (không chỉ bbox); đọc được từ thread nền
+- nearest_fids(): K feature gần nhất (prefetch quanh click gần nhất)
+- Cập nhật từng phần khi thêm/xóa/sửa geometry; hủy khi commit/rollback/reload
+"""
+
+from qgis.core import (
+    QgsApplication, QgsFeature, QgsFeatureRequest, QgsFeedback, QgsSpatialIndex, QgsTask,
+    QgsVectorLayerFeatureSource
+)
+
+
+class LayerLocator:
+    """Chỉ mục không gian của một layer; ready=False thì caller lọc theo rect như cũ."""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.ready = False
+        # tăng mỗi lần hủy, để bỏ kết quả của task đang chạy dở
+        self.generation = 0
+        self._index = None
+
+    def nearest(self, point, tolerance):
+        """
+        fid gần point nhất trong bán kính tolerance (đơn vị của layer),
+        None nếu không có feature nào hoặc chỉ mục chưa sẵn sàng.
+        """
+        index = self._index
+        if not self.ready or index is None:
+            return None
+        fids = index.nearestNeighbor(point, 1, tolerance)
+        return fids[0] if fids else None
+
+    def nearest_fids(self, point, count):
+        """
+        fid của `count` feature gần point nhất (gần trước), None nếu chỉ mục
+        chưa sẵn sàng (caller lọc theo rect như cũ).
+        """
+        index = self._index
+        if not self.ready or index is None:
+            return None
+        return list(index.nearestNeighbor(point, count))
+
+    def load(self, index):
+        self._index = index
+        self.ready = True
+
+    def invalidate(self):
+        self.ready = False
+        self.generation += 1
+        self._index = None
+
+    def add(self, feature):
+        if self._index is not None and feature.hasGeometry():
+            self._index.addFeature(feature)
+
+    def remove(self, fid):
+        index = self._index
+        if index is None:
+            return
+        # bbox cũ lấy từ geometry đã lưu trong chỉ mục
+        geom = index.geometry(fid)
+        if geom is None or geom.isEmpty():
+            return
+        feature = QgsFeature(fid)
+        feature.setGeometry(geom)
+        index.deleteFeature(feature)
+
+    def change_geometry(self, fid, geometry):
+        self.remove(fid)
+        if geometry is not None and not geometry.isEmpty():
+            feature = QgsFeature(fid)
+            feature.setGeometry(geometry)
+            self.add(feature)
+
+
+class _BuildLocatorTask(QgsTask):
+    """Đọc geometry của toàn layer (không thuộc tính) và bulk-load QgsSpatialIndex ở thread nền."""
+
+    def __init__(self, locator, callback):
+        super().__init__(f"ArcGIS Attachments: spatial index {locator.layer.name()}", QgsTask.CanCancel)
+        self.locator = locator
+        self.generation = locator.generation
+        self.index = None
+        self._callback = callback
+        self._feedback = QgsFeedback()
+        self._feedback.progressChanged.connect(self.setProgress)
+        # feature source phải tạo trên main thread, dùng được ở thread khác
+        self._source = QgsVectorLayerFeatureSource(locator.layer)
+
+    def run(self):
+        request = QgsFeatureRequest().setNoAttributes()
+        index = QgsSpatialIndex(self._source.getFeatures(request), self._feedback,
+                                QgsSpatialIndex.FlagStoreFeatureGeometries)
+        if self.isCanceled() or self._feedback.isCanceled():
+            return False
+        self.index = index
+        return True
+
+    def cancel(self):
+        self._feedback.cancel()
+        super().cancel()
+
+    def finished(self, result):
+        self._callback(self, result)
+
+
+class SpatialLocatorManager:
+    """
+    Quản lý LayerLocator theo layer id. Chỉ mục được xây lần đầu khi cần;
+    trong lúc xây, nearest() trả None để caller lọc theo rect (provider).
+    """
+
+    def __init__(self):
+        self._locators = {}
+        self._tasks = {}
+        self._connections = {}
+
+    def locator_for(self, layer):
+        """LayerLocator của layer; bắt đầu xây nền nếu chưa sẵn sàng. Gọi trên main thread."""
+        if layer is None or not layer.isSpatial():
+            return None
+        layer_id = layer.id()
+        locator = self._locators.get(layer_id)
+        if locator is None:
+            locator = LayerLocator(layer)
+            self._locators[layer_id] = locator
+            self._connect(layer)
+        if not locator.ready:
+            self._start_build(locator)
+        return locator
+
+    def invalidate(self, layer_id):
+        locator = self._locators.get(layer_id)
+        if locator is not None:
+            locator.invalidate()
+
+    def clear(self):
+        for task in list(self._tasks.values()):
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        self._tasks = {}
+        for layer_id in list(self._locators.keys()):
+            self._drop(layer_id)
+
+    # ---------------- internal ----------------
+    def _start_build(self, locator):
+        layer_id = locator.layer.id()
+        if layer_id in self._tasks:
+            return
+        task = _BuildLocatorTask(locator, self._on_built)
+        # giữ tham chiếu để task không bị GC
+        self._tasks[layer_id] = task
+        QgsApplication.taskManager().addTask(task)
+
+    def _on_built(self, task, result):
+        locator = task.locator
+        layer_id = None
+        for lid, t in list(self._tasks.items()):
+            if t is task:
+                layer_id = lid
+                del self._tasks[lid]
+                break
+        if not result or layer_id is None:
+            return
+        if self._locators.get(layer_id) is not locator:
+            return
+        # dữ liệu đã thay đổi trong lúc xây -> bỏ kết quả, lần identify sau xây lại
+        if task.generation != locator.generation:
+            return
+        locator.load(task.index)
+
+    def _connect(self, layer):
+        layer_id = layer.id()
+
+        def _locator():
+            return self._locators.get(layer_id)
+
+        def on_feature_added(fid):
+            locator = _locator()
+            if not locator:
+                return
+            if not locator.ready:
+                locator.invalidate()
+                return
+            try:
+                locator.add(layer.getFeature(fid))
+            except Exception:
+                locator.invalidate()
+
+        def on_feature_deleted(fid):
+            locator = _locator()
+            if not locator:
+                return
+            if not locator.ready:
+                locator.invalidate()
+                return
+            locator.remove(fid)
+
+        def on_geometry_changed(fid, geometry):
+            locator = _locator()
+            if not locator:
+                return
+            if not locator.ready:
+                locator.invalidate()
+                return
+            locator.change_geometry(fid, geometry)
+
+        def on_reset(*args):
+            locator = _locator()
+            if locator:
+                locator.invalidate()
+
+        def on_data_changed():
+            # khi đang edit, thay đổi đã được cập nhật từng phần ở trên
+            if not layer.isEditable():
+                on_reset()
+
+        def on_deleted():
+            self._drop(layer_id)
+
+        connections = [
+            (layer.featureAdded, on_feature_added),
+            (layer.featureDeleted, on_feature_deleted),
+            (layer.geometryChanged, on_geometry_changed),
+            (layer.afterCommitChanges, on_reset),
+            (layer.afterRollBack, on_reset),
+            (layer.dataSourceChanged, on_reset),
+            (layer.subsetStringChanged, on_reset),
+            (layer.dataChanged, on_data_changed),
+            (layer.willBeDeleted, on_deleted),
+        ]
+        for signal, slot in connections:
+            signal.connect(slot)
+        self._connections[layer_id] = connections
+
+    def _drop(self, layer_id):
+        task = self._tasks.pop(layer_id, None)
+        if task is not None:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        for signal, slot in self._connections.pop(layer_id, []):
+            try:
+                signal.disconnect(slot)
+            except Exception:
+                pass
+        self._locators.pop(layer_id, None)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+conftest.py - nạp thư mục plugin như package ArcGisAttachmentsReader (như khi cài vào QGIS)
+- Test thuần Python (không Qt/QGIS) chạy ở mọi nơi
+- Fixture qgis_app: QgsApplication headless; bỏ qua test nếu không có PyQGIS
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "ArcGisAttachmentsReader"
+BENCHMARKS_DIR = os.path.join(PLUGIN_DIR, "benchmarks")
+
+
+def _load_plugin_package():
+    if PACKAGE in sys.modules:
+        return sys.modules[PACKAGE]
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(PLUGIN_DIR, "__init__.py"), submodule_search_locations=[PLUGIN_DIR]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+_load_plugin_package()
+
+
+@pytest.fixture(scope="session")
+def qgis_app():
+    """QgsApplication không GUI, khởi tạo một lần cho cả phiên test."""
+    pytest.importorskip("qgis.core")
+    from qgis.core import QgsApplication
+
+    app = QgsApplication.instance()
+    if app is None:
+        app = QgsApplication([], False)
+        app.initQgis()
+    return app
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""ByteLRUCache: thứ tự loại LRU, ngân sách byte, sizeof và ghi đè khóa đã có."""
+
+from ArcGisAttachmentsReader.attachment_cache import ByteLRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = ByteLRUCache(30)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    cache.put("c", b"c" * 10)
+    # "a" vừa dùng -> "b" bị loại trước
+    assert cache.get("a") == b"a" * 10
+    cache.put("d", b"d" * 10)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache and "d" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget():
+    cache = ByteLRUCache(25)
+    for key in "abcd":
+        cache.put(key, b"x" * 10)
+    stats = cache.stats()
+    assert stats["bytes"] == 20 and stats["entries"] == 2
+    # mục lớn hơn cả ngân sách không được cache
+    cache.put("big", b"x" * 26)
+    assert "big" not in cache
+    assert cache.stats()["bytes"] == 20
+
+    cache.set_max_bytes(10)
+    assert len(cache) == 1 and "d" in cache
+
+
+def test_sizeof_callback():
+    cache = ByteLRUCache(100, sizeof=lambda value: value["size"])
+    cache.put("a", {"size": 60})
+    cache.put("b", {"size": 60})
+    assert "a" not in cache
+    assert cache.stats()["bytes"] == 60
+
+
+def test_replace_existing_key():
+    cache = ByteLRUCache(100)
+    cache.put("a", b"x" * 40)
+    cache.put("a", b"y" * 10)
+    assert cache.get("a") == b"y" * 10
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (1, 10, 0)
+    # ghi đè bằng giá trị quá lớn: bỏ cả mục cũ
+    cache.put("a", b"z" * 200)
+    assert "a" not in cache
+    assert cache.stats()["bytes"] == 0
+
+
+def test_hits_misses_and_discard():
+    cache = ByteLRUCache(100)
+    assert cache.get("a", "default") == "default"
+    cache.put("a", b"1")
+    assert cache.get("a") == b"1"
+    cache.discard("a")
+    cache.discard("missing")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["bytes"]) == (1, 1, 0)
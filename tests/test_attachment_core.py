@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+AttachmentStore (GDAL/OGR) và CLI trên GeoPackage sinh bởi benchmarks/generate_dataset.py,
+quan hệ theo GlobalID và theo OBJECTID. Cần GDAL Python; bỏ qua nếu thiếu.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+from conftest import BENCHMARKS_DIR
+
+FEATURES = 12
+ATTACHMENTS = 2
+
+
+@pytest.fixture(scope="module", params=["guid", "objectid"])
+def dataset(request, tmp_path_factory):
+    pytest.importorskip("osgeo.ogr")
+    if BENCHMARKS_DIR not in sys.path:
+        sys.path.insert(0, BENCHMARKS_DIR)
+    import generate_dataset
+
+    path = str(tmp_path_factory.mktemp(request.param) / "poles.gpkg")
+    info = generate_dataset.generate(
+        path, features=FEATURES, attachments=ATTACHMENTS, blob_kb=2, relation=request.param, seed=7
+    )
+    info["layer"] = generate_dataset.LAYER_NAME
+    return info
+
+
+@pytest.fixture
+def store(dataset):
+    from ArcGisAttachmentsReader.attachment_core import AttachmentStore
+
+    with AttachmentStore(dataset["path"]) as store:
+        yield store
+
+
+def test_schema(store, dataset):
+    from ArcGisAttachmentsReader.attachment_core import FID_KEY
+
+    assert store.attachment_layers() == [(dataset["layer"], dataset["layer"] + "__ATTACH")]
+    schema = store.schema(dataset["layer"])
+    if dataset["relation"] == "guid":
+        assert schema.rel_name == "REL_GLOBALID"
+        assert not schema.rel_numeric
+        assert schema.key_idx == 0
+    else:
+        assert schema.rel_name == "REL_OBJECTID"
+        assert schema.rel_numeric
+        # OBJECTID là cột FID của GeoPackage, GlobalID không được chọn
+        assert schema.key_idx == FID_KEY
+    assert min(schema.name_idx, schema.data_idx, schema.size_idx, schema.type_idx) >= 0
+
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_list_attachments(store, dataset, use_index):
+    keys = store.feature_keys(dataset["layer"])
+    assert len(keys) == FEATURES
+    if use_index:
+        store.build_index(dataset["layer"])
+    listed = store.list_attachments(dataset["layer"], keys)
+    assert sorted(listed) == sorted(keys)
+    assert all(len(records) == ATTACHMENTS for records in listed.values())
+    sizes = sum(r["size"] for records in listed.values() for r in records)
+    assert sizes == dataset["total_attachment_bytes"]
+
+    one = next(iter(keys))
+    assert list(store.list_attachments(dataset["layer"], {one: keys[one]})) == [one]
+
+
+def test_extract_and_resume(store, dataset, tmp_path):
+    out_dir = str(tmp_path / "out")
+    writer = store.extract(dataset["layer"], out_dir, workers=2)
+    assert (writer.written, writer.skipped, writer.failed) == (FEATURES * ATTACHMENTS, 0, 0)
+    assert writer.bytes_written == dataset["total_attachment_bytes"]
+    assert os.path.exists(os.path.join(out_dir, "manifest.json"))
+
+    writer = store.extract(dataset["layer"], out_dir, workers=2)
+    assert (writer.written, writer.skipped, writer.failed) == (0, FEATURES * ATTACHMENTS, 0)
+
+
+def test_cli(dataset, tmp_path, capsys):
+    from ArcGisAttachmentsReader.cli import main
+
+    assert main(["stats", dataset["path"], "--json"]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert stats[0]["layer"] == dataset["layer"]
+    assert stats[0]["total_attachments"] == FEATURES * ATTACHMENTS
+    assert stats[0]["features_without_attachments"] == 0
+    assert stats[0]["orphan_attachments"] == 0
+
+    assert main(["list", dataset["path"], "--layer", dataset["layer"], "--json"]) == 0
+    listed = json.loads(capsys.readouterr().out)[dataset["layer"]]
+    assert sum(len(records) for records in listed.values()) == FEATURES * ATTACHMENTS
+
+    out_dir = str(tmp_path / "cli")
+    assert main(["extract", dataset["path"], out_dir, "--layer", dataset["layer"], "--quiet"]) == 0
+    with open(os.path.join(out_dir, "manifest.json"), encoding="utf-8") as f:
+        assert len(json.load(f)) == FEATURES * ATTACHMENTS
+
+
+def test_mixed_case_guid_is_found(tmp_path):
+    ogr = pytest.importorskip("osgeo.ogr")
+    if BENCHMARKS_DIR not in sys.path:
+        sys.path.insert(0, BENCHMARKS_DIR)
+    import generate_dataset
+    from ArcGisAttachmentsReader.attachment_core import AttachmentStore
+
+    path = str(tmp_path / "mixed.gpkg")
+    generate_dataset.generate(path, features=3, attachments=ATTACHMENTS, blob_kb=1, seed=7)
+    attach_name = generate_dataset.LAYER_NAME + "__ATTACH"
+    ds = ogr.Open(path, 1)
+    attach = ds.GetLayerByName(attach_name)
+    feat = attach.GetNextFeature()
+    # GUID lưu chữ hoa/thường lẫn lộn, không ngoặc nhọn: so khớp chính xác bỏ sót
+    guid = feat.GetField("REL_GLOBALID").strip("{}")
+    feat.SetField("REL_GLOBALID", guid[:8].lower() + guid[8:])
+    attach.SetFeature(feat)
+    ds = None
+
+    with AttachmentStore(path) as store:
+        keys = store.feature_keys(generate_dataset.LAYER_NAME)
+        listed = store.list_attachments(generate_dataset.LAYER_NAME, keys)
+    assert sum(len(records) for records in listed.values()) == 3 * ATTACHMENTS
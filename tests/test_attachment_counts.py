@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""AttachmentCounts: tra cứu, cập nhật từng phần, chuẩn hóa GUID và bỏ kết quả đếm cũ."""
+
+from ArcGisAttachmentsReader.attachment_stats import (
+    AttachmentCounts, accumulate_rows, attachment_size, format_size
+)
+
+
+def _ready_counts(rows):
+    counts = AttachmentCounts(None, 0, 1)
+    row_by_fid = {fid: (key, size) for fid, key, size in rows}
+    counts.load(row_by_fid, accumulate_rows((key, size, None) for _, key, size in rows))
+    return counts
+
+
+def test_lookup_before_ready_is_none():
+    counts = AttachmentCounts(None, 0, 1)
+    assert counts.lookup("A") is None
+    counts.load({}, {})
+    assert counts.lookup("A") == (0, 0)
+
+
+def test_add_and_remove():
+    counts = _ready_counts([(1, "A", 100), (2, "A", 50)])
+    assert counts.lookup("A") == (2, 150)
+
+    counts.add(3, "A", 25)
+    counts.add(4, "B", None)
+    assert counts.lookup("A") == (3, 175)
+    assert counts.lookup("B") == (1, 0)
+
+    counts.remove(1)
+    assert counts.lookup("A") == (2, 75)
+    # fid không có trong bảng -> bỏ qua
+    counts.remove(99)
+    assert counts.lookup("A") == (2, 75)
+
+    counts.remove(4)
+    assert counts.lookup("B") == (0, 0)
+    assert "B" not in counts._totals
+
+
+def test_guid_keys_are_normalized():
+    counts = _ready_counts([])
+    counts.add(1, "{abc-1}", 10)
+    counts.add(2, " ABC-1 ", 5)
+    assert counts.lookup("ABC-1") == (2, 15)
+    assert counts.lookup("{Abc-1}") == (2, 15)
+    # khóa rỗng không được đếm
+    counts.add(3, None, 10)
+    assert 3 not in counts._row_by_fid
+
+
+def test_attachment_size():
+    assert attachment_size(None) == 0
+    assert attachment_size("not a number") == 0
+    assert attachment_size("42") == 42
+
+
+def test_stale_build_is_rejected():
+    counts = AttachmentCounts(None, 0, 1)
+    started = counts.generation
+    # dữ liệu đổi trong lúc task đang đếm
+    counts.invalidate()
+    assert not counts.accept(started, {1: ("A", 10)}, {"A": [1, 10]})
+    assert not counts.ready
+    assert counts.lookup("A") is None
+
+    assert counts.accept(counts.generation, {1: ("A", 10)}, {"A": [1, 10]})
+    assert counts.lookup("A") == (1, 10)
+
+
+def test_format_size():
+    assert format_size(None) == "-"
+    assert format_size(512) == "512 B"
+    assert format_size(1536) == "1.5 KB"
+    assert format_size(3 * 1024 ** 4) == "3072.0 GB"
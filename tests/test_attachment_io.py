@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+AttachmentBuffer: đọc không sao chép, bản sao duy nhất khi blob không có buffer protocol.
+TempFileCache: dùng lại tệp đã ghi, loại tệp ít dùng nhất theo chỉ mục trong RAM.
+process_temp_root: dọn thư mục tạm của tiến trình đã kết thúc.
+"""
+
+import os
+import subprocess
+import sys
+
+from ArcGisAttachmentsReader import attachment_io
+from ArcGisAttachmentsReader.attachment_io import AttachmentBuffer, TempFileCache, process_temp_root
+
+
+class _NoBufferBlob:
+    """Giống QByteArray của PyQt5: không có buffer protocol, đọc qua data()."""
+
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return bytes(self._data)
+
+    def isNull(self):
+        return False
+
+
+def test_buffer_protocol_is_not_copied(tmp_path):
+    blob = bytearray(b"abc" * 1000)
+    buffer = AttachmentBuffer.from_blob(blob)
+    assert buffer.raw is blob
+    blob[0:1] = b"z"
+    assert buffer.view()[0] == ord("z")
+
+    path = tmp_path / "out.bin"
+    assert buffer.write_to(str(path), chunk_size=512) == len(blob)
+    assert path.read_bytes() == bytes(blob)
+
+
+def test_blob_without_buffer_protocol_is_held_once():
+    blob = _NoBufferBlob(b"payload")
+    buffer = AttachmentBuffer.from_blob(blob)
+    # chỉ giữ bản sao bytes, không giữ thêm đối tượng gốc
+    assert isinstance(buffer.raw, bytes)
+    assert buffer.raw is not blob
+    assert len(buffer) == 7
+    assert buffer.tobytes() == b"payload"
+    buffer.release()
+    assert buffer.raw is None
+
+
+def test_empty_blob():
+    assert AttachmentBuffer.from_blob(None) is None
+    assert not AttachmentBuffer.from_blob(b"")
+
+
+def _loader(data, calls):
+    def load():
+        calls.append(data)
+        return AttachmentBuffer(data)
+    return load
+
+
+def test_temp_file_reused(tmp_path):
+    cache = TempFileCache(str(tmp_path / "tmp"), 1024)
+    calls = []
+    path = cache.materialize("a", "a.pdf", _loader(b"x" * 10, calls))
+    assert cache.materialize("a", "a.pdf", _loader(b"x" * 10, calls)) == path
+    # lần thứ hai không đọc lại BLOB
+    assert len(calls) == 1
+    assert cache.total == 10
+
+
+def test_temp_file_eviction_is_lru(tmp_path, monkeypatch):
+    cache = TempFileCache(str(tmp_path / "tmp"), 25)
+    calls = []
+    a = cache.materialize("a", "a.bin", _loader(b"a" * 10, calls))
+    b = cache.materialize("b", "b.bin", _loader(b"b" * 10, calls))
+    cache.materialize("a", "a.bin", _loader(b"a" * 10, calls))
+
+    # ghi/loại tệp không quét lại thư mục
+    def no_walk(*args):
+        raise AssertionError("os.walk called")
+    monkeypatch.setattr(attachment_io.os, "walk", no_walk)
+    c = cache.materialize("c", "c.bin", _loader(b"c" * 10, calls))
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b)
+    assert cache.total == 20
+
+
+def test_temp_files_from_previous_run_are_indexed(tmp_path):
+    root = str(tmp_path / "tmp")
+    first = TempFileCache(root, 1024)
+    old = first.materialize("old", "old.bin", _loader(b"o" * 20, []))
+
+    cache = TempFileCache(root, 25)
+    cache.materialize("new", "new.bin", _loader(b"n" * 10, []))
+    assert not os.path.exists(old)
+    assert cache.total == 10
+
+    cache.cleanup()
+    assert not os.path.exists(root)
+    assert cache.total == 0
+
+
+def test_process_temp_root_removes_dead_process_folders(tmp_path):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    stale = tmp_path / f"ArcGisAttachmentsReader-{dead.pid}"
+    (stale / "ab").mkdir(parents=True)
+    (stale / "ab" / "old.bin").write_bytes(b"x")
+    alive = tmp_path / f"ArcGisAttachmentsReader-{os.getppid()}"
+    alive.mkdir()
+    other = tmp_path / "ArcGisAttachmentsReader-cache"
+    other.mkdir()
+
+    root = process_temp_root(str(tmp_path), "ArcGisAttachmentsReader")
+    assert root == str(tmp_path / f"ArcGisAttachmentsReader-{os.getpid()}")
+    assert not stale.exists()
+    assert alive.exists() and other.exists()
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""Nhận diện trường: khóa layer chính theo kiểu REL_* và vai trò trường của bảng ATTACH."""
+
+from ArcGisAttachmentsReader.attachment_schema import detect_roles, select_key_index
+
+MAIN_FIELDS = ["OBJECTID", "GlobalID", "NAME"]
+
+
+def test_guid_relation_prefers_globalid():
+    assert select_key_index(MAIN_FIELDS, rel_numeric=False) == 1
+
+
+def test_objectid_relation_uses_objectid():
+    # REL_OBJECTID: GlobalID của layer chính không được dùng dù có mặt
+    assert select_key_index(MAIN_FIELDS, rel_numeric=True) == 0
+    assert select_key_index(["GlobalID", "fid"], rel_numeric=True) == 1
+
+
+def test_missing_key():
+    assert select_key_index(["GlobalID", "NAME"], rel_numeric=True) == -1
+    assert select_key_index(["NAME"], rel_numeric=False) == -1
+
+
+def test_detect_roles():
+    roles = detect_roles(["ATTACHMENTID", "REL_OBJECTID", "CONTENT_TYPE", "ATT_NAME", "DATA_SIZE", "DATA"])
+    assert roles == {"name": 3, "data": 5, "rel": 1, "size": 4, "content_type": 2}
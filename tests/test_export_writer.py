@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""ExportWriter: ghi song song, manifest và chạy tiếp (resume)."""
+
+import json
+import os
+
+from ArcGisAttachmentsReader.attachment_io import AttachmentBuffer
+from ArcGisAttachmentsReader.export_writer import ExportWriter
+
+ROWS = [("KEY-1", 1, "a.png", b"aaaa"), ("KEY-1", 2, "b.pdf", b"bb"), ("KEY-2", 3, "c.txt", b"c")]
+
+
+def _export(out_dir, rows=ROWS, resume=True):
+    writer = ExportWriter(str(out_dir), workers=2, resume=resume)
+    for key, fid, name, data in rows:
+        if writer.is_done(key, fid):
+            writer.skipped += 1
+            continue
+        writer.submit(key, fid, name, AttachmentBuffer(data), len(data))
+    writer.close()
+    return writer
+
+
+def test_write_and_manifest(tmp_path):
+    writer = _export(tmp_path)
+    assert (writer.written, writer.skipped, writer.failed) == (3, 0, 0)
+    assert writer.bytes_written == 7
+    assert (tmp_path / "KEY-1" / "1_a.png").read_bytes() == b"aaaa"
+    with open(tmp_path / "manifest.json", encoding="utf-8") as f:
+        rows = json.load(f)
+    assert sorted(row["path"] for row in rows) == ["KEY-1/1_a.png", "KEY-1/2_b.pdf", "KEY-2/3_c.txt"]
+
+
+def test_resume_skips_done(tmp_path):
+    _export(tmp_path)
+    # tệp bị xóa sau lần chạy trước -> phải ghi lại
+    os.remove(tmp_path / "KEY-2" / "3_c.txt")
+
+    writer = ExportWriter(str(tmp_path), resume=True)
+    assert writer.done_count() == 2
+    assert writer.is_done("KEY-1", 1)
+    assert writer.is_done("KEY-1", "2")
+    assert not writer.is_done("KEY-2", 3)
+    writer.close()
+
+    writer = _export(tmp_path)
+    assert (writer.written, writer.skipped) == (1, 2)
+    with open(tmp_path / "manifest.json", encoding="utf-8") as f:
+        # dòng trùng của lần ghi lại chỉ giữ một
+        assert len(json.load(f)) == 3
+
+
+def test_no_resume_starts_over(tmp_path):
+    _export(tmp_path)
+    writer = ExportWriter(str(tmp_path), resume=False)
+    assert writer.done_count() == 0
+    writer.cancel()
+    assert not (tmp_path / "manifest.json").exists()
+
+
+def test_empty_buffer_is_skipped(tmp_path):
+    writer = ExportWriter(str(tmp_path))
+    writer.submit("KEY-1", 1, "a.png", None)
+    writer.close()
+    assert (writer.written, writer.skipped) == (0, 1)
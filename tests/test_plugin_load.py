@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Nạp plugin không có iface (qgis_process: classFactory(None) + initProcessing())."""
+
+import ArcGisAttachmentsReader as plugin_package
+
+
+def test_class_factory_without_iface_registers_provider(qgis_app):
+    from qgis.core import QgsApplication
+
+    plugin = plugin_package.classFactory(None)
+    plugin.initProcessing()
+    try:
+        registry = QgsApplication.processingRegistry()
+        assert registry.providerById("arcgisattachments") is plugin.provider
+        ids = {alg.id() for alg in plugin.provider.algorithms()}
+        assert "arcgisattachments:extractattachments" in ids
+        assert "arcgisattachments:countattachments" in ids
+        assert "arcgisattachments:attachmentstatistics" in ids
+    finally:
+        plugin.unload()
+    assert QgsApplication.processingRegistry().providerById("arcgisattachments") is None
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Chạy các thuật toán Processing trên GeoPackage sinh bởi benchmarks/generate_dataset.py.
+Cần PyQGIS + plugin processing + GDAL Python; bỏ qua nếu thiếu.
+"""
+
+import os
+import sys
+
+import pytest
+
+from conftest import BENCHMARKS_DIR
+
+FEATURES = 20
+ATTACHMENTS = 2
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    pytest.importorskip("osgeo.ogr")
+    if BENCHMARKS_DIR not in sys.path:
+        sys.path.insert(0, BENCHMARKS_DIR)
+    import generate_dataset
+
+    path = str(tmp_path_factory.mktemp("data") / "poles.gpkg")
+    info = generate_dataset.generate(path, features=FEATURES, attachments=ATTACHMENTS, blob_kb=2, seed=7)
+    info["uri"] = f"{path}|layername={generate_dataset.LAYER_NAME}"
+    return info
+
+
+@pytest.fixture(scope="module")
+def processing(qgis_app):
+    pytest.importorskip("processing")
+    import processing
+    from processing.core.Processing import Processing
+    from qgis.core import QgsApplication
+    from ArcGisAttachmentsReader.processing_provider import AttachmentsProcessingProvider
+
+    Processing.initialize()
+    provider = AttachmentsProcessingProvider()
+    QgsApplication.processingRegistry().addProvider(provider)
+    yield processing
+    QgsApplication.processingRegistry().removeProvider(provider)
+
+
+def test_count_attachments(processing, dataset):
+    result = processing.run("arcgisattachments:countattachments", {
+        "INPUT": dataset["uri"], "OUTPUT": "memory:counted"
+    })
+    layer = result["OUTPUT"]
+    counts = [f["ATT_COUNT"] for f in layer.getFeatures()]
+    assert counts == [ATTACHMENTS] * FEATURES
+    assert sum(f["ATT_BYTES"] for f in layer.getFeatures()) == dataset["total_attachment_bytes"]
+
+
+def test_attachment_statistics(processing, dataset, tmp_path):
+    json_path = str(tmp_path / "stats.json")
+    result = processing.run("arcgisattachments:attachmentstatistics", {
+        "INPUT": dataset["uri"], "OUTPUT_JSON": json_path
+    })
+    assert result["TOTAL_ATTACHMENTS"] == FEATURES * ATTACHMENTS
+    assert result["TOTAL_BYTES"] == dataset["total_attachment_bytes"]
+    assert result["FEATURES_WITH_ATTACHMENTS"] == FEATURES
+    assert result["FEATURES_WITHOUT_ATTACHMENTS"] == 0
+    assert result["ORPHAN_ATTACHMENTS"] == 0
+    assert os.path.exists(json_path)
+
+
+def test_extract_attachments_resumes(processing, dataset, tmp_path):
+    params = {"INPUT": dataset["uri"], "OUTPUT_FOLDER": str(tmp_path / "out"), "WORKERS": 2, "RESUME": True}
+    first = processing.run("arcgisattachments:extractattachments", params)
+    assert first["WRITTEN"] == FEATURES * ATTACHMENTS
+    assert first["FAILED"] == 0
+    assert os.path.exists(first["MANIFEST"])
+
+    second = processing.run("arcgisattachments:extractattachments", params)
+    assert second["WRITTEN"] == 0
+    assert second["SKIPPED"] == FEATURES * ATTACHMENTS
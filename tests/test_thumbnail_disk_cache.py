@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""ThumbnailDiskCache: đọc/ghi, mục hết hiệu lực và phục hồi khi tệp SQLite hỏng."""
+
+import os
+import sqlite3
+
+from ArcGisAttachmentsReader.thumbnail_disk_cache import ThumbnailDiskCache
+
+
+def _cache(tmp_path, max_bytes=1024 * 1024):
+    return ThumbnailDiskCache(str(tmp_path / "cache" / "thumbs.sqlite"), max_bytes)
+
+
+def test_put_get_and_fingerprint_mismatch(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("a", "fp1", b"thumbnail")
+    assert cache.get("a", "fp1") == b"thumbnail"
+    # nguồn đổi -> miss và mục bị xóa
+    assert cache.get("a", "fp2") is None
+    assert cache.get("a", "fp1") is None
+    cache.close()
+
+
+def test_corrupt_file_is_recreated(tmp_path):
+    path = tmp_path / "cache" / "thumbs.sqlite"
+    os.makedirs(path.parent)
+    path.write_bytes(b"this is not a sqlite database" * 100)
+
+    cache = _cache(tmp_path)
+    cache.put("a", "fp", b"thumbnail")
+    assert cache.get("a", "fp") == b"thumbnail"
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+
+def test_disabled_only_when_recreate_fails(tmp_path):
+    # đường dẫn là thư mục: không mở được cũng không xóa được -> tắt cache, trả về miss
+    path = tmp_path / "cache" / "thumbs.sqlite"
+    os.makedirs(path)
+    cache = _cache(tmp_path)
+    cache.put("a", "fp", b"thumbnail")
+    assert cache.get("a", "fp") is None
+    cache.close()
+
+
+def test_eviction_keeps_total_under_budget(tmp_path):
+    cache = _cache(tmp_path, max_bytes=100)
+    for i in range(10):
+        cache.put(f"k{i}", "fp", bytes(30))
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get("k9", "fp") == bytes(30)
+    cache.close()
+
+
+def test_stats_count_hits_misses_evictions(tmp_path):
+    cache = _cache(tmp_path, max_bytes=100)
+    cache.put("a", "fp", bytes(60))
+    assert cache.get("a", "fp") == bytes(60)
+    assert cache.get("missing", "fp") is None
+    cache.put("b", "fp", bytes(60))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 1)
+    cache.close()
+
+
+def _last_access(path, key):
+    conn = sqlite3.connect(str(path))
+    try:
+        return conn.execute("SELECT last_access FROM thumbs WHERE key = ?", (key,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_hits_do_not_write_until_flush(tmp_path):
+    path = tmp_path / "cache" / "thumbs.sqlite"
+    cache = _cache(tmp_path)
+    cache.put("a", "fp", b"thumbnail")
+    written = _last_access(path, "a")
+    assert cache.get("a", "fp") == b"thumbnail"
+    # đọc trúng chỉ ghi nhận trong RAM
+    assert _last_access(path, "a") == written
+    cache.close()
+    assert _last_access(path, "a") > written
+
+
+def test_eviction_uses_pending_access_times(tmp_path):
+    cache = _cache(tmp_path, max_bytes=100)
+    cache.put("a", "fp", bytes(40))
+    cache.put("b", "fp", bytes(40))
+    # "a" vừa được đọc -> "b" là mục cũ nhất khi put "c" vượt ngân sách
+    assert cache.get("a", "fp") == bytes(40)
+    cache.put("c", "fp", bytes(40))
+    assert cache.get("b", "fp") is None
+    assert cache.get("a", "fp") == bytes(40)
+    assert cache.get("c", "fp") == bytes(40)
+    cache.close()
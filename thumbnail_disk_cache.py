@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+thumbnail_disk_cache.py - cache thumbnail trên đĩa (SQLite) giữa các phiên QGIS
+- Khóa: định danh attachment (nguồn, fid, kích thước) + dấu vân tay tệp nguồn
+  (mtime/size); tệp nguồn đổi -> mục cũ tự hết hiệu lực
+- Kiểm tra toàn vẹn bằng SHA-1, loại mục cũ nhất khi vượt dung lượng
+- Đọc trúng không ghi đĩa ngay: thời điểm truy cập được gom trong RAM và ghi
+  một lượt khi put/evict, khi đủ ACCESS_FLUSH_BATCH hoặc khi đóng
+- Không phụ thuộc Qt/QGIS
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# thời gian (giây) nhớ dấu vân tay một nguồn, tránh stat lại mỗi click
+FINGERPRINT_TTL = 30.0
+
+# số lần đọc trúng gom lại trước khi ghi last_access xuống SQLite một lượt
+ACCESS_FLUSH_BATCH = 256
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def source_path(source):
+    """Đường dẫn tệp/thư mục từ chuỗi source của layer OGR ("path|layername=...")."""
+    if not source:
+        return None
+    path = source.split("|")[0]
+    return path if os.path.exists(path) else None
+
+
+def source_fingerprint(source):
+    """
+    Dấu vân tay của tệp nguồn: size + mtime (với thư mục .gdb: tổng size và
+    mtime lớn nhất của các tệp bên trong). None nếu nguồn không phải tệp cục bộ.
+    """
+    now = time.monotonic()
+    with _fingerprints_lock:
+        cached = _fingerprints.get(source)
+        if cached and now - cached[1] < FINGERPRINT_TTL:
+            return cached[0]
+
+    path = source_path(source)
+    fingerprint = None
+    if path:
+        try:
+            if os.path.isdir(path):
+                total = 0
+                latest = 0
+                for entry in os.scandir(path):
+                    if entry.is_file():
+                        st = entry.stat()
+                        total += st.st_size
+                        latest = max(latest, st.st_mtime_ns)
+                fingerprint = f"{total}:{latest}"
+            else:
+                st = os.stat(path)
+                fingerprint = f"{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            fingerprint = None
+
+    with _fingerprints_lock:
+        _fingerprints[source] = (fingerprint, now)
+    return fingerprint
+
+
+class ThumbnailDiskCache:
+    """
+    Lưu thumbnail đã mã hóa (JPEG/PNG bytes) trong một tệp SQLite.
+    Lỗi SQLite không làm hỏng identify: tệp hỏng được xóa và tạo lại,
+    chỉ khi tạo lại cũng lỗi thì cache tự tắt và trả về miss.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max(0, int(max_bytes))
+        self._conn = None
+        self._lock = threading.Lock()
+        self._disabled = False
+        self._total = None
+        # khóa -> thời điểm đọc trúng chưa ghi xuống SQLite
+        self._touched = {}
+        # bộ đếm cho bảng chẩn đoán
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, fingerprint):
+        if fingerprint is None:
+            return None
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT fingerprint, checksum, data FROM thumbs WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                stored_fp, checksum, data = row
+                data = bytes(data)
+                if stored_fp != fingerprint or hashlib.sha1(data).hexdigest() != checksum:
+                    # nguồn đã thay đổi hoặc dữ liệu hỏng -> xóa mục
+                    self._delete(conn, key)
+                    conn.commit()
+                    self.misses += 1
+                    return None
+                self._touched[key] = time.time()
+                if len(self._touched) >= ACCESS_FLUSH_BATCH:
+                    self._flush_access(conn)
+                    conn.commit()
+                self.hits += 1
+                return data
+            except sqlite3.DatabaseError:
+                self._reset()
+                self.misses += 1
+                return None
+
+    def put(self, key, fingerprint, data):
+        if fingerprint is None or not data or len(data) > self.max_bytes:
+            return
+        data = bytes(data)
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                self._delete(conn, key)
+                conn.execute(
+                    "INSERT INTO thumbs (key, fingerprint, checksum, data, size, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, fingerprint, hashlib.sha1(data).hexdigest(), sqlite3.Binary(data),
+                     len(data), time.time())
+                )
+                self._total += len(data)
+                self._flush_access(conn)
+                self._evict(conn)
+                conn.commit()
+            except sqlite3.DatabaseError:
+                self._reset()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                self._touched = {}
+                conn.execute("DELETE FROM thumbs")
+                conn.commit()
+                conn.execute("VACUUM")
+                self._total = 0
+            except sqlite3.DatabaseError:
+                self._reset()
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            counters = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+            if conn is None:
+                return dict(counters, entries=0, bytes=0, max_bytes=self.max_bytes)
+            try:
+                count, = conn.execute("SELECT COUNT(*) FROM thumbs").fetchone()
+            except sqlite3.DatabaseError:
+                count = 0
+            return dict(counters, entries=count, bytes=self._total or 0, max_bytes=self.max_bytes)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_access(self._conn)
+                    self._conn.commit()
+                except sqlite3.Error:
+                    pass
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+                self._conn = None
+
+    # ---------------- internal ----------------
+    def _connect(self):
+        if self._disabled:
+            return None
+        if self._conn is not None:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        except OSError:
+            self._disabled = True
+            return None
+        # tệp hỏng: xóa, tạo lại và thử một lần nữa; chỉ tắt cache nếu vẫn lỗi
+        for attempt in range(2):
+            conn = None
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS thumbs ("
+                    "key TEXT PRIMARY KEY, fingerprint TEXT, checksum TEXT, "
+                    "data BLOB, size INTEGER, last_access REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS thumbs_last_access ON thumbs (last_access)")
+                conn.commit()
+                total, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM thumbs").fetchone()
+                self._total = int(total)
+                self._conn = conn
+                return conn
+            except sqlite3.DatabaseError:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                if attempt == 0:
+                    self._reset()
+                    if self._disabled:
+                        return None
+        self._disabled = True
+        return None
+
+    def _flush_access(self, conn):
+        """Ghi last_access của các mục đã đọc trúng (trong transaction của caller)."""
+        if not self._touched:
+            return
+        touched = self._touched
+        self._touched = {}
+        conn.executemany(
+            "UPDATE thumbs SET last_access = ? WHERE key = ?", [(t, key) for key, t in touched.items()]
+        )
+
+    def _delete(self, conn, key):
+        self._touched.pop(key, None)
+        row = conn.execute("SELECT size FROM thumbs WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM thumbs WHERE key = ?", (key,))
+            self._total -= int(row[0] or 0)
+
+    def _evict(self, conn):
+        if self._total <= self.max_bytes:
+            return
+        # xóa đến 90% ngân sách để không phải evict sau mỗi lần ghi
+        target = int(self.max_bytes * 0.9)
+        rows = conn.execute("SELECT key, size FROM thumbs ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if self._total <= target:
+                break
+            conn.execute("DELETE FROM thumbs WHERE key = ?", (key,))
+            self._total -= int(size or 0)
+            self.evictions += 1
+
+    def _reset(self):
+        """Tệp cache hỏng: đóng, xóa tệp, lần sau tạo lại."""
+        self._touched = {}
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except sqlite3.Error:
+            pass
+        self._conn = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            self._disabled = True
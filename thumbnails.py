@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+thumbnails.py - giải mã thumbnail ở kích thước nhỏ
+- QImageReader.setScaledSize: JPEG được thu nhỏ ngay khi giải mã (DCT), không
+  cần giải mã ảnh gốc
+- Chạy được ở thread nền (QImage), chuyển sang QPixmap trên GUI thread
+- Cache 2 tầng: RAM (ByteLRUCache) và đĩa (ThumbnailDiskCache)
+"""
+
+import qgis.PyQt
+from qgis.PyQt.QtCore import QBuffer, QByteArray, QIODevice, QSize
+from qgis.PyQt.QtGui import QImage, QImageReader
+from qgis.core import QgsTask
+
+from .attachment_io import AttachmentBuffer
+from .attachment_query import read_attachment_buffer
+from .thumbnail_disk_cache import source_fingerprint
+
+QT_VERSION = int(qgis.PyQt.QtCore.QT_VERSION_STR.split('.')[0])
+if QT_VERSION >= 6:
+    IO_READ_ONLY = QIODevice.OpenModeFlag.ReadOnly
+    IO_WRITE_ONLY = QIODevice.OpenModeFlag.WriteOnly
+else:
+    IO_READ_ONLY = QIODevice.ReadOnly
+    IO_WRITE_ONLY = QIODevice.WriteOnly
+
+# chiều rộng thumbnail trong dock
+THUMBNAIL_WIDTH = 420
+
+# cạnh dài của preview trung bình viewer giải mã khi mở (chế độ Fit);
+# cache trong image_cache với khóa image_cache_key(..., PREVIEW_WIDTH)
+PREVIEW_WIDTH = 1600
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff")
+
+
+def image_nbytes(image):
+    """Số byte pixel của QImage (cho ByteLRUCache)."""
+    try:
+        return image.sizeInBytes()
+    except AttributeError:
+        return image.byteCount()
+
+
+def pixmap_nbytes(pixmap):
+    """Số byte pixel của QPixmap (cho ByteLRUCache)."""
+    return pixmap.width() * pixmap.height() * max(1, pixmap.depth()) // 8
+
+
+def image_cache_key(source, fid, width):
+    """Khóa cache: (nguồn layer ATTACH, feature id, kích thước đích)."""
+    return (source, fid, width)
+
+
+def as_qbytearray(data):
+    """QByteArray cho Qt API; dùng lại QByteArray của provider nếu có (không sao chép)."""
+    if isinstance(data, AttachmentBuffer):
+        data = data.raw
+    if isinstance(data, QByteArray):
+        return data
+    return QByteArray(bytes(data))
+
+
+def decode_thumbnail(data, width=THUMBNAIL_WIDTH):
+    """Giải mã data (AttachmentBuffer/bytes) thành QImage rộng `width` px; None nếu không đọc được."""
+    if not data:
+        return None
+    buf = QBuffer()
+    buf.setData(as_qbytearray(data))
+    if not buf.open(IO_READ_ONLY):
+        return None
+    try:
+        reader = QImageReader(buf)
+        size = reader.size()
+        if size.isValid() and size.width() > 0:
+            height = max(1, round(size.height() * width / size.width()))
+            reader.setScaledSize(QSize(width, height))
+        image = reader.read()
+    finally:
+        buf.close()
+    if image.isNull():
+        return None
+    return image
+
+
+def encode_thumbnail(image):
+    """QImage -> bytes (JPEG, hoặc PNG nếu có kênh alpha) để lưu cache đĩa."""
+    buf = QBuffer()
+    if not buf.open(IO_WRITE_ONLY):
+        return None
+    fmt = "PNG" if image.hasAlphaChannel() else "JPG"
+    ok = image.save(buf, fmt, 85)
+    buf.close()
+    return bytes(buf.data()) if ok else None
+
+
+def load_thumbnail(read_data, width=THUMBNAIL_WIDTH, cache=None, key=None, disk_cache=None, trace=None):
+    """
+    Thumbnail theo thứ tự: cache RAM -> cache đĩa -> read_data() + giải mã.
+    read_data chỉ được gọi khi cả hai cache đều miss (tránh đọc BLOB).
+    key = image_cache_key(source, fid, width).
+    trace (latency.ClickTrace) nếu có: ghi span "blob"/"decode" và số byte đã đọc.
+    """
+    if cache is not None and key is not None:
+        image = cache.get(key)
+        if image is not None:
+            return image
+
+    disk_key = None
+    fingerprint = None
+    if disk_cache is not None and key is not None:
+        source, fid, size = key
+        disk_key = f"{source}|{fid}|{size}"
+        fingerprint = source_fingerprint(source)
+        encoded = disk_cache.get(disk_key, fingerprint)
+        if encoded:
+            image = QImage.fromData(encoded)
+            if not image.isNull():
+                if cache is not None:
+                    cache.put(key, image)
+                return image
+
+    if trace is None:
+        image = decode_thumbnail(read_data(), width)
+    else:
+        with trace.span("blob"):
+            data = read_data()
+        trace.add_bytes(len(data) if data else 0)
+        with trace.span("decode"):
+            image = decode_thumbnail(data, width)
+        data = None
+    if image is None:
+        return None
+    if cache is not None and key is not None:
+        cache.put(key, image)
+    if disk_key is not None and fingerprint is not None:
+        encoded = encode_thumbnail(image)
+        if encoded:
+            disk_cache.put(disk_key, fingerprint, encoded)
+    return image
+
+
+class ThumbnailTask(QgsTask):
+    """Đọc BLOB (nếu cần) và giải mã thumbnail ở thread nền; kết quả: self.image (QImage)."""
+
+    def __init__(self, attach_source, data_idx, fid, width=THUMBNAIL_WIDTH, callback=None,
+                 cache=None, cache_key=None, disk_cache=None):
+        super().__init__("ArcGIS Attachments: thumbnail", QgsTask.CanCancel)
+        self.image = None
+        self._source = attach_source
+        self._data_idx = data_idx
+        self._fid = fid
+        self._width = width
+        self._callback = callback
+        self._cache = cache
+        self._cache_key = cache_key
+        self._disk_cache = disk_cache
+
+    def run(self):
+        if self.isCanceled():
+            return False
+        try:
+            self.image = load_thumbnail(
+                self._read_data, self._width, self._cache, self._cache_key, self._disk_cache
+            )
+        except Exception:
+            return False
+        if self.isCanceled():
+            return False
+        return self.image is not None
+
+    def _read_data(self):
+        data = read_attachment_buffer(self._source, self._data_idx, self._fid)
+        # bị hủy trong lúc đọc: không giải mã
+        return None if self.isCanceled() else data
+
+    def finished(self, result):
+        if self._callback:
+            self._callback(self, result)